@@ -57,7 +57,7 @@ export function FormProvider({ children }: { children: ReactNode }) {
     try {
       setLoading(true);
       setError(null);
-      const response = await api.get("/forms/");
+      const response = await api.getAll("/forms/");
 
       // Convert API response to our format
       const formsMap: { [slug: string]: FormData } = {};
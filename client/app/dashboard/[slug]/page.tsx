@@ -56,6 +56,38 @@ interface Response {
   data: { [fieldId: string]: any };
 }
 
+interface TopTerm {
+  term: string;
+  count: number;
+  error: number;
+}
+
+interface FieldAnalytics {
+  fieldId: string;
+  responseCount: number;
+  optionCounts?: { [option: string]: number };
+  stats?: { count: number; sum: number; mean: number | null };
+  distribution?: { [bucket: string]: number };
+  recentResponses?: string[];
+  topTerms?: TopTerm[];
+}
+
+interface Analytics {
+  totalResponses: number;
+  fieldAnalytics: FieldAnalytics[];
+  recentResponses: {
+    id: string;
+    submitted_at: string;
+    responses: { [fieldId: string]: any };
+  }[];
+}
+
+interface TimeSeries {
+  granularity: string;
+  total: number;
+  buckets: { start: string; count: number }[];
+}
+
 export default function DashboardPage() {
   const { slug } = useParams();
   const router = useRouter();
@@ -64,6 +96,8 @@ export default function DashboardPage() {
   const { getForm } = useFormContext();
   const [form, setForm] = useState<FormData | null>(null);
   const [responses, setResponses] = useState<Response[]>([]);
+  const [trend, setTrend] = useState<TimeSeries | null>(null);
+  const [analytics, setAnalytics] = useState<Analytics | null>(null);
   const [isLoading, setIsLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
 
@@ -71,7 +105,7 @@ export default function DashboardPage() {
     setMounted(true);
   }, []);
 
-  // Load form and responses from API
+  // Load form and analytics from API
   useEffect(() => {
     if (!slug) return;
 
@@ -79,6 +113,7 @@ export default function DashboardPage() {
       try {
         setIsLoading(true);
         setError(null);
+        setAnalytics(null);
 
         // Get form from context (which loads from API)
         const formData = getForm(slug as string);
@@ -86,23 +121,43 @@ export default function DashboardPage() {
         if (formData) {
           setForm(formData);
 
-          // Load responses from API if form has an ID
+          // Load analytics from API if form has an ID. Counts, distributions and
+          // recent answers come from the server's pre-aggregated summary, so the
+          // dashboard never pages through every response
           if (formData.id) {
             try {
-              const responseData = await api.get(
-                `/forms/${formData.id}/get_responses/`
+              const analyticsData: Analytics = await api.get(
+                `/analytics/${formData.id}/`
               );
+              setAnalytics(analyticsData);
 
-              // Convert API response to our format
-              const formattedResponses = responseData.map((response: any) => ({
-                id: response.id,
-                timestamp: response.submitted_at,
-                data: response.responses
-              }));
+              // Latest responses, oldest first like local responses
+              const formattedResponses = analyticsData.recentResponses
+                .map(response => ({
+                  id: response.id as any,
+                  timestamp: response.submitted_at,
+                  data: response.responses
+                }))
+                .reverse();
 
               setResponses(formattedResponses);
+
+              // Daily counts for the trend chart, bucketed by the server
+              try {
+                const start = new Date();
+                start.setUTCDate(start.getUTCDate() - 6);
+                setTrend(
+                  await api.get(
+                    `/analytics/${formData.id}/timeseries/?granularity=day&start=${
+                      start.toISOString().split("T")[0]
+                    }`
+                  )
+                );
+              } catch (trendError) {
+                console.error("Failed to load response trends:", trendError);
+              }
             } catch (apiError) {
-              console.error("Failed to load responses from API:", apiError);
+              console.error("Failed to load analytics from API:", apiError);
               // Fallback to localStorage
               loadLocalResponses(slug as string);
             }
@@ -299,7 +354,7 @@ export default function DashboardPage() {
                   Total Responses
                 </p>
                 <p className="text-2xl font-bold text-gray-900 dark:text-gray-100">
-                  {responses.length}
+                  {analytics ? analytics.totalResponses : responses.length}
                 </p>
               </div>
             </div>
@@ -315,7 +370,7 @@ export default function DashboardPage() {
                   Avg. Rating
                 </p>
                 <p className="text-2xl font-bold text-gray-900 dark:text-gray-100">
-                  {getAverageRating(form, responses)}
+                  {getAverageRating(form, responses, analytics)}
                 </p>
               </div>
             </div>
@@ -365,7 +420,7 @@ export default function DashboardPage() {
           </h2>
           <div className="h-64">
             <Line
-              data={getResponseTrendsData(responses, isDark)}
+              data={getResponseTrendsData(responses, isDark, trend)}
               options={{
                 responsive: true,
                 maintainAspectRatio: false,
@@ -408,6 +463,9 @@ export default function DashboardPage() {
               key={field.id}
               field={field}
               responses={responses}
+              analytics={analytics?.fieldAnalytics.find(
+                entry => entry.fieldId === field.id
+              )}
               isDark={isDark}
             />
           ))}
@@ -465,21 +523,39 @@ export default function DashboardPage() {
 function FieldChart({
   field,
   responses,
+  analytics,
   isDark
 }: {
   field: FormField;
   responses: Response[];
+  analytics?: FieldAnalytics;
   isDark?: boolean;
 }) {
+  // Server analytics when loaded from the API, otherwise the local responses
   const fieldData = responses.map(r => r.data[field.id]).filter(Boolean);
+  const topTerms = analytics?.topTerms;
 
   if (field.type === "text") {
-    const recentResponses = fieldData.slice(-5);
+    const recentResponses = analytics?.recentResponses
+      ? analytics.recentResponses.slice(0, 5)
+      : fieldData.slice(-5);
     return (
       <div className="bg-white dark:bg-gray-800 rounded-lg shadow dark:shadow-gray-700 p-6 transition-colors duration-300">
         <h3 className="text-lg font-semibold mb-4 text-gray-900 dark:text-gray-100">
           {field.label}
         </h3>
+        {topTerms && topTerms.length > 0 && (
+          <div className="flex flex-wrap gap-2 mb-4">
+            {topTerms.slice(0, 10).map(term => (
+              <span
+                key={term.term}
+                className="px-2 py-1 bg-blue-100 dark:bg-blue-900 text-blue-800 dark:text-blue-200 rounded text-xs"
+              >
+                {term.term} ({term.count})
+              </span>
+            ))}
+          </div>
+        )}
         <div className="space-y-2">
           {recentResponses.map((text, i) => (
             <div
@@ -500,16 +576,22 @@ function FieldChart({
   }
 
   if (field.type === "rating") {
-    const avg =
-      fieldData.length > 0
-        ? (
-            fieldData.reduce((a: number, b: number) => a + b, 0) /
-            fieldData.length
-          ).toFixed(1)
-        : "0";
-
-    const ratingCounts = [1, 2, 3, 4, 5].map(
-      rating => fieldData.filter((r: number) => r === rating).length
+    const ratingCount = analytics?.stats
+      ? analytics.stats.count
+      : fieldData.length;
+    const avg = analytics?.stats
+      ? (analytics.stats.mean ?? 0).toFixed(1)
+      : fieldData.length > 0
+      ? (
+          fieldData.reduce((a: number, b: number) => a + b, 0) /
+          fieldData.length
+        ).toFixed(1)
+      : "0";
+
+    const ratingCounts = [1, 2, 3, 4, 5].map(rating =>
+      analytics?.distribution
+        ? analytics.distribution[String(rating)] || 0
+        : fieldData.filter((r: number) => r === rating).length
     );
 
     return (
@@ -520,7 +602,7 @@ function FieldChart({
         <div className="text-center mb-4">
           <div className="text-3xl font-bold text-yellow-500">⭐ {avg}</div>
           <p className="text-sm text-gray-600 dark:text-gray-300">
-            {fieldData.length} ratings
+            {ratingCount} ratings
           </p>
         </div>
         <div className="h-48">
@@ -582,7 +664,9 @@ function FieldChart({
     const allSelections = fieldData.flat();
     const counts =
       field.options?.reduce((acc: any, opt: string) => {
-        acc[opt] = allSelections.filter((v: string) => v === opt).length;
+        acc[opt] = analytics
+          ? analytics.optionCounts?.[opt] || 0
+          : allSelections.filter((v: string) => v === opt).length;
         return acc;
       }, {}) || {};
 
@@ -631,7 +715,9 @@ function FieldChart({
   if (field.type === "multiple-choice") {
     const counts =
       field.options?.reduce((acc: any, opt: string) => {
-        acc[opt] = fieldData.filter((v: string) => v === opt).length;
+        acc[opt] = analytics
+          ? analytics.optionCounts?.[opt] || 0
+          : fieldData.filter((v: string) => v === opt).length;
         return acc;
       }, {}) || {};
 
@@ -692,7 +778,11 @@ function FieldChart({
   return null;
 }
 
-function getAverageRating(form: FormData, responses: Response[]): string {
+function getAverageRating(
+  form: FormData,
+  responses: Response[],
+  analytics?: Analytics | null
+): string {
   const ratingFields = form.fields.filter(f => f.type === "rating");
   if (ratingFields.length === 0) return "N/A";
 
@@ -700,6 +790,14 @@ function getAverageRating(form: FormData, responses: Response[]): string {
   let totalCount = 0;
 
   ratingFields.forEach(field => {
+    const stats = analytics?.fieldAnalytics.find(
+      entry => entry.fieldId === field.id
+    )?.stats;
+    if (analytics) {
+      totalRating += stats?.sum || 0;
+      totalCount += stats?.count || 0;
+      return;
+    }
     const ratings = responses.map(r => r.data[field.id]).filter(Boolean);
     if (ratings.length > 0) {
       totalRating += ratings.reduce((a: number, b: number) => a + b, 0);
@@ -710,16 +808,27 @@ function getAverageRating(form: FormData, responses: Response[]): string {
   return totalCount > 0 ? (totalRating / totalCount).toFixed(1) : "N/A";
 }
 
-function getResponseTrendsData(responses: Response[], isDark?: boolean) {
-  const last7Days = Array.from({ length: 7 }, (_, i) => {
-    const date = new Date();
-    date.setDate(date.getDate() - (6 - i));
-    return date.toISOString().split("T")[0];
-  });
-
-  const responseCounts = last7Days.map(date => {
-    return responses.filter(r => r.timestamp.split("T")[0] === date).length;
-  });
+function getResponseTrendsData(
+  responses: Response[],
+  isDark?: boolean,
+  trend?: TimeSeries | null
+) {
+  let last7Days: string[];
+  let responseCounts: number[];
+  if (trend) {
+    last7Days = trend.buckets.map(bucket => bucket.start.split("T")[0]);
+    responseCounts = trend.buckets.map(bucket => bucket.count);
+  } else {
+    // Local/mock responses: bin the timestamps here
+    last7Days = Array.from({ length: 7 }, (_, i) => {
+      const date = new Date();
+      date.setDate(date.getDate() - (6 - i));
+      return date.toISOString().split("T")[0];
+    });
+    responseCounts = last7Days.map(date => {
+      return responses.filter(r => r.timestamp.split("T")[0] === date).length;
+    });
+  }
 
   return {
     labels: last7Days.map(date =>
@@ -45,6 +45,8 @@ export default function FormPage() {
   const [errors, setErrors] = useState<{ [key: string]: string }>({});
   const [isSubmitting, setIsSubmitting] = useState(false);
   const [submitted, setSubmitted] = useState(false);
+  // One key per filled-in form, so double-clicks and retries are stored once
+  const [submissionKey] = useState(() => crypto.randomUUID());
 
   useEffect(() => {
     setMounted(true);
@@ -129,9 +131,11 @@ export default function FormPage() {
     try {
       // Submit response to backend API
       if (form.id) {
-        await api.post(`/forms/${form.id}/responses/`, {
-          responses: responses
-        });
+        await api.post(
+          `/forms/${form.id}/responses/`,
+          { responses: responses },
+          { "Idempotency-Key": submissionKey }
+        );
       } else {
         // Fallback to localStorage if form doesn't have an ID
         const existingResponses = JSON.parse(
@@ -1,5 +1,8 @@
 import { useState, useCallback } from "react";
 
+// Patterns are only run on values up to this length, matching the server
+const PATTERN_MAX_INPUT_LENGTH = 1000;
+
 interface FormField {
   id: string;
   type: "text" | "multiple-choice" | "checkbox" | "rating";
@@ -52,6 +55,12 @@ export function useFormValidation(fields: FormField[]) {
         ) {
           return `${field.label} must be no more than ${field.validation.maxLength} characters`;
         }
+        if (
+          field.validation.pattern &&
+          value.length > PATTERN_MAX_INPUT_LENGTH
+        ) {
+          return `${field.label} must be no more than ${PATTERN_MAX_INPUT_LENGTH} characters`;
+        }
         if (
           field.validation.pattern &&
           !new RegExp(field.validation.pattern).test(value)
@@ -1,5 +1,7 @@
 // utils/api.ts
 const API_BASE_URL = "http://localhost:8000/api";
+// Largest page the server returns (MAX_PAGE_SIZE)
+const MAX_PAGE_SIZE = 500;
 
 export const api = {
   async get(endpoint: string) {
@@ -10,11 +12,30 @@ export const api = {
     return response.json();
   },
 
-  async post(endpoint: string, data: any) {
+  // Follow `next_cursor` through a paginated endpoint and collect every page,
+  // fetched at the largest page size unless the endpoint sets `limit`
+  async getAll(endpoint: string) {
+    const results: any[] = [];
+    if (!/[?&]limit=/.test(endpoint)) {
+      endpoint += `${endpoint.includes("?") ? "&" : "?"}limit=${MAX_PAGE_SIZE}`;
+    }
+    let cursor: string | null = null;
+    do {
+      const page = await this.get(
+        cursor ? `${endpoint}&cursor=${encodeURIComponent(cursor)}` : endpoint
+      );
+      results.push(...page.results);
+      cursor = page.next_cursor;
+    } while (cursor);
+    return results;
+  },
+
+  async post(endpoint: string, data: any, headers: Record<string, string> = {}) {
     const response = await fetch(`${API_BASE_URL}${endpoint}`, {
       method: "POST",
       headers: {
-        "Content-Type": "application/json"
+        "Content-Type": "application/json",
+        ...headers
       },
       body: JSON.stringify(data)
     });
@@ -51,7 +72,7 @@ export const api = {
 
 export const exportResponses = async (
   formId: string,
-  format: "csv" | "pdf" = "csv"
+  format: "csv" | "ndjson" = "csv"
 ) => {
   const response = await fetch(
     `${API_BASE_URL}/forms/${formId}/export/?format=${format}`
@@ -0,0 +1,60 @@
+# analytics/async_views.py
+from django.conf import settings
+from async_mongodb_service import async_mongodb_service
+from renderers import ORJSONResponse
+from http_caching import form_analytics_etag, global_analytics_etag, not_modified, set_validators
+from segments import segment_signature
+from .views import parse_segment_params, parse_time_series_params
+
+
+async def analytics(request, form_id=None):
+    """Async AnalyticsView: global analytics, or a single form's when form_id is given"""
+    try:
+        cache_control = settings.ANALYTICS_CACHE_CONTROL
+        if not form_id:
+            etag = global_analytics_etag(await async_mongodb_service.get_analytics_version())
+            response = not_modified(request, etag)
+            if response is None:
+                response = ORJSONResponse(await async_mongodb_service.get_analytics_data())
+            return set_validators(response, etag, cache_control=cache_control)
+
+        segment = parse_segment_params(request.GET)
+        approx = request.GET.get('approx', 'false').lower() == 'true'
+        form = await async_mongodb_service.get_form(form_id)
+        if not form:
+            return ORJSONResponse({'error': 'Form not found'}, status=404)
+        if segment is not None:
+            data = await async_mongodb_service.get_segmented_analytics(form, **segment)
+            etag = form_analytics_etag(form, data['seq'], signature=segment_signature(**segment))
+            response = not_modified(request, etag) or ORJSONResponse(data)
+            return set_validators(response, etag, cache_control=cache_control)
+
+        seq = await async_mongodb_service.get_analytics_version(form_id)
+        if seq is not None:
+            etag = form_analytics_etag(form, seq, approx)
+            response = not_modified(request, etag)
+            if response is not None:
+                return set_validators(response, etag, cache_control=cache_control)
+
+        analytics_data = await async_mongodb_service.get_analytics_data(form_id=form_id, approx=approx)
+        if analytics_data:
+            etag = form_analytics_etag(form, analytics_data['seq'], approx)
+            return set_validators(ORJSONResponse(analytics_data), etag, cache_control=cache_control)
+        return ORJSONResponse({'error': 'Form not found'}, status=404)
+    except ValueError as e:
+        return ORJSONResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        return ORJSONResponse({'error': str(e)}, status=500)
+
+
+async def time_series(request, form_id=None):
+    """Async TimeSeriesView: responses per time bucket, globally or for one form"""
+    try:
+        granularity, start, end = parse_time_series_params(request.GET)
+        if form_id and not await async_mongodb_service.get_form(form_id):
+            return ORJSONResponse({'error': 'Form not found'}, status=404)
+        return ORJSONResponse(await async_mongodb_service.get_time_series(granularity, start, end, form_id=form_id))
+    except ValueError as e:
+        return ORJSONResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        return ORJSONResponse({'error': str(e)}, status=500)
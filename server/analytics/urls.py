@@ -1,8 +1,11 @@
 # analytics/urls.py
 from django.urls import path
-from .views import AnalyticsView
+from .views import AnalyticsView, TimeSeriesView, MetricsView
 
 urlpatterns = [
     path('analytics/', AnalyticsView.as_view(), name='global-analytics'),
+    path('analytics/timeseries/', TimeSeriesView.as_view(), name='global-time-series'),
     path('analytics/<str:form_id>/', AnalyticsView.as_view(), name='form-analytics'),
+    path('analytics/<str:form_id>/timeseries/', TimeSeriesView.as_view(), name='form-time-series'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
 ]
\ No newline at end of file
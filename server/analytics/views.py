@@ -1,30 +1,133 @@
 # analytics/views.py
+from datetime import datetime
+from django.conf import settings
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from mongodb_service import mongodb_service
+from analytics_broadcaster import analytics_broadcaster
+from time_series import GRANULARITIES, DEFAULT_SPANS, parse_time
+from segments import MAX_FILTERS, parse_filter, segment_signature
+from http_caching import form_analytics_etag, global_analytics_etag, not_modified, set_validators
+
+
+def parse_time_series_params(query_params):
+    """Read ?granularity=, ?start= and ?end= from the query string"""
+    granularity = query_params.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'granularity must be one of {", ".join(GRANULARITIES)}')
+    try:
+        end = parse_time(query_params['end']) if query_params.get('end') else datetime.utcnow()
+        start = parse_time(query_params['start']) if query_params.get('start') else end - DEFAULT_SPANS[granularity]
+    except ValueError:
+        raise ValueError('start and end must be ISO 8601 dates')
+    if start >= end:
+        raise ValueError('start must be before end')
+    return granularity, start, end
+
+
+def parse_segment_params(query_params):
+    """Read ?filter= (repeatable), ?group_by=, ?fields=, ?start= and ?end=; None when none is given"""
+    filters = [parse_filter(text) for text in query_params.getlist('filter')]
+    if len(filters) > MAX_FILTERS:
+        raise ValueError(f'At most {MAX_FILTERS} filters')
+    group_by = query_params.get('group_by') or None
+    field_ids = query_params.get('fields')
+    field_ids = [field_id.strip() for field_id in field_ids.split(',') if field_id.strip()] if field_ids else None
+    try:
+        start = parse_time(query_params['start']) if query_params.get('start') else None
+        end = parse_time(query_params['end']) if query_params.get('end') else None
+    except ValueError:
+        raise ValueError('start and end must be ISO 8601 dates')
+    if not (filters or group_by or field_ids or start or end):
+        return None
+    return {'filters': filters, 'group_by': group_by, 'field_ids': field_ids, 'start': start, 'end': end}
+
 
 class AnalyticsView(APIView):
     def get(self, request, form_id=None):
         if form_id:
-            return self.get_form_analytics(form_id)
+            try:
+                segment = parse_segment_params(request.query_params)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=400)
+            if segment is not None:
+                return self.get_segmented_analytics(request, form_id, segment)
+            approx = request.query_params.get('approx', 'false').lower() == 'true'
+            return self.get_form_analytics(request, form_id, approx=approx)
         else:
-            return self.get_global_analytics()
+            return self.get_global_analytics(request)
     
-    def get_global_analytics(self):
+    def get_global_analytics(self, request):
         """Get global analytics from MongoDB"""
         try:
-            analytics_data = mongodb_service.get_analytics_data()
-            return Response(analytics_data)
+            # The version is read first, so the ETag is never newer than the payload
+            etag = global_analytics_etag(mongodb_service.get_analytics_version())
+            response = not_modified(request, etag)
+            if response is None:
+                response = Response(mongodb_service.get_analytics_data())
+            return set_validators(response, etag, cache_control=settings.ANALYTICS_CACHE_CONTROL)
         except Exception as e:
             return Response({'error': str(e)}, status=500)
     
-    def get_form_analytics(self, form_id):
+    def get_form_analytics(self, request, form_id, approx=False):
         """Get analytics for a specific form from MongoDB"""
         try:
-            analytics_data = mongodb_service.get_analytics_data(form_id=form_id)
+            form = mongodb_service.get_form(form_id)
+            if not form:
+                return Response({'error': 'Form not found'}, status=404)
+            seq = mongodb_service.get_analytics_version(form_id)
+            if seq is not None:
+                etag = form_analytics_etag(form, seq, approx)
+                response = not_modified(request, etag)
+                if response is not None:
+                    return set_validators(response, etag, cache_control=settings.ANALYTICS_CACHE_CONTROL)
+            
+            analytics_data = mongodb_service.get_analytics_data(form_id=form_id, approx=approx)
             if analytics_data:
-                return Response(analytics_data)
+                etag = form_analytics_etag(form, analytics_data['seq'], approx)
+                return set_validators(Response(analytics_data), etag, cache_control=settings.ANALYTICS_CACHE_CONTROL)
             else:
                 return Response({'error': 'Form not found'}, status=404)
         except Exception as e:
-            return Response({'error': str(e)}, status=500)
\ No newline at end of file
+            return Response({'error': str(e)}, status=500)
+    
+    def get_segmented_analytics(self, request, form_id, segment):
+        """Analytics of a form's responses matching filters, optionally per group_by value"""
+        try:
+            form = mongodb_service.get_form(form_id)
+            if not form:
+                return Response({'error': 'Form not found'}, status=404)
+            data = mongodb_service.get_segmented_analytics(form, **segment)
+            etag = form_analytics_etag(form, data['seq'], signature=segment_signature(**segment))
+            response = not_modified(request, etag) or Response(data)
+            return set_validators(response, etag, cache_control=settings.ANALYTICS_CACHE_CONTROL)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        except Exception as e:
+            return Response({'error': str(e)}, status=500)
+
+
+class TimeSeriesView(APIView):
+    def get(self, request, form_id=None):
+        """Responses per hour/day/... for one form, or across all forms"""
+        try:
+            granularity, start, end = parse_time_series_params(request.query_params)
+            if form_id and not mongodb_service.get_form(form_id):
+                return Response({'error': 'Form not found'}, status=404)
+            return Response(mongodb_service.get_time_series(granularity, start, end, form_id=form_id))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        except Exception as e:
+            return Response({'error': str(e)}, status=500)
+
+
+class MetricsView(APIView):
+    def get(self, request):
+        """In-process metrics of the caches, buffers and publishers of this worker"""
+        buffer = mongodb_service.response_buffer
+        return Response({
+            'form_cache': mongodb_service.form_cache.stats(),
+            'segment_cache': mongodb_service.segment_cache.stats(),
+            'response_buffer': buffer.stats() if buffer is not None else None,
+            'analytics_broadcaster': analytics_broadcaster.stats()
+        })
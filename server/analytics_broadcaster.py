@@ -0,0 +1,195 @@
+# analytics_broadcaster.py
+"""
+Coalescing real-time broadcaster for new responses.
+
+Instead of one channel-layer message per submission, publish() records the
+response and a background thread sends at most one frame per form per
+window (ANALYTICS_BROADCAST_WINDOW seconds, 0.25 by default):
+
+- the form's own group (`analytics_<form_id>`, joined by dashboards on
+  ws/analytics/<form_id>/) gets a `new_responses` frame with the count and
+  the latest response ids, and an `analytics_deltas` frame with the
+  analytics deltas (see analytics_store.py) produced in the window, in seq
+  order;
+- the global `analytics` group gets a single `responses_summary` frame
+  listing every form that received responses in the window.
+
+Publishing never blocks or fails the request: publish()/publish_delta() only
+record the event in memory, and the channel-layer round trips happen on the
+broadcaster thread. At most `max_pending` events wait for the next window;
+beyond that they are dropped and counted (a dropped delta shows up as a seq
+gap, so dashboards resync). stats() reports the pending depth, drops,
+failed sends and publish latency (first event of a window to the end of its
+sends), and is served by /api/metrics/.
+"""
+import os
+import threading
+import time
+from collections import deque
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+GLOBAL_GROUP = 'analytics'
+LATEST_IDS = 10
+
+
+def form_group_name(form_id):
+    """Channel-layer group for dashboards watching a single form"""
+    return f'analytics_{form_id}'
+
+
+class AnalyticsBroadcaster:
+    def __init__(self, window=0.25, latest_ids=LATEST_IDS, max_pending=10000):
+        self.window = window
+        self.latest_ids = latest_ids
+        self.max_pending = max_pending
+        self._pending = {}
+        self._depth = 0
+        self._first_event_at = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.published = 0
+        self.dropped = 0
+        self.failed = 0
+        self.sends = 0
+        self.last_latency = None
+        self.max_latency = 0.0
+        self._total_latency = 0.0
+
+    def start(self):
+        """Start the flush thread (again, if we are in a forked child)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='analytics-broadcaster', daemon=True)
+            self._thread.start()
+
+    def _record(self, form_id, apply):
+        """Run apply(entry) for the form under the lock, unless the pending events are at capacity"""
+        try:
+            self.start()
+        except Exception as e:
+            print(f"Error starting analytics broadcaster: {e}")
+        with self._lock:
+            if self._depth >= self.max_pending:
+                self.dropped += 1
+                return
+            apply(self._entry(form_id))
+            self._depth += 1
+            self.published += 1
+            if self._first_event_at is None:
+                self._first_event_at = time.monotonic()
+        self._wakeup.set()
+
+    def _entry(self, form_id):
+        entry = self._pending.get(form_id)
+        if entry is None:
+            entry = self._pending[form_id] = {
+                'form_title': None,
+                'count': 0,
+                'response_ids': deque(maxlen=self.latest_ids),
+                'deltas': []
+            }
+        return entry
+
+    def publish(self, form_id, form_title, response_ids):
+        """Record new responses; they are broadcast at the end of the current window"""
+        def apply(entry):
+            entry['form_title'] = form_title
+            entry['count'] += len(response_ids)
+            entry['response_ids'].extend(response_ids)
+        self._record(form_id, apply)
+
+    def publish_delta(self, form_id, delta):
+        """Record an analytics delta for the form's live dashboards"""
+        self._record(form_id, lambda entry: entry['deltas'].append(delta))
+
+    def flush(self):
+        """Send everything recorded since the last flush"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            first_event_at, self._first_event_at = self._first_event_at, None
+            self._depth = 0
+        if not pending:
+            return
+        try:
+            channel_layer = get_channel_layer()
+            if channel_layer is None:
+                return
+            async_to_sync(self._send)(channel_layer, pending)
+        except Exception as e:
+            self.failed += 1
+            print(f"Error broadcasting analytics: {e}")
+            return
+        latency = time.monotonic() - first_event_at
+        self.sends += 1
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+        self._total_latency += latency
+
+    def stats(self):
+        return {
+            'depth': self._depth,
+            'max_pending': self.max_pending,
+            'published': self.published,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'sends': self.sends,
+            'last_latency': self.last_latency,
+            'max_latency': self.max_latency,
+            'avg_latency': self._total_latency / self.sends if self.sends else None,
+        }
+
+    async def _send(self, channel_layer, pending):
+        forms = []
+        for form_id, entry in pending.items():
+            if entry['deltas']:
+                await channel_layer.group_send(form_group_name(form_id), {
+                    'type': 'analytics_deltas',
+                    'message': {
+                        'form_id': form_id,
+                        'deltas': sorted(entry['deltas'], key=lambda delta: delta['seq'])
+                    }
+                })
+            if not entry['count']:
+                continue
+            message = {
+                'form_id': form_id,
+                'form_title': entry['form_title'],
+                'count': entry['count'],
+                'response_ids': list(entry['response_ids'])
+            }
+            await channel_layer.group_send(form_group_name(form_id), {
+                'type': 'new_responses',
+                'message': message
+            })
+            forms.append(message)
+
+        if not forms:
+            return
+        await channel_layer.group_send(GLOBAL_GROUP, {
+            'type': 'responses_summary',
+            'message': {
+                'count': sum(form['count'] for form in forms),
+                'forms': forms
+            }
+        })
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            # Let the window fill up before sending
+            time.sleep(self.window)
+            self._wakeup.clear()
+            self.flush()
+
+
+# Singleton instance
+analytics_broadcaster = AnalyticsBroadcaster(
+    window=settings.ANALYTICS_BROADCAST_WINDOW,
+    max_pending=settings.ANALYTICS_BROADCAST_MAX_PENDING
+)
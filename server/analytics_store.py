@@ -0,0 +1,481 @@
+# analytics_store.py
+"""
+Pre-aggregated per-form analytics.
+
+Every response updates one summary document per form (collection
+`form_analytics`) with atomic $inc/$min/$max/$push operators, so reading
+analytics costs O(fields) and never scans the `form_responses` collection.
+
+Each update also bumps the summary's `seq`, and is turned into an analytics
+delta in the API's shape (build_delta) that live dashboards apply on top of
+a snapshot instead of re-fetching the whole payload:
+
+    {'formId', 'baseSeq', 'seq', 'totalResponses', 'lastResponseAt',
+     'fields': {fieldId: {'responseCount', 'optionCounts', 'stats': {'count',
+                'sum', 'min', 'max'}, 'distribution', 'recentResponses'}},
+     'recentResponses'}
+
+Counts are increments, min/max are candidates, and lists hold new items,
+newest first, to prepend. A delta applies to a snapshot whose seq equals its
+baseSeq; a client that sees a later baseSeq has missed one and resyncs.
+
+The same updates maintain the approximate sketches of sketches.py under
+`sketches.<field id>`. They are only read for ?approx=true, so get() leaves
+them out by default.
+
+Free-text answers also feed the Space-Saving top-terms counters of
+top_terms.py under `terms.<field id>`, with a separate update pipeline that
+runs just before the summary update, so a payload with a given seq already
+includes the terms of every response up to it. Top terms are not part of
+deltas.
+
+Summaries keep bounded copies of answers: free-text answers in `recent`
+lists and in `recent_responses` are cut to RECENT_TEXT_LENGTH characters,
+and `recent_responses` only holds the form's own fields, so a summary stays
+far below MongoDB's 16MB document limit however long the answers are.
+
+Live updates never create a summary. A form without one (created before
+form_analytics existed) gets a summary flagged `needs_rebuild`, whose seq
+still moves with every response; readers fall back to counting the stored
+responses until `python manage.py reconcile_counters` rebuilds it. A rebuild
+flags the summary too, so submissions arriving meanwhile never interleave
+with it.
+"""
+from collections import Counter
+from pymongo import ReturnDocument
+from sketches import SAMPLE_SIZE, hll_register, hll_estimate, sample_entry, percentile_bounds
+from top_terms import tokenize, terms_pipeline, exact_counters, top_terms
+
+RECENT_RESPONSES_LIMIT = 10
+RECENT_TEXT_LIMIT = 10
+RECENT_TEXT_LENGTH = 500
+PERCENTILES = (50, 90, 99)
+REBUILD_BATCH_SIZE = 1000
+
+# Responses to a missing or flagged summary only move its seq, so ETags still change
+MARK_FOR_REBUILD = {'$set': {'needs_rebuild': True}, '$inc': {'seq': 1}}
+
+CHOICE_FIELD_TYPES = ('multiple-choice', 'checkbox')
+NUMERIC_FIELD_TYPES = ('rating',)
+
+
+def encode_key(key):
+    """Escape a value so it can be used as a MongoDB field name"""
+    return str(key).replace('%', '%25').replace('.', '%2E').replace('$', '%24')
+
+
+def decode_key(key):
+    """Reverse encode_key"""
+    return key.replace('%24', '$').replace('%2E', '.').replace('%25', '%')
+
+
+def to_number(value):
+    """Return value as a number, or None if it isn't numeric"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def bucket_key(number):
+    """Histogram bucket for a numeric answer (exact for integers like ratings)"""
+    if float(number).is_integer():
+        return str(int(number))
+    # Two significant digits keeps the histogram small for arbitrary floats
+    return '%.2g' % number
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def is_empty(value):
+    return value is None or value == '' or value == [] or value == {}
+
+
+def isoformat(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def truncate_text(value, length=RECENT_TEXT_LENGTH):
+    """A text answer cut to `length` characters; other values unchanged"""
+    return value[:length] if isinstance(value, str) else value
+
+
+def recent_response(fields, response_id, responses, submitted_at, ip_address=None):
+    """An entry of a summary's recent_responses: the form's answers, with text truncated"""
+    answers = {}
+    for field in fields or []:
+        field_id = field.get('id')
+        if field_id is not None and field_id in responses:
+            answers[field_id] = truncate_text(responses[field_id])
+    return {'id': response_id, 'responses': answers, 'submitted_at': submitted_at, 'ip_address': ip_address}
+
+
+def merge_updates(updates):
+    """Combine build_update() documents for one form, oldest first, into a single update"""
+    merged = {'$inc': {}, '$set': {}, '$push': {}}
+    for update in updates:
+        for key, value in update['$inc'].items():
+            merged['$inc'][key] = merged['$inc'].get(key, 0) + value
+        for operator, pick in (('$min', min), ('$max', max)):
+            for key, value in update.get(operator, {}).items():
+                values = merged.setdefault(operator, {})
+                values[key] = pick(values[key], value) if key in values else value
+        merged['$set'].update(update['$set'])
+        for key, push in update['$push'].items():
+            entry = merged['$push'].setdefault(key, dict(push, **{'$each': []}))
+            # Items go in at position 0, so later responses come first
+            entry['$each'] = push['$each'] + entry['$each']
+    for entry in merged['$push'].values():
+        if '$sort' in entry:
+            # Bottom-k samples: MongoDB sorts before slicing, so only the smallest keys matter
+            entry['$each'] = sorted(entry['$each'], key=lambda item: item['u'])
+        entry['$each'] = entry['$each'][:entry['$slice']]
+    return merged
+
+
+class AnalyticsStore:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def build_update(self, fields, response_id, responses, submitted_at, ip_address=None):
+        """Build the update document that folds one response into the form summary"""
+        if not isinstance(responses, dict):
+            responses = {}
+
+        inc = {'total_responses': 1, 'seq': 1}
+        min_values = {}
+        max_values = {}
+        push = {
+            'recent_responses': {
+                '$each': [recent_response(fields, response_id, responses, submitted_at, ip_address)],
+                '$position': 0,
+                '$slice': RECENT_RESPONSES_LIMIT
+            }
+        }
+
+        for field in fields or []:
+            field_id = field.get('id')
+            value = responses.get(field_id) if field_id is not None else None
+            if is_empty(value):
+                continue
+
+            prefix = f"fields.{encode_key(field_id)}"
+            sketch = f"sketches.{encode_key(field_id)}"
+            field_type = field.get('type')
+            inc[f'{prefix}.count'] = 1
+            register, rank = hll_register(value)
+            max_values[f'{sketch}.hll.{register}'] = rank
+
+            if field_type in CHOICE_FIELD_TYPES:
+                options = value if isinstance(value, list) else [value]
+                for option in options:
+                    key = f'{prefix}.options.{encode_key(option)}'
+                    inc[key] = inc.get(key, 0) + 1
+            elif field_type in NUMERIC_FIELD_TYPES or is_number(value):
+                number = to_number(value)
+                if number is None:
+                    continue
+                inc[f'{prefix}.numeric.count'] = 1
+                inc[f'{prefix}.numeric.sum'] = number
+                inc[f'{prefix}.numeric.distribution.{encode_key(bucket_key(number))}'] = 1
+                min_values[f'{prefix}.numeric.min'] = number
+                max_values[f'{prefix}.numeric.max'] = number
+            else:
+                push[f'{prefix}.recent'] = {
+                    '$each': [truncate_text(value)],
+                    '$position': 0,
+                    '$slice': RECENT_TEXT_LIMIT
+                }
+                push[f'{sketch}.sample'] = {
+                    '$each': [sample_entry(value)],
+                    '$sort': {'u': 1},
+                    '$slice': SAMPLE_SIZE
+                }
+
+        update = {
+            '$inc': inc,
+            '$set': {'last_response_at': submitted_at},
+            '$push': push
+        }
+        if min_values:
+            update['$min'] = min_values
+        if max_values:
+            update['$max'] = max_values
+        return update
+
+    @staticmethod
+    def build_delta(form_id, update, seq):
+        """Translate an applied update into an analytics delta; `seq` is the summary's seq after it"""
+        inc = update['$inc']
+        delta = {
+            'formId': form_id,
+            'baseSeq': seq - inc['seq'],
+            'seq': seq,
+            'totalResponses': inc['total_responses'],
+            'lastResponseAt': isoformat(update['$set']['last_response_at']),
+            'fields': {},
+            'recentResponses': [
+                dict(response, form_id=form_id, submitted_at=isoformat(response['submitted_at']))
+                for response in update['$push']['recent_responses']['$each']
+            ]
+        }
+
+        def field_delta(path):
+            # path is "fields.<encoded id>.<rest>"
+            _, encoded_id, rest = path.split('.', 2)
+            return delta['fields'].setdefault(decode_key(encoded_id), {}), rest
+
+        for path, value in inc.items():
+            if not path.startswith('fields.'):
+                continue
+            field, rest = field_delta(path)
+            if rest == 'count':
+                field['responseCount'] = value
+            elif rest.startswith('options.'):
+                field.setdefault('optionCounts', {})[decode_key(rest[len('options.'):])] = value
+            elif rest.startswith('numeric.distribution.'):
+                bucket = decode_key(rest[len('numeric.distribution.'):])
+                field.setdefault('distribution', {})[bucket] = value
+            elif rest in ('numeric.count', 'numeric.sum'):
+                field.setdefault('stats', {})[rest[len('numeric.'):]] = value
+        for operator in ('$min', '$max'):
+            for path, value in update.get(operator, {}).items():
+                if not path.startswith('fields.'):
+                    continue
+                field, rest = field_delta(path)
+                field.setdefault('stats', {})[rest[len('numeric.'):]] = value
+        for path, push in update['$push'].items():
+            if path.startswith('fields.'):
+                field, rest = field_delta(path)
+                field['recentResponses'] = push['$each']
+        return delta
+
+    @staticmethod
+    def live_query(form_id):
+        """Matches a form's summary unless it is missing or flagged for a rebuild"""
+        return {'_id': form_id, 'needs_rebuild': {'$exists': False}}
+
+    def mark_for_rebuild(self, form_id):
+        """Flag a form's summary, creating it if missing, so live updates leave it to a rebuild"""
+        self.collection.update_one({'_id': form_id}, MARK_FOR_REBUILD, upsert=True)
+
+    def apply_update(self, form_id, update):
+        """Apply a summary update atomically and return the delta it produced.
+
+        A missing or flagged summary is not updated; it is (kept) flagged for a
+        rebuild and there is no delta (None).
+        """
+        summary = self.collection.find_one_and_update(
+            self.live_query(form_id), update,
+            projection={'seq': 1}, return_document=ReturnDocument.AFTER
+        )
+        if summary is None:
+            self.mark_for_rebuild(form_id)
+            return None
+        return self.build_delta(form_id, update, summary['seq'])
+
+    def build_response_updates(self, fields, response_id, responses, submitted_at, ip_address=None):
+        """(top-terms pipeline or None, summary update) for one new response.
+
+        Both are applied with live_query(form_id), the terms first; the async
+        service runs them with its own driver.
+        """
+        return (
+            self.build_terms_update(fields, [responses]),
+            self.build_update(fields, response_id, responses, submitted_at, ip_address)
+        )
+
+    def record_response(self, form_id, fields, response_id, responses, submitted_at, ip_address=None):
+        """Fold a newly stored response into the form's summary document and return its delta"""
+        terms_update, update = self.build_response_updates(fields, response_id, responses, submitted_at, ip_address)
+        self.apply_terms(form_id, terms_update)
+        return self.apply_update(form_id, update)
+
+    @staticmethod
+    def count_terms(fields, responses_list):
+        """{'terms.<field id>': Counter of terms} over the free-text answers of some responses"""
+        counts = {}
+        for responses in responses_list:
+            if not isinstance(responses, dict):
+                continue
+            for field in fields or []:
+                value = responses.get(field.get('id'))
+                if field.get('type') in CHOICE_FIELD_TYPES + NUMERIC_FIELD_TYPES or not isinstance(value, str):
+                    continue
+                terms = tokenize(value)
+                if terms:
+                    counts.setdefault(f"terms.{encode_key(field['id'])}", Counter()).update(terms)
+        return counts
+
+    def build_terms_update(self, fields, responses_list):
+        """Update pipeline folding the responses' terms into the top-terms counters, or None"""
+        return terms_pipeline(self.count_terms(fields, responses_list))
+
+    def apply_terms(self, form_id, pipeline):
+        """Apply a build_terms_update pipeline to the form's counters; a failure never blocks the summary update"""
+        if not pipeline:
+            return
+        try:
+            self.collection.update_one(self.live_query(form_id), pipeline)
+        except Exception as e:
+            print(f"Error updating top terms: {e}")
+
+    def build_document_update(self, fields, response):
+        """build_update for a stored response document"""
+        return self.build_update(
+            fields,
+            str(response['_id']),
+            response.get('responses', {}),
+            response.get('submitted_at'),
+            response.get('ip_address')
+        )
+
+    def record_responses(self, batch):
+        """Fold a batch of (response document, form fields) pairs with one update per form.
+
+        Returns the delta of each form's update.
+        """
+        updates = {}
+        for response, fields in batch:
+            updates.setdefault(response['form_id'], []).append(self.build_document_update(fields, response))
+        answers = {}
+        for response, fields in batch:
+            answers.setdefault(response['form_id'], (fields, []))[1].append(response.get('responses', {}))
+        deltas = []
+        for form_id, form_updates in updates.items():
+            self.apply_terms(form_id, self.build_terms_update(*answers[form_id]))
+            delta = self.apply_update(form_id, merge_updates(form_updates))
+            if delta is not None:
+                deltas.append(delta)
+        return deltas
+
+    def initialize(self, form_id):
+        """Create an empty summary so new forms never need a rebuild"""
+        self.collection.update_one(
+            {'_id': form_id},
+            {'$setOnInsert': {'total_responses': 0, 'fields': {}, 'recent_responses': []}},
+            upsert=True
+        )
+
+    def delete(self, form_id):
+        self.collection.delete_one({'_id': form_id})
+
+    def get(self, form_id, sketches=False):
+        return self.collection.find_one({'_id': form_id}, None if sketches else {'sketches': 0})
+
+    def rebuild(self, form_id, fields, responses_cursor):
+        """Recompute a form summary from its stored responses (oldest first).
+
+        The summary is flagged, reset and refilled with one merged update per
+        REBUILD_BATCH_SIZE responses. Returns its seq and total afterwards, for
+        finish_rebuild.
+        """
+        self.mark_for_rebuild(form_id)
+        self.collection.update_one({'_id': form_id}, {
+            '$set': {'total_responses': 0, 'fields': {}, 'recent_responses': []},
+            '$unset': {'sketches': '', 'terms': '', 'last_response_at': ''}
+        })
+        batch = []
+        terms = {}
+        for response in responses_cursor:
+            batch.append(self.build_document_update(fields, response))
+            for path, counts in self.count_terms(fields, [response.get('responses', {})]).items():
+                terms.setdefault(path, Counter()).update(counts)
+            if len(batch) >= REBUILD_BATCH_SIZE:
+                self.collection.update_one({'_id': form_id}, merge_updates(batch))
+                batch = []
+        if batch:
+            self.collection.update_one({'_id': form_id}, merge_updates(batch))
+        if terms:
+            # Every answer was seen, so the counters hold exact counts
+            self.collection.update_one(
+                {'_id': form_id}, {'$set': {path: exact_counters(counts) for path, counts in terms.items()}}
+            )
+        return self.collection.find_one({'_id': form_id}, {'seq': 1, 'total_responses': 1})
+
+    def finish_rebuild(self, form_id, summary, count):
+        """Clear the rebuild flag; False if a response arrived since `summary` or it doesn't count `count` responses"""
+        result = self.collection.update_one(
+            {'_id': form_id, 'seq': summary['seq'], 'total_responses': count},
+            {'$unset': {'needs_rebuild': ''}, '$inc': {'seq': 1}}
+        )
+        return result.modified_count == 1
+
+    def summarize_field(self, field, stats, sketch=None, terms=None):
+        """Turn a stored field summary into the API's fieldAnalytics entry.
+
+        With a sketch (?approx=true), an `approximate` entry adds the distinct
+        answer count, percentile error bounds and a sample of text answers.
+        With the field's top-terms counters, `topTerms` lists its most used terms.
+        """
+        stats = stats or {}
+        summary = {
+            'fieldId': field['id'],
+            'fieldLabel': field['label'],
+            'fieldType': field['type'],
+            'responseCount': stats.get('count', 0)
+        }
+
+        if field['type'] in CHOICE_FIELD_TYPES:
+            options = {decode_key(k): v for k, v in stats.get('options', {}).items()}
+            # Always list the configured options, even when nobody picked them
+            for option in field.get('options', []) or []:
+                options.setdefault(option, 0)
+            summary['optionCounts'] = options
+
+        numeric = stats.get('numeric')
+        if numeric or field['type'] in NUMERIC_FIELD_TYPES:
+            numeric = numeric or {}
+            distribution = sorted(
+                (float(decode_key(k)), v) for k, v in numeric.get('distribution', {}).items()
+            )
+            count = numeric.get('count', 0)
+            summary['stats'] = {
+                'count': count,
+                'sum': numeric.get('sum', 0),
+                'min': numeric.get('min'),
+                'max': numeric.get('max'),
+                'mean': numeric['sum'] / count if count else None,
+                'percentiles': self.percentiles(distribution, count)
+            }
+            summary['distribution'] = {bucket_key(value): n for value, n in distribution}
+
+        if 'recent' in stats:
+            summary['recentResponses'] = stats['recent']
+
+        if terms is not None:
+            summary['topTerms'] = top_terms(terms)
+
+        if sketch is not None:
+            distinct, error = hll_estimate(sketch.get('hll'))
+            approximate = {'distinctCount': distinct, 'distinctCountError': error}
+            if 'stats' in summary:
+                approximate['percentiles'] = percentile_bounds(summary['stats']['percentiles'])
+            if 'sample' in sketch:
+                approximate['sample'] = [entry['value'] for entry in sketch['sample']]
+                approximate['sampleSize'] = len(sketch['sample'])
+            summary['approximate'] = approximate
+
+        return summary
+
+    @staticmethod
+    def percentiles(distribution, count):
+        """Percentiles from a sorted (value, count) histogram"""
+        result = {}
+        if not count:
+            return {f'p{p}': None for p in PERCENTILES}
+        for p in PERCENTILES:
+            rank = p / 100 * count
+            seen = 0
+            for value, n in distribution:
+                seen += n
+                if seen >= rank:
+                    result[f'p{p}'] = value
+                    break
+        return result
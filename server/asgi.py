@@ -4,6 +4,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings')
 
-# For now, just use the standard ASGI application
-# WebSocket functionality can be added later
-application = get_asgi_application()
\ No newline at end of file
+# Initialise Django before importing anything that touches models or settings
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter
+from websockets.routing import websocket_urlpatterns
+from form_builder.routing import websocket_urlpatterns as form_websocket_urlpatterns
+
+application = ProtocolTypeRouter({
+    'http': django_asgi_app,
+    'websocket': URLRouter(websocket_urlpatterns + form_websocket_urlpatterns),
+})
\ No newline at end of file
@@ -0,0 +1,242 @@
+# async_mongodb_service.py
+"""
+Async counterpart of MongoDBService for the ASGI deployment, built on Motor.
+
+It covers the hot paths served by the async views (form lookup, response
+submission, response listing and analytics) and shares the form cache and
+the query/formatting helpers of the sync service, so both return identical
+payloads and see the same cached forms.
+"""
+from motor.motor_asyncio import AsyncIOMotorClient
+from asgiref.sync import sync_to_async
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from django.conf import settings
+from analytics_broadcaster import analytics_broadcaster
+from analytics_store import RECENT_RESPONSES_LIMIT
+from time_series import bucket_starts, time_series_pipeline, fill_buckets
+from segments import select_fields, segment_pipeline, build_segmented_analytics
+from mongodb_service import (
+    mongodb_service, client_options, analytics_read_preference, RESPONSE_LIST_PROJECTION,
+    response_counts_pipeline, counter_increment, counters_version, VERSION_COUNTERS
+)
+from response_dedup import DuplicateResponseError
+
+
+class AsyncMongoDBService:
+    def __init__(self, sync_service):
+        self.sync_service = sync_service
+        self._client = None
+
+    @property
+    def db(self):
+        # Created on first use so the client binds to the running event loop
+        if self._client is None:
+            self._client = AsyncIOMotorClient(settings.MONGODB_URI, **client_options())
+        return self._client[settings.MONGODB_DB_NAME]
+
+    @property
+    def forms_collection(self):
+        return self.db['forms']
+
+    @property
+    def responses_collection(self):
+        return self.db['form_responses']
+
+    @property
+    def analytics_responses_collection(self):
+        return self.responses_collection.with_options(read_preference=analytics_read_preference())
+
+    @property
+    def analytics_forms_collection(self):
+        return self.forms_collection.with_options(read_preference=analytics_read_preference())
+
+    @property
+    def analytics_collection(self):
+        return self.db['form_analytics']
+
+    async def get_form(self, form_id, verify=False):
+        """Get a form by ID, served from the shared form cache when possible.
+
+        verify=True confirms a cached form still exists (see MongoDBService.get_form).
+        """
+        form = self.sync_service.form_cache.get(form_id)
+        if form is not None:
+            if verify and await self.forms_collection.find_one({'_id': ObjectId(form_id)}, {'_id': 1}) is None:
+                self.sync_service.form_cache.invalidate(form_id)
+                return None
+            return form
+        if not ObjectId.is_valid(form_id):
+            return None
+        try:
+            form = await self.forms_collection.find_one({'_id': ObjectId(form_id)})
+            if form:
+                self.sync_service.format_form(form)
+                self.sync_service.form_cache.set(form_id, form)
+            return form
+        except Exception as e:
+            print(f"Error getting form: {e}")
+            return None
+
+    async def create_response(self, form_id, responses, ip_address=None, fields=None, client_key=None):
+        """Create a new form response.
+
+        Raises DuplicateResponseError when the same submission is already stored.
+        """
+        try:
+            if fields is None:
+                form = await self.get_form(form_id)
+                fields = form.get('fields', []) if form else []
+            response_data = self.sync_service.build_submission(form_id, responses, ip_address, client_key, fields)
+            result = await self.responses_collection.insert_one(response_data)
+            response_id = str(result.inserted_id)
+        except DuplicateKeyError as e:
+            existing = None
+            if 'content_hash' in response_data:
+                existing = await self.responses_collection.find_one(
+                    {'content_hash': response_data['content_hash']}, {'_id': 1}
+                )
+            if existing is None:
+                # Another unique index rejected the document; it isn't a repeated submission
+                print(f"Error creating response: {e}")
+                return None
+            raise DuplicateResponseError(str(existing['_id']))
+        except Exception as e:
+            print(f"Error creating response: {e}")
+            return None
+
+        try:
+            counter = await self.db['counters'].update_one({'_id': 'responses'}, counter_increment(1))
+            if counter.matched_count == 0:
+                # Only on a database without counters yet, so the blocking seed runs in a thread
+                await sync_to_async(self.sync_service.seed_counter)('responses')
+        except Exception as e:
+            print(f"Error updating responses counter: {e}")
+
+        # Keep the pre-aggregated analytics in step with the new response
+        try:
+            store = self.sync_service.analytics_store
+            terms_update, update = store.build_response_updates(
+                fields, response_id, responses, response_data['submitted_at'], ip_address
+            )
+            if terms_update:
+                try:
+                    await self.analytics_collection.update_one(store.live_query(form_id), terms_update)
+                except Exception as e:
+                    print(f"Error updating top terms: {e}")
+            summary = await self.analytics_collection.find_one_and_update(
+                store.live_query(form_id), update,
+                projection={'seq': 1}, return_document=ReturnDocument.AFTER
+            )
+            if summary is None:
+                await sync_to_async(store.mark_for_rebuild)(form_id)
+            else:
+                analytics_broadcaster.publish_delta(form_id, store.build_delta(form_id, update, summary['seq']))
+        except Exception as e:
+            print(f"Error updating analytics: {e}")
+        return response_id
+
+    async def get_form_responses_page(self, form_id, limit, cursor=None, fields=None):
+        """Get one page of responses for a form, newest first"""
+        query = self.sync_service.responses_page_query(form_id, cursor)
+        projection = self.sync_service.projection(fields, required=['submitted_at']) or RESPONSE_LIST_PROJECTION
+        responses = await (
+            self.analytics_responses_collection.find(query, projection)
+            .sort([('submitted_at', -1), ('_id', -1)])
+            .limit(limit + 1)
+            .to_list(length=limit + 1)
+        )
+        return self.sync_service.finish_responses_page(responses, limit, fields)
+
+    async def get_analytics_data(self, form_id=None, approx=False):
+        """Get analytics data for forms; approx adds the sketch-based estimates per field"""
+        if form_id:
+            form = await self.get_form(form_id)
+            if not form:
+                return None
+
+            summary = await self.analytics_collection.find_one({'_id': form_id}, None if approx else {'sketches': 0})
+            if summary is None or summary.get('needs_rebuild'):
+                # Until `manage.py reconcile_counters` rebuilds the summary, count the responses
+                results = await self.responses_collection.aggregate(
+                    segment_pipeline(form, form.get('fields', []))
+                ).to_list(length=1)
+                query, projection = self.sync_service.recent_responses_query(form_id)
+                recent = await (
+                    self.responses_collection.find(query, projection)
+                    .sort('submitted_at', -1).limit(RECENT_RESPONSES_LIMIT).to_list(length=RECENT_RESPONSES_LIMIT)
+                )
+                summary = self.sync_service.stand_in_summary(form, summary, results[0] if results else {}, recent)
+            return self.sync_service.build_form_analytics(form, summary, approx=approx)
+
+        forms = await self.analytics_forms_collection.find({}, {'title': 1}).to_list(length=None)
+        summaries = await self.analytics_collection.find({}, {'total_responses': 1, 'needs_rebuild': 1}).to_list(length=None)
+        response_counts, uncounted = self.sync_service.summary_counts([str(form['_id']) for form in forms], summaries)
+        if uncounted:
+            async for row in self.analytics_responses_collection.aggregate(response_counts_pipeline(uncounted)):
+                response_counts[row['_id']] = row['count']
+        recent_responses = await self.get_all_responses()
+        return self.sync_service.build_global_analytics(forms, response_counts, recent_responses)
+
+    async def get_segmented_analytics(self, form, filters=(), group_by=None, field_ids=None, start=None, end=None):
+        """Segmented field analytics (see MongoDBService), sharing its cache"""
+        cache = self.sync_service.segment_cache
+        key = self.sync_service.segment_cache_key(form, filters, group_by, field_ids, start, end)
+        data = cache.get(key)
+        if data is not None:
+            return data
+
+        fields = select_fields(form, field_ids)
+        pipeline = segment_pipeline(form, fields, filters, group_by, start, end)
+        # Same read preference as the seq, as in MongoDBService.get_segmented_analytics
+        seq = await self.get_analytics_version(form['id']) or 0
+        results = await self.responses_collection.aggregate(pipeline).to_list(length=1)
+        data = build_segmented_analytics(
+            form, fields, results[0] if results else {}, filters, group_by,
+            self.sync_service.analytics_store.summarize_field
+        )
+        data['seq'] = seq
+        cache.set(key, data)
+        return data
+
+    async def get_analytics_version(self, form_id=None):
+        """Cheap version of the analytics payload for conditional GETs (see MongoDBService)"""
+        if form_id:
+            summary = await self.analytics_collection.find_one({'_id': form_id}, {'seq': 1})
+            return summary.get('seq', 0) if summary else None
+        counters = self.db['counters'].with_options(read_preference=analytics_read_preference())
+        return counters_version(
+            await counters.find({'_id': {'$in': list(VERSION_COUNTERS)}}, {'seq': 1}).to_list(length=None)
+        )
+
+    async def get_time_series(self, granularity, start, end, form_id=None):
+        """Count responses per time bucket in [start, end), for one form or all of them"""
+        starts = bucket_starts(start, end, granularity)
+        rows = []
+        if starts:
+            pipeline = time_series_pipeline(granularity, starts[0], end, form_id)
+            rows = await self.analytics_responses_collection.aggregate(pipeline).to_list(length=None)
+        return fill_buckets(rows, starts, granularity, end)
+
+    async def get_all_responses(self, limit=20):
+        """Get the most recent responses across forms with their form titles"""
+        responses = await (
+            self.analytics_responses_collection.find({}, RESPONSE_LIST_PROJECTION)
+            .sort('submitted_at', -1).limit(limit).to_list(length=limit)
+        )
+        form_ids = [ObjectId(form_id) for form_id in {r['form_id'] for r in responses} if ObjectId.is_valid(form_id)]
+        titles = {
+            str(form['_id']): form.get('title')
+            async for form in self.analytics_forms_collection.find({'_id': {'$in': form_ids}}, {'title': 1})
+        }
+        for response in responses:
+            response['id'] = str(response['_id'])
+            del response['_id']
+            response['form_title'] = titles.get(response['form_id']) or 'Unknown Form'
+            response['submitted_at'] = response['submitted_at'].isoformat() if response.get('submitted_at') else None
+        return responses
+
+
+# Singleton instance
+async_mongodb_service = AsyncMongoDBService(mongodb_service)
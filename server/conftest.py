@@ -0,0 +1,2 @@
+# conftest.py
+# Puts the server directory on sys.path, so tests import its modules as the app does
@@ -8,6 +8,7 @@ from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 from form_builder.models import Form, FormResponse
 from form_builder.serializers import FormSerializer, FormResponseSerializer
+from form_builder.validation import validate_form_fields
 import os
 
 # Try to import MongoDB service
@@ -49,6 +50,10 @@ class DualBackendFormViewSet(viewsets.ModelViewSet):
     def create(self, request):
         """Create a new form"""
         if self.use_mongodb():
+            errors = validate_form_fields(request.data.get('fields', []))
+            if errors:
+                return Response({'error': 'Invalid fields', 'errors': errors},
+                                status=status.HTTP_400_BAD_REQUEST)
             form_id = mongodb_service.create_form(
                 title=request.data.get('title'),
                 description=request.data.get('description'),
@@ -75,6 +80,10 @@ class DualBackendFormViewSet(viewsets.ModelViewSet):
     def update(self, request, pk=None):
         """Update a form"""
         if self.use_mongodb():
+            errors = validate_form_fields(request.data.get('fields'))
+            if errors:
+                return Response({'error': 'Invalid fields', 'errors': errors},
+                                status=status.HTTP_400_BAD_REQUEST)
             success = mongodb_service.update_form(
                 form_id=pk,
                 title=request.data.get('title'),
@@ -107,7 +116,7 @@ class DualBackendFormViewSet(viewsets.ModelViewSet):
         """Submit a response to a form"""
         if self.use_mongodb():
             # Check if form exists
-            form = mongodb_service.get_form(pk)
+            form = mongodb_service.get_form(pk, verify=True)
             if not form:
                 return Response({'error': 'Form not found'}, status=status.HTTP_404_NOT_FOUND)
             
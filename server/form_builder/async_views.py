@@ -0,0 +1,127 @@
+# form_builder/async_views.py
+"""
+Native async views for the hot form/response endpoints.
+
+Enabled with ASYNC_VIEWS=True when serving asgi.py under uvicorn; they take
+over the same URLs as FormViewSet and return the same payloads, but talk to
+MongoDB through Motor, so a request never ties up a worker thread.
+"""
+import json
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from analytics_broadcaster import analytics_broadcaster
+from async_mongodb_service import async_mongodb_service
+from http_caching import form_validators, not_modified, set_validators
+from renderers import ORJSONResponse
+from mongodb_service import mongodb_service
+from response_buffer import BufferFullError
+from response_dedup import DuplicateResponseError
+from .validation import validate_responses
+from .views import FormViewSet, parse_page_params
+
+# Writes to a single form stay on the DRF view
+form_detail_sync = csrf_exempt(FormViewSet.as_view({'get': 'retrieve', 'put': 'update', 'delete': 'destroy'}))
+
+
+def get_client_ip(request):
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        return x_forwarded_for.split(',')[0]
+    return request.META.get('REMOTE_ADDR')
+
+
+@csrf_exempt
+async def form_detail(request, pk):
+    """GET a form asynchronously; other methods fall through to FormViewSet"""
+    if request.method != 'GET':
+        return await sync_to_async(form_detail_sync)(request, pk=pk)
+    form = await async_mongodb_service.get_form(pk)
+    if form:
+        etag, last_modified = form_validators(form)
+        response = not_modified(request, etag, last_modified) or ORJSONResponse(mongodb_service.encode_form(form))
+        return set_validators(response, etag, last_modified, settings.FORM_CACHE_CONTROL)
+    return ORJSONResponse({'error': 'Form not found'}, status=status.HTTP_404_NOT_FOUND)
+
+
+@csrf_exempt
+async def submit_response(request, pk):
+    """Submit a response to a form"""
+    if request.method != 'POST':
+        return HttpResponse(status=status.HTTP_405_METHOD_NOT_ALLOWED)
+    try:
+        data = json.loads(request.body or b'{}')
+        form = await async_mongodb_service.get_form(pk, verify=True)
+        if not form:
+            return ORJSONResponse({'error': 'Form not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        responses = data.get('responses', {})
+        errors = validate_responses(form, responses)
+        if errors:
+            return ORJSONResponse({'error': 'Validation failed', 'errors': errors},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        client_key = request.headers.get('Idempotency-Key')
+        if mongodb_service.response_buffer is not None:
+            try:
+                # Blocking service call (queue lock, form lookup without fields), so it runs in a thread
+                response_id = await sync_to_async(mongodb_service.enqueue_response)(
+                    form_id=pk,
+                    responses=responses,
+                    ip_address=get_client_ip(request),
+                    fields=form.get('fields', []),
+                    client_key=client_key
+                )
+            except BufferFullError as e:
+                response = ORJSONResponse({'error': str(e)}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+                response['Retry-After'] = '1'
+                return response
+            created_status = status.HTTP_202_ACCEPTED
+        else:
+            try:
+                response_id = await async_mongodb_service.create_response(
+                    form_id=pk,
+                    responses=responses,
+                    ip_address=get_client_ip(request),
+                    fields=form.get('fields', []),
+                    client_key=client_key
+                )
+            except DuplicateResponseError as e:
+                # A double-click or retry: answer like the original submission, without a new notification
+                return ORJSONResponse({
+                    'id': e.response_id,
+                    'message': 'Duplicate response ignored',
+                    'duplicate': True
+                }, status=status.HTTP_200_OK)
+            created_status = status.HTTP_201_CREATED
+
+        if not response_id:
+            return ORJSONResponse({'error': 'Failed to create response'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Real-time notification, coalesced with other submissions
+        analytics_broadcaster.publish(pk, form['title'], [response_id])
+
+        return ORJSONResponse({
+            'id': response_id,
+            'message': 'Response submitted successfully'
+        }, status=created_status)
+    except Exception as e:
+        return ORJSONResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+async def get_responses(request, pk):
+    """Get responses for a form, newest first, one page at a time"""
+    try:
+        form = await async_mongodb_service.get_form(pk)
+        if not form:
+            return ORJSONResponse({'error': 'Form not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        limit, cursor, fields = parse_page_params(request.GET)
+        responses, next_cursor = await async_mongodb_service.get_form_responses_page(
+            pk, limit, cursor=cursor, fields=fields
+        )
+        return ORJSONResponse({'results': responses, 'next_cursor': next_cursor})
+    except Exception as e:
+        return ORJSONResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,78 @@
+# form_builder/exports.py
+"""
+Streaming exports of form responses.
+
+Rows are produced one at a time from a MongoDB cursor so memory use stays
+constant no matter how many responses a form has.
+"""
+import csv
+from renderers import render_json
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class Echo:
+    """File-like object whose write() hands the line back to the caller"""
+    def write(self, value):
+        return value
+
+
+def export_columns(form):
+    """Column headers: response metadata followed by the form's fields in order.
+
+    A label that is already taken (by another field or a metadata column) gets the field id appended.
+    """
+    fields = form.get('fields', [])
+    labels = [field.get('label') or field['id'] for field in fields]
+    taken = {'id', 'submitted_at'}
+    columns = ['id', 'submitted_at']
+    for field, label in zip(fields, labels):
+        if label in taken or labels.count(label) > 1:
+            label = f"{label} ({field['id']})"
+        taken.add(label)
+        columns.append(label)
+    return columns
+
+
+def flatten_response(form, response):
+    """Flatten one response document into values ordered like export_columns"""
+    answers = response.get('responses') or {}
+    submitted_at = response.get('submitted_at')
+    row = [str(response['_id']), submitted_at.isoformat() if submitted_at else None]
+    for field in form.get('fields', []):
+        row.append(answers.get(field['id']) if isinstance(answers, dict) else None)
+    return row
+
+
+def stream_csv(form, responses):
+    """Yield the export as CSV lines"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(export_columns(form))
+    for response in responses:
+        row = flatten_response(form, response)
+        # Checkbox answers are lists; keep them in a single cell
+        yield writer.writerow(['; '.join(map(str, value)) if isinstance(value, list) else value for value in row])
+
+
+def stream_ndjson(form, responses):
+    """Yield the export as one JSON object per line.
+
+    The first line describes the fields ({'form_id', 'fields': [{'id', 'label', 'type'}]});
+    each response follows as {'id', 'submitted_at', 'responses': {field id: answer}}, keyed
+    by field id so fields sharing a label (or labelled like a metadata key) stay distinct.
+    """
+    fields = form.get('fields', [])
+    yield render_json({
+        'form_id': form['id'],
+        'fields': [{'id': field['id'], 'label': field.get('label'), 'type': field.get('type')} for field in fields]
+    }) + b'\n'
+    for response in responses:
+        row = flatten_response(form, response)
+        yield render_json({
+            'id': row[0],
+            'submitted_at': row[1],
+            'responses': {field['id']: value for field, value in zip(fields, row[2:])}
+        }) + b'\n'
@@ -0,0 +1,88 @@
+# benchmark_analytics.py
+from django.core.management.base import BaseCommand, CommandError
+from pymongo import monitoring
+from mongodb_service import mongodb_service
+import time
+
+BENCHMARK_FIELDS = [
+    {'id': 'rating', 'type': 'rating', 'label': 'Rating'},
+    {'id': 'choice', 'type': 'multiple-choice', 'label': 'Choice', 'options': ['A', 'B', 'C']},
+]
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts the commands sent to MongoDB, i.e. the round trips"""
+
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        self.commands.append(event.command_name)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Count the MongoDB round trips of global and per-form analytics as the number of forms grows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--form-counts', type=str, default='10,100,1000',
+                            help='Comma-separated numbers of scratch forms to measure with')
+        parser.add_argument('--responses', type=int, default=5, help='Responses per scratch form')
+        parser.add_argument('--repeat', type=int, default=5, help='Analytics reads per measurement')
+
+    def handle(self, *args, **options):
+        # The MongoDB client is created on first use, so it picks up a listener registered now
+        counter = CommandCounter()
+        monitoring.register(counter)
+
+        form_ids = []
+        rows = []
+        try:
+            for count in sorted(int(size) for size in options['form_counts'].split(',') if size.strip()):
+                while len(form_ids) < count:
+                    form_ids.append(self.create_form(len(form_ids), options['responses']))
+                rows.append((count, 'global', *self.measure(counter, options['repeat'], mongodb_service.get_analytics_data)))
+                rows.append((count, 'per form', *self.measure(
+                    counter, options['repeat'], lambda: mongodb_service.get_analytics_data(form_id=form_ids[0])
+                )))
+        finally:
+            for form_id in form_ids:
+                mongodb_service.delete_form(form_id)
+
+        self.stdout.write(f'{"forms":>7} {"analytics":<10} {"queries":>8} {"getMores":>9} {"ms":>9}')
+        for count, label, queries, get_mores, elapsed in rows:
+            self.stdout.write(f'{count:>7} {label:<10} {queries:>8} {get_mores:>9} {elapsed * 1000:>9.1f}')
+
+        # getMore round trips grow with the size of the results; the number of queries must not
+        for label in ('global', 'per form'):
+            queries = {row[2] for row in rows if row[1] == label}
+            if len(queries) > 1:
+                raise CommandError(f'{label} analytics issue {sorted(queries)} queries depending on the number of forms')
+        self.stdout.write(self.style.SUCCESS('Query count is constant in the number of forms'))
+
+    def create_form(self, index, responses):
+        form_id = mongodb_service.create_form(
+            title=f'Analytics benchmark {index}',
+            description='Temporary form created by benchmark_analytics',
+            fields=BENCHMARK_FIELDS
+        )
+        mongodb_service.create_responses(
+            form_id, [({'rating': i % 5 + 1, 'choice': 'ABC'[i % 3]}, None) for i in range(responses)],
+            fields=BENCHMARK_FIELDS
+        )
+        return form_id
+
+    def measure(self, counter, repeat, read):
+        """(queries, getMores, seconds) of one analytics read, averaged over `repeat` reads"""
+        counter.commands.clear()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            read()
+        elapsed = (time.perf_counter() - start) / repeat
+        get_mores = counter.commands.count('getMore') // repeat
+        return len(counter.commands) // repeat - get_mores, get_mores, elapsed
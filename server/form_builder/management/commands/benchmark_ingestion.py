@@ -0,0 +1,75 @@
+# benchmark_ingestion.py
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from mongodb_service import mongodb_service
+from response_buffer import ResponseBuffer, BufferFullError
+import time
+
+BENCHMARK_FIELDS = [
+    {'id': 'rating', 'type': 'rating', 'label': 'Rating'},
+    {'id': 'choice', 'type': 'multiple-choice', 'label': 'Choice', 'options': ['A', 'B', 'C']},
+    {'id': 'comment', 'type': 'text', 'label': 'Comment'},
+]
+
+
+class Command(BaseCommand):
+    help = 'Compare response ingestion throughput: one insert per submission vs the batched buffer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=5000, help='Submissions per run')
+        parser.add_argument('--threads', type=int, default=16, help='Concurrent submitting threads')
+        parser.add_argument('--batch-size', type=int, default=500, help='Buffer batch size')
+
+    def handle(self, *args, **options):
+        count = options['count']
+        threads = options['threads']
+
+        # Work on a scratch form so real data is untouched
+        form_id = mongodb_service.create_form(
+            title='Ingestion benchmark',
+            description='Temporary form created by benchmark_ingestion',
+            fields=BENCHMARK_FIELDS
+        )
+        try:
+            direct = self.run(count, threads, lambda i: mongodb_service.create_response(
+                form_id, self.sample(i), fields=BENCHMARK_FIELDS
+            ))
+            self.report('insert_one per submission', count, direct)
+
+            buffer = ResponseBuffer(mongodb_service.insert_responses, max_size=count, batch_size=options['batch_size'])
+
+            def submit(i):
+                response = mongodb_service.build_response(form_id, self.sample(i))
+                while True:
+                    try:
+                        buffer.submit((response, BENCHMARK_FIELDS))
+                        return
+                    except BufferFullError:
+                        time.sleep(0.001)
+
+            def buffered_run():
+                self.run(count, threads, submit)
+                # Wait for the background thread to write everything out
+                while buffer.flushed + buffer.failed < count:
+                    time.sleep(0.001)
+
+            buffered = self.timed(buffered_run)
+            self.report('buffered insert_many', count, buffered)
+            self.stdout.write(self.style.SUCCESS(f'Speed-up: {direct / buffered:.1f}x'))
+        finally:
+            mongodb_service.delete_form(form_id)
+
+    def sample(self, i):
+        return {'rating': i % 5 + 1, 'choice': 'ABC'[i % 3], 'comment': f'Benchmark response {i}'}
+
+    def run(self, count, threads, submit):
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            return self.timed(lambda: list(executor.map(submit, range(count))))
+
+    def timed(self, fn):
+        start = time.perf_counter()
+        fn()
+        return time.perf_counter() - start
+
+    def report(self, label, count, elapsed):
+        self.stdout.write(f'{label}: {count} responses in {elapsed:.2f}s ({count / elapsed:.0f}/s)')
@@ -0,0 +1,88 @@
+# benchmark_serialization.py
+from datetime import datetime
+from bson import ObjectId
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from form_cache import FormCache
+from mongodb_service import mongodb_service
+from renderers import ORJSONRenderer, render_json
+import time
+
+
+class Command(BaseCommand):
+    help = 'Compare per-request JSON serialization cost: DRF JSONRenderer, orjson and pre-encoded forms'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--field-counts', type=str, default='10,100,1000',
+                            help='Comma-separated sizes of the form fields arrays')
+        parser.add_argument('--page-sizes', type=str, default='50,500',
+                            help='Comma-separated sizes of the response lists')
+        parser.add_argument('--repeat', type=int, default=200, help='Renders per measurement')
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        drf = JSONRenderer()
+        orjson_renderer = ORJSONRenderer()
+
+        self.stdout.write('Form definitions (GET /forms/<id>/)')
+        for count in self.sizes(options['field_counts']):
+            form = mongodb_service.format_form(self.sample_form(count))
+            cache = FormCache()
+            cache.set(form['id'], form)
+            results = {
+                'DRF JSONRenderer': self.timed(repeat, lambda: drf.render(form)),
+                'orjson': self.timed(repeat, lambda: orjson_renderer.render(form)),
+                'pre-encoded': self.timed(repeat, lambda: cache.encoded(form['id'], form, render_json)),
+            }
+            self.report(f'{count} fields', results)
+
+        self.stdout.write('Response pages (GET /forms/<id>/get_responses/)')
+        for count in self.sizes(options['page_sizes']):
+            page = [self.sample_response(i) for i in range(count)]
+            results = {
+                'DRF JSONRenderer': self.timed(repeat, lambda: drf.render({'results': page, 'next_cursor': None})),
+                'orjson': self.timed(repeat, lambda: orjson_renderer.render({'results': page, 'next_cursor': None})),
+            }
+            self.report(f'{count} responses', results)
+
+    def sizes(self, value):
+        return [int(size) for size in value.split(',') if size.strip()]
+
+    def sample_form(self, count):
+        fields = []
+        for i in range(count):
+            field = {'id': f'field_{i}', 'type': 'multiple-choice', 'label': f'Question {i}', 'required': i % 2 == 0}
+            field['options'] = [f'Option {j}' for j in range(5)]
+            fields.append(field)
+        return {
+            '_id': ObjectId(),
+            'title': 'Serialization benchmark',
+            'description': 'A form with a large fields array',
+            'fields': fields,
+            'created_at': datetime.utcnow(),
+            'updated_at': datetime.utcnow()
+        }
+
+    def sample_response(self, i):
+        return {
+            'id': str(ObjectId()),
+            'form_id': str(ObjectId()),
+            'responses': {'rating': i % 5 + 1, 'choice': 'ABC'[i % 3], 'comment': f'Benchmark response {i}'},
+            'submitted_at': datetime.utcnow().isoformat(),
+            'ip_address': '127.0.0.1'
+        }
+
+    def timed(self, repeat, fn):
+        """Mean seconds per call"""
+        fn()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        return (time.perf_counter() - start) / repeat
+
+    def report(self, label, results):
+        baseline = results['DRF JSONRenderer']
+        timings = ', '.join(
+            f'{name} {seconds * 1e6:.1f}us ({baseline / seconds:.1f}x)' for name, seconds in results.items()
+        )
+        self.stdout.write(f'  {label}: {timings}')
@@ -0,0 +1,28 @@
+# build_search_index.py
+from django.core.management.base import BaseCommand, CommandError
+from mongodb_service import mongodb_service
+
+
+class Command(BaseCommand):
+    help = 'Create the search index and (re)build the search text of stored responses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--form', type=str, default=None, help='Only rebuild this form')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Responses per bulk write')
+
+    def handle(self, *args, **options):
+        mongodb_service.ensure_indexes()
+        if options['form']:
+            form = mongodb_service.get_form(options['form'])
+            if not form:
+                raise CommandError(f'Form not found: {options["form"]}')
+            forms = [form]
+        else:
+            forms = mongodb_service.get_all_forms()
+
+        total = 0
+        for form in forms:
+            updated = mongodb_service.index_search_text(form['id'], form.get('fields', []), options['batch_size'])
+            total += updated
+            self.stdout.write(f'{form["title"]}: {updated} responses updated')
+        self.stdout.write(self.style.SUCCESS(f'Search text rebuilt for {len(forms)} forms ({total} responses updated)'))
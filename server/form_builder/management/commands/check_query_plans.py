@@ -0,0 +1,191 @@
+# check_query_plans.py
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from pymongo import monitoring
+from mongodb_service import mongodb_service, COUNTED_COLLECTIONS
+from response_dedup import DuplicateResponseError
+
+SCRATCH_FIELDS = [
+    {'id': 'rating', 'type': 'rating', 'label': 'Rating'},
+    {'id': 'choice', 'type': 'multiple-choice', 'label': 'Choice', 'options': ['A', 'B']},
+    {'id': 'comment', 'type': 'text', 'label': 'Comment'},
+]
+
+# Steps that read a whole (small) collection on purpose, by (step, collection), with the reason
+ALLOWED_COLLSCANS = {
+    ('all forms', 'forms'): 'get_all_forms lists every form',
+    ('global analytics', 'forms'): 'global analytics lists every form',
+    ('global analytics', 'form_analytics'): 'global analytics reads one summary per form',
+    ('response counts', 'form_analytics'): 'per-form counts read one summary per form',
+    ('seed counters', 'forms'): 'a missing counter is seeded once from a full count',
+    ('seed counters', 'form_responses'): 'a missing counter is seeded once from a full count',
+}
+
+# Commands that carry a query plan; the others (insert, getMore, ...) are skipped
+EXPLAINABLE = ('find', 'aggregate', 'count', 'distinct', 'findAndModify', 'update', 'delete')
+# Per-request fields the driver adds, which explain rejects or doesn't need
+DRIVER_FIELDS = ('lsid', '$db', '$clusterTime', '$readPreference', 'txnNumber', 'autocommit',
+                 'readConcern', 'writeConcern', 'ordered', 'bypassDocumentValidation')
+
+
+class CommandRecorder(monitoring.CommandListener):
+    """Records the commands sent to MongoDB, labelled with the step that sent them"""
+
+    def __init__(self):
+        self.step = None
+        self.commands = []
+
+    def started(self, event):
+        if self.step is not None and event.command_name in EXPLAINABLE:
+            self.commands.append((self.step, event.command_name, dict(event.command)))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def find_collscans(plan):
+    """Yield every COLLSCAN stage in an explain output, ignoring rejected plans"""
+    if isinstance(plan, dict):
+        if plan.get('stage') == 'COLLSCAN':
+            yield plan
+        for key, value in plan.items():
+            if key not in ('rejectedPlans', 'allPlansExecution'):
+                yield from find_collscans(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from find_collscans(item)
+
+
+def explainable_commands(command_name, command):
+    """The recorded command as explain targets: one per statement for update and delete"""
+    command = {key: value for key, value in command.items() if key not in DRIVER_FIELDS}
+    if command_name in ('update', 'delete'):
+        statements = 'updates' if command_name == 'update' else 'deletes'
+        for statement in command[statements]:
+            yield {**command, statements: [statement]}
+    else:
+        yield command
+
+
+class Command(BaseCommand):
+    help = ('Run every MongoDBService query on a scratch form, explain the commands it actually '
+            'sends and fail if any of them is a COLLSCAN')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ensure-indexes', action='store_true',
+                            help='Create the declared indexes before checking')
+
+    def handle(self, *args, **options):
+        # The MongoDB client is created on first use, so it picks up a listener registered now
+        recorder = CommandRecorder()
+        monitoring.register(recorder)
+        if options['ensure_indexes']:
+            mongodb_service.ensure_indexes()
+
+        # Seeding first means creating and deleting the scratch form never seeds a counter
+        self.run_step(recorder, 'seed counters', lambda: [mongodb_service.seed_counter(name) for name in COUNTED_COLLECTIONS])
+        form_id = self.run_step(recorder, 'create form', lambda: mongodb_service.create_form(
+            title='Query plan check', description='Temporary form created by check_query_plans', fields=SCRATCH_FIELDS
+        ))
+        if not form_id:
+            raise CommandError('Could not create the scratch form')
+        try:
+            for step, run in self.steps(form_id):
+                self.run_step(recorder, step, run)
+        finally:
+            self.run_step(recorder, 'delete form', lambda: mongodb_service.delete_form(form_id))
+
+        failures = []
+        checked = set()
+        for step, command_name, command in recorder.commands:
+            collection = command[command_name]
+            for target in explainable_commands(command_name, command):
+                key = (step, repr(target))
+                if key in checked:
+                    continue
+                checked.add(key)
+                explain = mongodb_service.db.command({'explain': target, 'verbosity': 'queryPlanner'})
+                label = f'{step}: {command_name} on {collection}'
+                if not list(find_collscans(explain)):
+                    self.stdout.write(f'ok        {label}')
+                elif (step, collection) in ALLOWED_COLLSCANS:
+                    self.stdout.write(f'allowed   {label} ({ALLOWED_COLLSCANS[(step, collection)]})')
+                else:
+                    self.stdout.write(self.style.ERROR(f'COLLSCAN  {label}'))
+                    failures.append(label)
+
+        if failures:
+            raise CommandError(f'{len(failures)} queries fall back to a collection scan: {", ".join(failures)}')
+        self.stdout.write(self.style.SUCCESS(f'No unexpected collection scans in {len(checked)} queries'))
+
+    @staticmethod
+    def run_step(recorder, step, run):
+        """Run one step, recording the commands it sends under its name"""
+        recorder.step = step
+        try:
+            return run()
+        finally:
+            recorder.step = None
+
+    def steps(self, form_id):
+        """(name, callable) running each service query path, with cursors, on the scratch form"""
+        service = mongodb_service
+        end = datetime.utcnow()
+        start = end - timedelta(days=30)
+        submissions = [({'rating': i % 5 + 1, 'choice': 'AB'[i % 2], 'comment': 'fast friendly support'}, f'key-{i}')
+                       for i in range(3)]
+
+        def fresh_form():
+            service.form_cache.invalidate(form_id)
+            return service.get_form(form_id)
+
+        def submit():
+            for _ in range(2):
+                try:
+                    service.create_response(form_id, {'rating': 5, 'comment': 'great app'}, client_key='check')
+                except DuplicateResponseError:
+                    pass
+
+        def pages(read, cursor=None):
+            # Read the first page, then the next one from its cursor (or from the given one)
+            cursor = read(None)[1] or cursor
+            if cursor:
+                read(cursor)
+
+        def segments():
+            service.segment_cache.clear()
+            service.get_segmented_analytics(fresh_form(), filters=[('rating', 'eq', '5')], group_by='choice')
+
+        def stand_in_analytics():
+            service.analytics_store.mark_for_rebuild(form_id)
+            service.get_analytics_data(form_id=form_id)
+            service.get_response_count(form_id)
+            service.rebuild_form_analytics(form_id, SCRATCH_FIELDS)
+
+        return [
+            ('form by id', fresh_form),
+            ('all forms', service.get_all_forms),
+            ('forms page', lambda: pages(lambda cursor: service.get_forms_page(1, cursor=cursor),
+                                         service.encode_cursor({'id': form_id}))),
+            ('update form', lambda: service.update_form(form_id, title='Query plan check (edited)')),
+            ('submit response', submit),
+            ('submit batch', lambda: [service.create_responses(form_id, submissions) for _ in range(2)]),
+            ('responses page', lambda: pages(lambda cursor: service.get_form_responses_page(form_id, 1, cursor=cursor))),
+            ('responses for a form', lambda: service.get_form_responses(form_id)),
+            ('responses export', lambda: list(service.iter_form_responses(form_id))),
+            ('search', lambda: pages(lambda cursor: service.search_responses(form_id, 'support', 1, cursor=cursor))),
+            ('search index', lambda: service.index_search_text(form_id, SCRATCH_FIELDS)),
+            ('response counts', lambda: (service.get_response_count(form_id), service.get_response_counts([form_id]),
+                                         service.count_responses_by_form(), service.count_responses_by_form([form_id]))),
+            ('form analytics', lambda: (service.get_analytics_data(form_id=form_id),
+                                        service.get_analytics_data(form_id=form_id, approx=True),
+                                        service.get_analytics_version(form_id))),
+            ('stand-in analytics', stand_in_analytics),
+            ('global analytics', lambda: (service.get_analytics_data(), service.get_analytics_version())),
+            ('time series', lambda: (service.get_time_series('day', start, end, form_id),
+                                     service.get_time_series('day', start, end))),
+            ('segments', segments),
+        ]
@@ -0,0 +1,61 @@
+# check_read_routing.py
+from bson import ObjectId
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from mongodb_service import mongodb_service, response_counts_pipeline
+
+
+class Command(BaseCommand):
+    help = 'Run the analytics, listing and export queries and report which replica set member served each'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--require-secondary', action='store_true',
+                            help='Fail if any of the queries was served by the primary')
+        parser.add_argument('--form-id', type=str, default=None,
+                            help='Form id to use in per-form queries (defaults to any existing form)')
+
+    def handle(self, *args, **options):
+        client = mongodb_service.client
+        client.admin.command('ping')
+        primary = client.primary
+        secondaries = client.secondaries
+        self.stdout.write(
+            f'read preference {settings.MONGODB_ANALYTICS_READ_PREFERENCE}, '
+            f'max staleness {settings.MONGODB_ANALYTICS_MAX_STALENESS_SECONDS}s'
+        )
+        self.stdout.write(f'primary {primary}, secondaries {sorted(secondaries) or "none"}')
+
+        form_id = options['form_id']
+        if form_id is None:
+            form = mongodb_service.forms_collection.find_one({}, {'_id': 1})
+            form_id = str(form['_id']) if form else str(ObjectId())
+
+        on_primary = []
+        for name, cursor in self.queries(form_id):
+            # The first batch is enough to know which member answered
+            next(cursor, None)
+            address = cursor.address
+            cursor.close()
+            if address == primary:
+                role = 'primary'
+                on_primary.append(name)
+            elif address in secondaries:
+                role = 'secondary'
+            else:
+                role = 'standalone'
+            self.stdout.write(f'{role:<10} {name} ({address[0]}:{address[1]})' if address else f'{role:<10} {name}')
+
+        if on_primary and options['require_secondary']:
+            raise CommandError(f'{len(on_primary)} queries were served by the primary: {", ".join(on_primary)}')
+
+    def queries(self, form_id):
+        """(name, cursor) for each query routed with the analytics read preference"""
+        responses = mongodb_service.analytics_responses_collection
+        forms = mongodb_service.analytics_forms_collection
+        return [
+            ('form titles for global analytics', forms.find({}, {'title': 1})),
+            ('response counts of forms without a summary', responses.aggregate(response_counts_pipeline([form_id]))),
+            ('recent responses', responses.find().sort('submitted_at', -1).limit(20)),
+            ('responses page', responses.find({'form_id': form_id}).sort([('submitted_at', -1), ('_id', -1)]).limit(51)),
+            ('responses export', mongodb_service.iter_form_responses(form_id)),
+        ]
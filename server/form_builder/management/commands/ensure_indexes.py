@@ -0,0 +1,14 @@
+# ensure_indexes.py
+from django.core.management.base import BaseCommand
+from mongodb_service import mongodb_service
+
+
+class Command(BaseCommand):
+    help = 'Create the MongoDB indexes declared in mongodb_service.INDEXES'
+
+    def handle(self, *args, **options):
+        created = mongodb_service.ensure_indexes()
+        for collection_name, names in created.items():
+            for name in names:
+                self.stdout.write(f'{collection_name}: {name}')
+        self.stdout.write(self.style.SUCCESS('Indexes are up to date'))
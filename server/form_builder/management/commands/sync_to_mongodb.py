@@ -1,21 +1,143 @@
 # sync_to_mongodb.py
-from django.core.management.base import BaseCommand
-from form_builder.models import Form, FormResponse
-import sys
+"""
+Bulk migration between the legacy SQLite database (the Django tables
+form_builder_form / form_builder_formresponse) and MongoDB.
+
+to-mongo copies forms with one insert_many and each form's responses in
+batches through MongoDBService.write_responses, with a worker pool across
+forms. Every migrated document carries a content hash (forms: `import_key`,
+responses: `idempotency_key`) backed by a unique index, so reruns never
+duplicate anything. Progress is checkpointed after every batch, so an
+interrupted run resumes where it stopped instead of re-reading every form.
+
+from-mongo streams each form's responses and writes the missing ones with
+executemany batches; existing rows are matched by the same content hash,
+loaded once per form.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from datetime import datetime, timezone
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from mongodb_service import mongodb_service, utcnow
+from search import search_text
+import hashlib
+import json
 import os
+import sqlite3
+import threading
+import time
+
+FORMS_TABLE = 'form_builder_form'
+RESPONSES_TABLE = 'form_builder_formresponse'
+
+CREATE_TABLES = f"""
+CREATE TABLE IF NOT EXISTS {FORMS_TABLE} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title VARCHAR(200) NOT NULL,
+    description TEXT NOT NULL,
+    fields TEXT NOT NULL,
+    created_at DATETIME NOT NULL,
+    updated_at DATETIME NOT NULL
+);
+CREATE TABLE IF NOT EXISTS {RESPONSES_TABLE} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    form_id INTEGER NOT NULL REFERENCES {FORMS_TABLE} (id),
+    responses TEXT NOT NULL,
+    submitted_at DATETIME NOT NULL,
+    ip_address CHAR(39) NULL
+);
+CREATE INDEX IF NOT EXISTS {RESPONSES_TABLE}_form_id ON {RESPONSES_TABLE} (form_id, id);
+"""
+
+
+def content_hash(*parts):
+    """Stable hash of JSON-serializable parts, used as the idempotency key of migrated documents"""
+    encoded = json.dumps(parts, sort_keys=True, default=str, separators=(',', ':')).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def parse_json(value):
+    return json.loads(value) if isinstance(value, (str, bytes)) else value
+
+
+def parse_datetime(value):
+    """SQLite/ISO timestamp -> naive UTC datetime, as stored in MongoDB"""
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    # MongoDB keeps milliseconds; hash the value as it will be read back
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+
+def response_key(form_key, responses, submitted_at, ip_address):
+    return 'sync-' + content_hash(form_key, responses, submitted_at.isoformat() if submitted_at else None, ip_address)
+
 
-# Add the parent directory to the path to import mongodb_service
-sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+class Checkpoint:
+    """Per-form progress of a to-mongo run, written after every batch"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.forms = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.forms = json.load(f).get('forms', {})
+
+    def get(self, form_key):
+        with self.lock:
+            return dict(self.forms.get(form_key, {}))
+
+    def update(self, form_key, **values):
+        with self.lock:
+            self.forms.setdefault(form_key, {}).update(values)
+            if not self.path:
+                return
+            # Write-then-rename so a crash never leaves a truncated checkpoint
+            temp_path = f'{self.path}.tmp'
+            with open(temp_path, 'w') as f:
+                json.dump({'forms': self.forms}, f)
+            os.replace(temp_path, self.path)
+
+
+class Progress:
+    """Thread-safe counters, reported every `interval` seconds and at the end"""
+
+    def __init__(self, stdout, total_forms, interval=2.0):
+        self.stdout = stdout
+        self.total_forms = total_forms
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.started_at = time.perf_counter()
+        self.reported_at = self.started_at
+        self.counts = {'forms': 0, 'responses': 0, 'duplicates': 0, 'failed': 0}
+
+    def add(self, **counts):
+        with self.lock:
+            for name, value in counts.items():
+                self.counts[name] += value
+            if time.perf_counter() - self.reported_at >= self.interval:
+                self.report()
+
+    def report(self):
+        self.reported_at = time.perf_counter()
+        elapsed = self.reported_at - self.started_at
+        counts = self.counts
+        self.stdout.write(
+            f"forms {counts['forms']}/{self.total_forms}, responses {counts['responses']} "
+            f"({counts['responses'] / elapsed if elapsed else 0:.0f}/s), "
+            f"duplicates skipped {counts['duplicates']}, failed {counts['failed']}, {elapsed:.1f}s"
+        )
 
-try:
-    from mongodb_service import mongodb_service
-    MONGODB_AVAILABLE = True
-except ImportError:
-    MONGODB_AVAILABLE = False
-    print("MongoDB service not available. Install pymongo to use MongoDB features.")
 
 class Command(BaseCommand):
-    help = 'Sync data from SQLite to MongoDB'
+    help = 'Bulk-copy forms and responses between the legacy SQLite database and MongoDB (resumable, idempotent)'
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -25,114 +147,228 @@ class Command(BaseCommand):
             default='to-mongo',
             help='Direction to sync data (to-mongo or from-mongo)'
         )
+        parser.add_argument('--database', type=str, default=str(settings.BASE_DIR / 'db.sqlite3'),
+                            help='Path of the SQLite database')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Responses per bulk write')
+        parser.add_argument('--workers', type=int, default=4, help='Forms migrated in parallel (to-mongo)')
+        parser.add_argument('--checkpoint', type=str, default=None,
+                            help='Checkpoint file (default: <database>.sync-checkpoint.json)')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint')
 
     def handle(self, *args, **options):
-        if not MONGODB_AVAILABLE:
-            self.stdout.write(
-                self.style.ERROR('MongoDB service not available. Install pymongo first.')
-            )
-            return
-
-        direction = options['direction']
+        self.database = options['database']
+        self.batch_size = options['batch_size']
 
-        if direction == 'to-mongo':
-            self.sync_to_mongodb()
-        elif direction == 'from-mongo':
+        if options['direction'] == 'to-mongo':
+            if not os.path.exists(self.database):
+                raise CommandError(f'SQLite database not found: {self.database}')
+            checkpoint_path = options['checkpoint'] or f'{self.database}.sync-checkpoint.json'
+            if options['restart'] and os.path.exists(checkpoint_path):
+                os.remove(checkpoint_path)
+            self.sync_to_mongodb(Checkpoint(checkpoint_path), options['workers'])
+        else:
             self.sync_from_mongodb()
 
-    def sync_to_mongodb(self):
+    def connect(self):
+        """A SQLite connection; use it as `with closing(...) as c, c:` to commit and close it"""
+        connection = sqlite3.connect(self.database)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def sync_to_mongodb(self, checkpoint, workers):
         """Sync data from SQLite to MongoDB"""
-        self.stdout.write('Syncing data from SQLite to MongoDB...')
-        
-        # Sync forms
-        forms = Form.objects.all()
-        synced_forms = 0
-        
+        self.stdout.write(f'Syncing data from {self.database} to MongoDB...')
+        # The unique import_key / idempotency_key indexes make reruns safe
+        mongodb_service.ensure_indexes()
+
+        with closing(self.connect()) as connection, connection:
+            forms = [dict(row) for row in connection.execute(f'SELECT * FROM {FORMS_TABLE} ORDER BY id')]
+        mongo_ids = self.import_forms(forms)
+
+        progress = Progress(self.stdout, len(forms))
+        pending = []
+        done = 0
         for form in forms:
+            key = self.form_key(form)
+            if key not in mongo_ids:
+                # The form failed to import; it and its responses are retried by the next run
+                continue
+            if checkpoint.get(key).get('done'):
+                done += 1
+                progress.add(forms=1)
+            else:
+                pending.append((form, key, mongo_ids[key]))
+        if done:
+            self.stdout.write(f'Resuming: {done} forms already synced')
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = [executor.submit(self.migrate_responses, form, key, mongo_id, checkpoint, progress)
+                       for form, key, mongo_id in pending]
+            for future, (form, key, mongo_id) in zip(futures, pending):
+                try:
+                    future.result()
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f'Error syncing form "{form["title"]}": {e}'))
+
+        progress.report()
+        self.stdout.write(self.style.SUCCESS(f'Synced {done + len(pending)} of {len(forms)} forms to MongoDB'))
+
+    def form_key(self, form):
+        return 'sync-' + content_hash(form['title'], form['description'], parse_json(form['fields']),
+                                      str(form.get('created_at')))
+
+    def import_forms(self, forms):
+        """Insert the forms MongoDB doesn't have yet in one insert_many; returns {import key: form id}.
+
+        Forms that fail to insert are logged and left out of the result, so the
+        others are still migrated.
+        """
+        keys = [self.form_key(form) for form in forms]
+        mongo_ids = {
+            form['import_key']: str(form['_id'])
+            for form in mongodb_service.forms_collection.find({'import_key': {'$in': keys}}, {'import_key': 1})
+        }
+
+        documents = []
+        for form, key in zip(forms, keys):
+            if key in mongo_ids:
+                continue
+            document = {
+                '_id': ObjectId(),
+                'title': form['title'],
+                'description': form['description'],
+                'fields': parse_json(form['fields']),
+                'created_at': parse_datetime(form.get('created_at')) or utcnow(),
+                'updated_at': parse_datetime(form.get('updated_at')) or utcnow(),
+                'import_key': key
+            }
+            documents.append(document)
+            mongo_ids[key] = str(document['_id'])
+
+        failed = {}
+        if documents:
             try:
-                mongo_id = mongodb_service.create_form(
-                    title=form.title,
-                    description=form.description,
-                    fields=form.fields
-                )
-                self.stdout.write(f'Synced form "{form.title}" to MongoDB with ID: {mongo_id}')
-                synced_forms += 1
-                
-                # Sync responses for this form
-                responses = FormResponse.objects.filter(form=form)
-                synced_responses = 0
-                
-                for response in responses:
-                    response_id = mongodb_service.create_response(
-                        form_id=mongo_id,
-                        responses=response.responses,
-                        ip_address=response.ip_address
-                    )
-                    if response_id:
-                        synced_responses += 1
-                
-                self.stdout.write(f'Synced {synced_responses} responses for form "{form.title}"')
-                
-            except Exception as e:
-                self.stdout.write(
-                    self.style.ERROR(f'Error syncing form "{form.title}": {e}')
-                )
+                mongodb_service.forms_collection.insert_many(documents, ordered=False)
+            except BulkWriteError as e:
+                failed = {documents[error['index']]['import_key']: error for error in e.details.get('writeErrors', [])}
+            created = [document for document in documents if document['import_key'] not in failed]
+            mongodb_service.increment_counter('forms', len(created))
+            for document in created:
+                mongodb_service.analytics_store.initialize(str(document['_id']))
 
-        self.stdout.write(
-            self.style.SUCCESS(f'Successfully synced {synced_forms} forms to MongoDB')
-        )
+        if failed:
+            # A concurrent run may have imported the same forms: use its ids
+            for form in mongodb_service.forms_collection.find({'import_key': {'$in': list(failed)}}, {'import_key': 1}):
+                mongo_ids[form['import_key']] = str(form['_id'])
+                del failed[form['import_key']]
+            for key, error in failed.items():
+                del mongo_ids[key]
+                self.stdout.write(self.style.ERROR(f'Error importing form {key}: {error.get("errmsg")}'))
+        self.stdout.write(f'Forms: {len(documents) - len(failed)} created, {len(forms) - len(documents)} already in '
+                          f'MongoDB, {len(failed)} failed')
+        return mongo_ids
+
+    def migrate_responses(self, form, key, mongo_id, checkpoint, progress):
+        """Copy one form's responses in keyset-paginated batches, checkpointing after each"""
+        fields = parse_json(form['fields']) or []
+        last_id = checkpoint.get(key).get('last_response_id', 0)
+        with closing(self.connect()) as connection, connection:
+            while True:
+                rows = connection.execute(
+                    f'SELECT * FROM {RESPONSES_TABLE} WHERE form_id = ? AND id > ? ORDER BY id LIMIT ?',
+                    (form['id'], last_id, self.batch_size)
+                ).fetchall()
+                if not rows:
+                    break
+
+                batch = []
+                for row in rows:
+                    responses = parse_json(row['responses'])
+                    submitted_at = parse_datetime(row['submitted_at']) or utcnow()
+                    document = {
+                        '_id': ObjectId(),
+                        'form_id': mongo_id,
+                        'responses': responses,
+                        'submitted_at': submitted_at,
+                        'ip_address': row['ip_address'],
+                        'idempotency_key': response_key(key, responses, submitted_at, row['ip_address'])
+                    }
+                    text = search_text(fields, responses)
+                    if text:
+                        document['search_text'] = text
+                    batch.append((document, fields))
+
+                errors = mongodb_service.write_responses(batch)
+                duplicates = sum(1 for error in errors.values() if error.get('code') == 11000)
+                last_id = rows[-1]['id']
+                checkpoint.update(key, mongo_id=mongo_id, last_response_id=last_id)
+                progress.add(responses=len(batch) - len(errors), duplicates=duplicates,
+                             failed=len(errors) - duplicates)
+
+        checkpoint.update(key, mongo_id=mongo_id, done=True)
+        progress.add(forms=1)
 
     def sync_from_mongodb(self):
         """Sync data from MongoDB to SQLite"""
-        self.stdout.write('Syncing data from MongoDB to SQLite...')
-        
-        # Get all forms from MongoDB
+        self.stdout.write(f'Syncing data from MongoDB to {self.database}...')
         mongo_forms = mongodb_service.get_all_forms()
-        synced_forms = 0
-        
-        for mongo_form in mongo_forms:
-            try:
-                # Create or update form in SQLite
-                form, created = Form.objects.get_or_create(
-                    title=mongo_form['title'],
-                    defaults={
-                        'description': mongo_form['description'],
-                        'fields': mongo_form['fields']
-                    }
-                )
-                
-                if created:
-                    self.stdout.write(f'Created form "{form.title}" in SQLite')
-                    synced_forms += 1
-                else:
-                    self.stdout.write(f'Form "{form.title}" already exists in SQLite')
-                
-                # Sync responses
-                mongo_responses = mongodb_service.get_form_responses(mongo_form['id'])
-                synced_responses = 0
-                
-                for mongo_response in mongo_responses:
-                    # Check if response already exists (by comparing data)
-                    existing = FormResponse.objects.filter(
-                        form=form,
-                        responses=mongo_response['responses']
-                    ).first()
-                    
-                    if not existing:
-                        FormResponse.objects.create(
-                            form=form,
-                            responses=mongo_response['responses'],
-                            ip_address=mongo_response.get('ip_address')
-                        )
-                        synced_responses += 1
-                
-                self.stdout.write(f'Synced {synced_responses} new responses for form "{form.title}"')
-                
-            except Exception as e:
-                self.stdout.write(
-                    self.style.ERROR(f'Error syncing form from MongoDB: {e}')
-                )
+        progress = Progress(self.stdout, len(mongo_forms))
 
-        self.stdout.write(
-            self.style.SUCCESS(f'Successfully synced {synced_forms} forms from MongoDB')
+        with closing(self.connect()) as connection, connection:
+            connection.executescript(CREATE_TABLES)
+            form_ids = {row['title']: row['id'] for row in connection.execute(f'SELECT id, title FROM {FORMS_TABLE}')}
+
+            for mongo_form in mongo_forms:
+                try:
+                    form_id = form_ids.get(mongo_form['title'])
+                    if form_id is None:
+                        now = utcnow().isoformat(' ')
+                        form_id = connection.execute(
+                            f'INSERT INTO {FORMS_TABLE} (title, description, fields, created_at, updated_at) '
+                            f'VALUES (?, ?, ?, ?, ?)',
+                            (mongo_form['title'], mongo_form.get('description', ''), json.dumps(mongo_form.get('fields', [])),
+                             mongo_form.get('created_at') or now, mongo_form.get('updated_at') or now)
+                        ).lastrowid
+                        form_ids[mongo_form['title']] = form_id
+                    self.copy_responses_to_sqlite(connection, form_id, mongo_form, progress)
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f'Error syncing form "{mongo_form["title"]}" from MongoDB: {e}'))
+
+        progress.report()
+        self.stdout.write(self.style.SUCCESS(f'Synced {len(mongo_forms)} forms from MongoDB'))
+
+    def copy_responses_to_sqlite(self, connection, form_id, mongo_form, progress):
+        """Insert the form's MongoDB responses that SQLite doesn't have, in executemany batches"""
+        # One read of the existing rows instead of one equality lookup per response
+        existing = {
+            response_key(form_id, parse_json(row['responses']), parse_datetime(row['submitted_at']), row['ip_address'])
+            for row in connection.execute(
+                f'SELECT responses, submitted_at, ip_address FROM {RESPONSES_TABLE} WHERE form_id = ?', (form_id,)
+            )
+        }
+
+        batch = []
+        duplicates = 0
+        for response in mongodb_service.iter_form_responses(mongo_form['id'], batch_size=self.batch_size):
+            submitted_at = parse_datetime(response.get('submitted_at')) or utcnow()
+            key = response_key(form_id, response.get('responses', {}), submitted_at, response.get('ip_address'))
+            if key in existing:
+                duplicates += 1
+                continue
+            existing.add(key)
+            batch.append((form_id, json.dumps(response.get('responses', {})), submitted_at.isoformat(' '),
+                          response.get('ip_address')))
+            if len(batch) >= self.batch_size:
+                self.insert_responses(connection, batch, progress)
+                batch = []
+        if batch:
+            self.insert_responses(connection, batch, progress)
+        progress.add(forms=1, duplicates=duplicates)
+
+    def insert_responses(self, connection, batch, progress):
+        connection.executemany(
+            f'INSERT INTO {RESPONSES_TABLE} (form_id, responses, submitted_at, ip_address) VALUES (?, ?, ?, ?)',
+            batch
         )
+        connection.commit()
+        progress.add(responses=len(batch))
@@ -3,6 +3,7 @@
 MongoDB-only models using the mongodb_service
 This file maintains Django's expected structure but delegates to MongoDB
 """
+from response_dedup import DuplicateResponseError
 
 class Form:
     """MongoDB Form model interface"""
@@ -51,7 +52,7 @@ class FormManager:
         return self.all()
     
     def count(self):
-        return len(self.all())
+        return self.mongodb_service.get_form_count()
 
 class FormResponseManager:
     """Manager for FormResponse operations in MongoDB"""
@@ -65,20 +66,19 @@ class FormResponseManager:
         return []
     
     def create(self, **kwargs):
-        response_id = self.mongodb_service.create_response(
-            form_id=kwargs.get('form_id'),
-            responses=kwargs.get('responses', {}),
-            ip_address=kwargs.get('ip_address')
-        )
+        try:
+            response_id = self.mongodb_service.create_response(
+                form_id=kwargs.get('form_id'),
+                responses=kwargs.get('responses', {}),
+                ip_address=kwargs.get('ip_address')
+            )
+        except DuplicateResponseError as e:
+            response_id = e.response_id
         return {'id': response_id}
     
     def count(self):
-        # Get total count across all forms
-        all_forms = self.mongodb_service.get_all_forms()
-        total = 0
-        for form in all_forms:
-            total += len(self.mongodb_service.get_form_responses(form['id']))
-        return total
+        # Maintained counter, not a scan of every response
+        return self.mongodb_service.get_total_response_count()
     
     def order_by(self, field):
         return self  # For compatibility
\ No newline at end of file
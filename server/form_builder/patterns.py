@@ -0,0 +1,238 @@
+# form_builder/patterns.py
+"""
+Author-supplied validation patterns, which run on anonymous input.
+
+Patterns are matched with RE2 (the google-re2 package in requirements.txt),
+whose matching time is linear in the input whatever the pattern, so no
+pattern can hang a worker. Patterns RE2 can't run (backreferences,
+lookarounds) are rejected when the form is saved.
+
+Without google-re2, patterns fall back to the stdlib `re` engine, which
+backtracks. Patterns whose shape backtracks super-linearly are then rejected
+instead: repeats nested in a repeat where either is unbounded ((a+)+,
+(.*a){12}), alternatives that can match the same text inside a repeat
+((a|aa)+) and consecutive unbounded repeats that can match the same text
+(.*.*, \\S+@\\S+). This check is conservative but not a proof, so install
+google-re2 wherever forms are public.
+"""
+import re
+from functools import lru_cache
+
+try:
+    import re2
+except ImportError:
+    re2 = None
+
+try:
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+MAXREPEAT = sre_constants.MAXREPEAT
+REPEATS = tuple(
+    getattr(sre_constants, name)
+    for name in ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT') if hasattr(sre_constants, name)
+)
+
+# Characters the stdlib check compares character classes on: Latin, plus samples of
+# the Unicode digits, spaces and letters that \d, \s and \w also match
+SAMPLE_CHARACTERS = frozenset(
+    [chr(code) for code in range(0x300)] + ['\u0660', '\u00a0', '\u2028', '\u3000', '\u4e00', '\uff10']
+)
+CATEGORY_PATTERNS = {
+    'CATEGORY_DIGIT': r'\d', 'CATEGORY_NOT_DIGIT': r'\D',
+    'CATEGORY_SPACE': r'\s', 'CATEGORY_NOT_SPACE': r'\S',
+    'CATEGORY_WORD': r'\w', 'CATEGORY_NOT_WORD': r'\W',
+}
+
+if re2 is not None:
+    RE2_OPTIONS = re2.Options()
+    RE2_OPTIONS.log_errors = False
+
+
+@lru_cache(maxsize=None)
+def category_characters(category):
+    pattern = CATEGORY_PATTERNS.get(str(category))
+    if pattern is None:
+        return SAMPLE_CHARACTERS
+    return frozenset(char for char in SAMPLE_CHARACTERS if re.match(pattern, char))
+
+
+def literal_characters(code, flags):
+    char = chr(code)
+    if flags & re.IGNORECASE:
+        return frozenset((char, char.lower(), char.upper()))
+    return frozenset((char,))
+
+
+def class_characters(op, av, flags):
+    """The characters a single-character node matches, or None for other nodes"""
+    name = str(op)
+    if name == 'LITERAL':
+        return literal_characters(av, flags)
+    if name == 'NOT_LITERAL':
+        return SAMPLE_CHARACTERS - literal_characters(av, flags)
+    if name == 'ANY':
+        return SAMPLE_CHARACTERS if flags & re.DOTALL else SAMPLE_CHARACTERS - {'\n'}
+    if name == 'IN':
+        chars = set()
+        negate = False
+        for item_op, item_av in av:
+            item_name = str(item_op)
+            if item_name == 'NEGATE':
+                negate = True
+            elif item_name == 'RANGE':
+                low, high = item_av
+                for char in SAMPLE_CHARACTERS:
+                    if low <= ord(char) <= high:
+                        chars |= literal_characters(ord(char), flags)
+            elif item_name == 'CATEGORY':
+                chars |= category_characters(item_av)
+            else:
+                chars |= class_characters(item_op, item_av, flags) or SAMPLE_CHARACTERS
+        return SAMPLE_CHARACTERS - chars if negate else frozenset(chars)
+    return None
+
+
+def first_characters(items, flags):
+    """(characters a sequence can start with, whether it can match the empty string)"""
+    first = set()
+    for op, av in items:
+        name = str(op)
+        chars = class_characters(op, av, flags)
+        if chars is not None:
+            return first | chars, False
+        if op in REPEATS:
+            low, _, body = av
+            body_first, nullable = first_characters(body, flags)
+            first |= body_first
+            if low > 0 and not nullable:
+                return first, False
+        elif name == 'SUBPATTERN':
+            body_first, nullable = first_characters(av[-1], flags)
+            first |= body_first
+            if not nullable:
+                return first, False
+        elif name == 'ATOMIC_GROUP':
+            body_first, nullable = first_characters(av, flags)
+            first |= body_first
+            if not nullable:
+                return first, False
+        elif name == 'BRANCH':
+            nullable = False
+            for branch in av[1]:
+                branch_first, branch_nullable = first_characters(branch, flags)
+                first |= branch_first
+                nullable = nullable or branch_nullable
+            if not nullable:
+                return first, False
+        elif name not in ('AT', 'ASSERT', 'ASSERT_NOT'):
+            # Backreferences and conditionals: assume they can match anything
+            return SAMPLE_CHARACTERS, False
+    return first, True
+
+
+def single_class(body, flags):
+    """The characters of a repeat body that is one character class (maybe in a group), else None"""
+    while len(body) == 1 and str(body[0][0]) == 'SUBPATTERN':
+        body = body[0][1][-1]
+    if len(body) == 1:
+        return class_characters(body[0][0], body[0][1], flags)
+    return None
+
+
+def sub_patterns(av):
+    """The parsed sub-patterns among a regex node's arguments (groups, branches, lookarounds)"""
+    if isinstance(av, sre_parse.SubPattern):
+        yield av
+    elif isinstance(av, (list, tuple)):
+        for item in av:
+            yield from sub_patterns(item)
+
+
+def backtracking_risk(items, flags, repeated=False, unbounded=False):
+    """Why a parsed pattern can backtrack super-linearly in the stdlib engine, or None.
+
+    `repeated`/`unbounded`: whether an enclosing repeat matches more than once / without bound.
+    """
+    items = list(items)
+    for index, (op, av) in enumerate(items):
+        name = str(op)
+        if op in REPEATS:
+            _, high, body = av
+            if high > 1 and (unbounded or (repeated and high == MAXREPEAT)):
+                return 'nested quantifiers like (a+)+ or (.*a){12} can take exponential time to match'
+            if high == MAXREPEAT:
+                error = consecutive_repeat_risk(items, index, flags)
+                if error:
+                    return error
+            error = backtracking_risk(body, flags, repeated or high > 1, unbounded or high == MAXREPEAT)
+            if error:
+                return error
+            continue
+        if name == 'BRANCH' and repeated:
+            seen = set()
+            for branch in av[1]:
+                branch_first, nullable = first_characters(branch, flags)
+                if nullable or seen & branch_first:
+                    return 'alternatives that can match the same text inside a repeat, like (a|aa)+, ' \
+                           'can take exponential time to match'
+                seen |= branch_first
+        for sub in sub_patterns(av):
+            error = backtracking_risk(sub, flags, repeated, unbounded)
+            if error:
+                return error
+    return None
+
+
+def consecutive_repeat_risk(items, index, flags):
+    """Whether the unbounded repeat at items[index] of a sequence is followed by another
+    one that can take over its text, with only text it can also consume in between"""
+    chars = single_class(items[index][1][2], flags)
+    if chars is None:
+        return None
+    for op, av in items[index + 1:]:
+        if op in REPEATS:
+            low, high, body = av
+            if high == MAXREPEAT and first_characters(body, flags)[0] & chars:
+                return 'consecutive repeats that can match the same text, like .*.* or \\S+@\\S+, ' \
+                       'can take polynomial time to match'
+            inner = single_class(body, flags)
+            if low > 0 and (inner is None or not inner <= chars):
+                return None
+        elif str(op) not in ('AT', 'ASSERT', 'ASSERT_NOT'):
+            between = class_characters(op, av, flags)
+            if between is None or not between <= chars:
+                return None
+    return None
+
+
+def pattern_error(pattern):
+    """Why an author pattern can't be used, or None when it is fine"""
+    if not isinstance(pattern, str):
+        return 'pattern must be a string'
+    if re2 is not None:
+        try:
+            re2.compile(pattern, options=RE2_OPTIONS)
+        except re2.error as e:
+            message = e.args[0] if e.args else ''
+            return message.decode(errors='replace') if isinstance(message, bytes) else str(message)
+        return None
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error as e:
+        return str(e)
+    return backtracking_risk(parsed, parsed.state.flags)
+
+
+def compile_pattern(pattern):
+    """A compiled pattern with a search() method, or None (with a log line) if it can't be used"""
+    error = pattern_error(pattern)
+    if error:
+        print(f"Ignoring invalid validation pattern {pattern!r}: {error}")
+        return None
+    if re2 is not None:
+        return re2.compile(pattern, options=RE2_OPTIONS)
+    return re.compile(pattern)
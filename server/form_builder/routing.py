@@ -1,7 +1,7 @@
-# core/routing.py
-from django.urls import path
-from ..websockets import consumers
+# form_builder/routing.py
+from django.urls import re_path
+from websockets import consumers
 
 websocket_urlpatterns = [
-    path("ws/form/<slug:slug>/", consumers.AnalyticsConsumer.as_asgi()),
+    re_path(r'ws/form/(?P<form_id>[0-9a-f]{24})/$', consumers.AnalyticsConsumer.as_asgi()),
 ]
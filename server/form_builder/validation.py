@@ -0,0 +1,138 @@
+# form_builder/validation.py
+"""
+Server-side validation of submitted responses against the form schema.
+
+Each form's fields are compiled once into a FormValidator (regexes compiled,
+option lists turned into sets) and cached by form id + updated_at, so a
+submission is checked with a tight loop instead of re-reading the schema.
+The rules and messages mirror the client's useFormValidation hook.
+
+Author patterns run on anonymous input: they are compiled by patterns.py,
+which matches them in linear time (or rejects risky ones when it can't), are
+checked when the form is saved (and ignored if unusable once stored), and
+only ever run on values of at most PATTERN_MAX_INPUT_LENGTH characters,
+whatever the field's maxLength.
+"""
+import threading
+from collections import OrderedDict
+from .patterns import compile_pattern, pattern_error
+
+RATING_MIN = 1
+RATING_MAX = 5
+VALIDATOR_CACHE_SIZE = 512
+PATTERN_MAX_INPUT_LENGTH = 1000
+
+
+def is_empty(value):
+    return value is None or value == '' or (isinstance(value, list) and len(value) == 0)
+
+
+def validate_form_fields(fields):
+    """Return a dict of error messages keyed by field id for fields whose rules can't be used"""
+    errors = {}
+    for field in fields or []:
+        if not isinstance(field, dict) or field.get('type') != 'text':
+            continue
+        pattern = (field.get('validation') or {}).get('pattern')
+        if pattern:
+            error = pattern_error(pattern)
+            if error:
+                errors[field.get('id') or field.get('label')] = f'Invalid pattern: {error}'
+    return errors
+
+
+class CompiledField:
+    __slots__ = ('id', 'label', 'required', 'checks')
+
+    def __init__(self, field):
+        self.id = field['id']
+        self.label = field.get('label') or field['id']
+        self.required = bool(field.get('required'))
+        self.checks = self.compile_checks(field)
+
+    def compile_checks(self, field):
+        label = self.label
+        field_type = field.get('type')
+        options = frozenset(field.get('options') or [])
+        checks = []
+
+        if field_type == 'text':
+            rules = field.get('validation') or {}
+            min_length = rules.get('minLength')
+            max_length = rules.get('maxLength')
+            pattern = compile_pattern(rules['pattern']) if rules.get('pattern') else None
+
+            checks.append(lambda v: None if isinstance(v, str) else f'{label} must be text')
+            if min_length:
+                checks.append(lambda v: f'{label} must be at least {min_length} characters'
+                              if len(v) < min_length else None)
+            if max_length:
+                checks.append(lambda v: f'{label} must be no more than {max_length} characters'
+                              if len(v) > max_length else None)
+            if pattern is not None and not (max_length and max_length <= PATTERN_MAX_INPUT_LENGTH):
+                checks.append(lambda v: f'{label} must be no more than {PATTERN_MAX_INPUT_LENGTH} characters'
+                              if len(v) > PATTERN_MAX_INPUT_LENGTH else None)
+            if pattern is not None:
+                # RegExp.test() semantics: match anywhere in the value
+                checks.append(lambda v: None if pattern.search(v) else f'{label} format is invalid')
+        elif field_type == 'multiple-choice':
+            checks.append(lambda v: None if isinstance(v, str) and (not options or v in options)
+                          else f'{label} must be one of the available options')
+        elif field_type == 'checkbox':
+            checks.append(lambda v: None if isinstance(v, list) and all(
+                isinstance(option, str) and (not options or option in options) for option in v
+            ) else f'{label} must be a list of the available options')
+        elif field_type == 'rating':
+            checks.append(lambda v: None if isinstance(v, (int, float)) and not isinstance(v, bool)
+                          and RATING_MIN <= v <= RATING_MAX
+                          else f'{label} must be a rating from {RATING_MIN} to {RATING_MAX}')
+        return tuple(checks)
+
+
+class FormValidator:
+    def __init__(self, fields):
+        self.fields = tuple(CompiledField(field) for field in fields or [] if field.get('id'))
+
+    def validate(self, responses):
+        """Return a dict of error messages keyed by field id (empty when valid)"""
+        if not isinstance(responses, dict):
+            return {'responses': 'Responses must be an object'}
+
+        errors = {}
+        for field in self.fields:
+            value = responses.get(field.id)
+            if is_empty(value):
+                if field.required:
+                    errors[field.id] = f'{field.label} is required'
+                continue
+            for check in field.checks:
+                error = check(value)
+                if error:
+                    errors[field.id] = error
+                    break
+        return errors
+
+
+_validators = OrderedDict()
+_validators_lock = threading.Lock()
+
+
+def get_validator(form):
+    """Get the compiled validator for a form, compiling it on first use"""
+    key = (form['id'], form.get('updated_at'))
+    with _validators_lock:
+        validator = _validators.get(key)
+        if validator is not None:
+            _validators.move_to_end(key)
+            return validator
+
+    validator = FormValidator(form.get('fields', []))
+    with _validators_lock:
+        _validators[key] = validator
+        while len(_validators) > VALIDATOR_CACHE_SIZE:
+            _validators.popitem(last=False)
+    return validator
+
+
+def validate_responses(form, responses):
+    return get_validator(form).validate(responses)
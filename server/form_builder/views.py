@@ -1,16 +1,53 @@
 # form_builder/views.py
+import re
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from mongodb_service import mongodb_service
+from analytics_broadcaster import analytics_broadcaster
+from http_caching import form_validators, not_modified, set_validators
+from renderers import ORJSONRenderer
+from response_buffer import BufferFullError
+from response_dedup import DuplicateResponseError
+from search import MAX_QUERY_LENGTH
+from .validation import validate_form_fields, validate_responses
+from .exports import EXPORT_FORMATS, stream_csv, stream_ndjson
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MAX_BATCH_SIZE = 1000
+# ?fields= names top-level document fields; no operators ($) or paths (.), which can't collide
+FIELD_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_]+$')
+
+def parse_page_params(query_params):
+    """Read ?limit=, ?cursor= and ?fields= from the query string"""
+    try:
+        limit = int(query_params.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    cursor = query_params.get('cursor') or None
+    fields = query_params.get('fields')
+    fields = [field.strip() for field in fields.split(',') if field.strip()] if fields else None
+    if fields and not all(FIELD_NAME_PATTERN.match(field) for field in fields):
+        raise ValueError('fields must be comma-separated field names (letters, digits and _)')
+    return limit, cursor, fields
 
 class FormViewSet(viewsets.ViewSet):
     """
     MongoDB-only ViewSet for Form operations
     """
     
+    def perform_content_negotiation(self, request, force=False):
+        # The export streams its own body and validates ?format= itself, so DRF
+        # must not treat it as a renderer override (an unknown one would be a 404)
+        if self.action == 'export':
+            renderer = ORJSONRenderer()
+            return renderer, renderer.media_type
+        return super().perform_content_negotiation(request, force)
+    
     def get_client_ip(self, request):
         x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
         if x_forwarded_for:
@@ -19,14 +56,25 @@ class FormViewSet(viewsets.ViewSet):
             ip = request.META.get('REMOTE_ADDR')
         return ip
     
+    def get_page_params(self, request):
+        return parse_page_params(request.query_params)
+    
     def list(self, request):
-        """List all forms"""
-        forms = mongodb_service.get_all_forms()
-        return Response(forms)
+        """List forms, one page at a time"""
+        try:
+            limit, cursor, fields = self.get_page_params(request)
+            forms, next_cursor = mongodb_service.get_forms_page(limit, cursor=cursor, fields=fields)
+            return Response({'results': forms, 'next_cursor': next_cursor})
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
     def create(self, request):
         """Create a new form"""
         try:
+            errors = validate_form_fields(request.data.get('fields', []))
+            if errors:
+                return Response({'error': 'Invalid fields', 'errors': errors},
+                                status=status.HTTP_400_BAD_REQUEST)
             form_id = mongodb_service.create_form(
                 title=request.data.get('title'),
                 description=request.data.get('description'),
@@ -41,13 +89,19 @@ class FormViewSet(viewsets.ViewSet):
         """Get a specific form"""
         form = mongodb_service.get_form(pk)
         if form:
-            return Response(form)
+            etag, last_modified = form_validators(form)
+            response = not_modified(request, etag, last_modified) or Response(mongodb_service.encode_form(form))
+            return set_validators(response, etag, last_modified, settings.FORM_CACHE_CONTROL)
         else:
             return Response({'error': 'Form not found'}, status=status.HTTP_404_NOT_FOUND)
     
     def update(self, request, pk=None):
         """Update a form"""
         try:
+            errors = validate_form_fields(request.data.get('fields'))
+            if errors:
+                return Response({'error': 'Invalid fields', 'errors': errors},
+                                status=status.HTTP_400_BAD_REQUEST)
             success = mongodb_service.update_form(
                 form_id=pk,
                 title=request.data.get('title'),
@@ -77,54 +131,172 @@ class FormViewSet(viewsets.ViewSet):
     def responses(self, request, pk=None):
         """Submit a response to a form"""
         try:
-            # Check if form exists
-            form = mongodb_service.get_form(pk)
+            # Check if form exists (on the primary, in case another process deleted it)
+            form = mongodb_service.get_form(pk, verify=True)
             if not form:
                 return Response({'error': 'Form not found'}, status=status.HTTP_404_NOT_FOUND)
             
-            # Create response
-            response_id = mongodb_service.create_response(
-                form_id=pk,
-                responses=request.data.get('responses', {}),
-                ip_address=self.get_client_ip(request)
-            )
+            errors = validate_responses(form, request.data.get('responses', {}))
+            if errors:
+                return Response({'error': 'Validation failed', 'errors': errors},
+                              status=status.HTTP_400_BAD_REQUEST)
             
-            if response_id:
-                # Send real-time notification
-                channel_layer = get_channel_layer()
-                if channel_layer:
-                    async_to_sync(channel_layer.group_send)(
-                        'analytics',
-                        {
-                            'type': 'new_response',
-                            'message': {
-                                'form_id': pk,
-                                'form_title': form['title'],
-                                'response_id': response_id,
-                                'submitted_at': response_id  # Will be updated with proper timestamp
-                            }
-                        }
+            # Create response, or queue it when batched ingestion is enabled
+            client_key = request.headers.get('Idempotency-Key')
+            if mongodb_service.response_buffer is not None:
+                try:
+                    response_id = mongodb_service.enqueue_response(
+                        form_id=pk,
+                        responses=request.data.get('responses', {}),
+                        ip_address=self.get_client_ip(request),
+                        fields=form.get('fields', []),
+                        client_key=client_key
+                    )
+                except BufferFullError as e:
+                    return Response({'error': str(e)}, status=status.HTTP_429_TOO_MANY_REQUESTS,
+                                  headers={'Retry-After': '1'})
+                created_status = status.HTTP_202_ACCEPTED
+            else:
+                try:
+                    response_id = mongodb_service.create_response(
+                        form_id=pk,
+                        responses=request.data.get('responses', {}),
+                        ip_address=self.get_client_ip(request),
+                        fields=form.get('fields', []),
+                        client_key=client_key
                     )
+                except DuplicateResponseError as e:
+                    # A double-click or retry: answer like the original submission, without a new notification
+                    return Response({
+                        'id': e.response_id,
+                        'message': 'Duplicate response ignored',
+                        'duplicate': True
+                    }, status=status.HTTP_200_OK)
+                created_status = status.HTTP_201_CREATED
+            
+            if response_id:
+                # Real-time notification, coalesced with other submissions
+                analytics_broadcaster.publish(pk, form['title'], [response_id])
                 
                 return Response({
                     'id': response_id, 
                     'message': 'Response submitted successfully'
-                }, status=status.HTTP_201_CREATED)
+                }, status=created_status)
             else:
                 return Response({'error': 'Failed to create response'}, 
                               status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=True, methods=['post'], url_path='responses/batch')
+    def batch_responses(self, request, pk=None):
+        """Submit many responses to a form at once (offline/kiosk replay)"""
+        try:
+            items = request.data.get('responses')
+            if not isinstance(items, list) or not items:
+                return Response({'error': 'responses must be a non-empty list'},
+                              status=status.HTTP_400_BAD_REQUEST)
+            if len(items) > MAX_BATCH_SIZE:
+                return Response({'error': f'At most {MAX_BATCH_SIZE} responses per batch'},
+                              status=status.HTTP_400_BAD_REQUEST)
+            
+            form = mongodb_service.get_form(pk, verify=True)
+            if not form:
+                return Response({'error': 'Form not found'}, status=status.HTTP_404_NOT_FOUND)
+            
+            results = [None] * len(items)
+            submissions = []
+            positions = []
+            for index, item in enumerate(items):
+                if not isinstance(item, dict):
+                    results[index] = {'index': index, 'status': 'error', 'error': 'Invalid response'}
+                    continue
+                errors = validate_responses(form, item.get('responses', {}))
+                if errors:
+                    results[index] = {'index': index, 'status': 'error', 'error': 'Validation failed', 'errors': errors}
+                    continue
+                key = item.get('idempotency_key')
+                submissions.append((item.get('responses', {}), str(key) if key else None))
+                positions.append(index)
+            
+            stored = mongodb_service.create_responses(
+                form_id=pk,
+                submissions=submissions,
+                ip_address=self.get_client_ip(request),
+                fields=form.get('fields', [])
+            )
+            for index, (result_status, value) in zip(positions, stored):
+                result = {'index': index, 'status': result_status}
+                if result_status == 'error':
+                    result['error'] = value
+                else:
+                    result['id'] = value
+                results[index] = result
+            
+            created_ids = [result['id'] for result in results if result['status'] == 'created']
+            if created_ids:
+                analytics_broadcaster.publish(pk, form['title'], created_ids)
+            
+            return Response({
+                'created': len(created_ids),
+                'results': results
+            }, status=status.HTTP_201_CREATED if created_ids else status.HTTP_200_OK)
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
     @action(detail=True, methods=['get'])
     def get_responses(self, request, pk=None):
-        """Get all responses for a form"""
+        """Get responses for a form, newest first, one page at a time"""
         try:
             form = mongodb_service.get_form(pk)
             if not form:
                 return Response({'error': 'Form not found'}, status=status.HTTP_404_NOT_FOUND)
             
-            responses = mongodb_service.get_form_responses(pk)
-            return Response(responses)
+            limit, cursor, fields = self.get_page_params(request)
+            responses, next_cursor = mongodb_service.get_form_responses_page(
+                pk, limit, cursor=cursor, fields=fields
+            )
+            return Response({'results': responses, 'next_cursor': next_cursor})
         except Exception as e:
-            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=True, methods=['get'])
+    def search(self, request, pk=None):
+        """Full-text search over a form's free-text answers, best matches first, one page at a time"""
+        try:
+            query = request.query_params.get('q', '').strip()
+            if not query:
+                return Response({'error': 'q is required'}, status=status.HTTP_400_BAD_REQUEST)
+            if len(query) > MAX_QUERY_LENGTH:
+                return Response({'error': f'q must be at most {MAX_QUERY_LENGTH} characters'},
+                              status=status.HTTP_400_BAD_REQUEST)
+            
+            form = mongodb_service.get_form(pk)
+            if not form:
+                return Response({'error': 'Form not found'}, status=status.HTTP_404_NOT_FOUND)
+            
+            limit, cursor, _ = self.get_page_params(request)
+            responses, next_cursor = mongodb_service.search_responses(pk, query, limit, cursor=cursor)
+            return Response({'results': responses, 'next_cursor': next_cursor})
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=True, methods=['get'])
+    def export(self, request, pk=None):
+        """Stream all responses for a form as CSV or NDJSON"""
+        export_format = request.query_params.get('format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return Response({'error': f'Unsupported export format: {export_format}'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        
+        form = mongodb_service.get_form(pk)
+        if not form:
+            return Response({'error': 'Form not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        stream = stream_csv if export_format == 'csv' else stream_ndjson
+        response = StreamingHttpResponse(
+            stream(form, mongodb_service.iter_form_responses(pk)),
+            content_type=EXPORT_FORMATS[export_format]
+        )
+        response['Content-Disposition'] = f'attachment; filename="form_responses_{pk}.{export_format}"'
+        return response
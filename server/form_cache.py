@@ -0,0 +1,137 @@
+# form_cache.py
+"""
+In-process LRU cache for form documents.
+
+Form definitions are read on every submission but change rarely, so
+MongoDBService keeps recently used forms here. Entries expire after a TTL
+and the least recently used entry is evicted once the size cap is reached.
+An optional shared Django cache (e.g. Redis or Memcached) can sit behind
+the local cache so several worker processes share one copy.
+
+Local entries can also hold the form's encoded JSON (encoded()), built once
+per entry so repeated reads of an unchanged form skip serialization.
+
+Writes through MongoDBService refresh or invalidate the entry in both
+layers. Other processes only drop their local copy when it expires, so the
+TTL bounds how stale a form can be after an update. Submissions don't rely
+on it: they confirm a cached form still exists (get_form(verify=True)).
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class FormCache:
+    def __init__(self, max_size=1024, ttl=300, shared_cache_alias=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared_cache_alias = shared_cache_alias
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+        self.evictions = 0
+
+    @property
+    def shared_cache(self):
+        if not self.shared_cache_alias:
+            return None
+        from django.core.cache import caches
+        return caches[self.shared_cache_alias]
+
+    def shared_key(self, form_id):
+        return f'form:{form_id}'
+
+    def get(self, form_id):
+        """Return a copy of the cached form, or None on a miss"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(form_id)
+            if entry is not None:
+                form, expires_at, _ = entry
+                if expires_at > now:
+                    self._entries.move_to_end(form_id)
+                    self.hits += 1
+                    return dict(form)
+                del self._entries[form_id]
+
+        shared_cache = self.shared_cache
+        if shared_cache is not None:
+            try:
+                form = shared_cache.get(self.shared_key(form_id))
+            except Exception as e:
+                print(f"Error reading shared form cache: {e}")
+                form = None
+            if form is not None:
+                self._store(form_id, form)
+                with self._lock:
+                    self.shared_hits += 1
+                return dict(form)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, form_id, form):
+        """Cache a form in the local and shared layers"""
+        self._store(form_id, form)
+        shared_cache = self.shared_cache
+        if shared_cache is not None:
+            try:
+                shared_cache.set(self.shared_key(form_id), form, self.ttl)
+            except Exception as e:
+                print(f"Error writing shared form cache: {e}")
+
+    def encoded(self, form_id, form, encode):
+        """encode(form), reused while the cached entry holds the same version of the form"""
+        with self._lock:
+            entry = self._entries.get(form_id)
+            if entry is not None and entry[2] is not None and entry[0].get('updated_at') == form.get('updated_at'):
+                return entry[2]
+
+        encoded = encode(form)
+        with self._lock:
+            entry = self._entries.get(form_id)
+            if entry is not None and entry[0].get('updated_at') == form.get('updated_at'):
+                entry[2] = encoded
+        return encoded
+
+    def invalidate(self, form_id):
+        """Drop a form from the local and shared layers"""
+        with self._lock:
+            self._entries.pop(form_id, None)
+        shared_cache = self.shared_cache
+        if shared_cache is not None:
+            try:
+                shared_cache.delete(self.shared_key(form_id))
+            except Exception as e:
+                print(f"Error invalidating shared form cache: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Hit/miss counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+            }
+
+    def _store(self, form_id, form):
+        with self._lock:
+            # [form, expiry, encoded JSON or None]
+            self._entries[form_id] = [dict(form), time.monotonic() + self.ttl, None]
+            self._entries.move_to_end(form_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
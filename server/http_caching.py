@@ -0,0 +1,65 @@
+# http_caching.py
+"""
+Conditional GET support for forms and analytics.
+
+Validators come from cheap version data that is available before any
+payload is built: a form's updated_at (served from the form cache), an
+analytics summary's seq, and the write seqs of the global counters. A
+request whose If-None-Match / If-Modified-Since still matches gets a 304
+without the analytics payload being read or the form being serialized. Cache-Control
+comes from FORM_CACHE_CONTROL (public, so a CDN or reverse proxy can serve
+form pages) and ANALYTICS_CACHE_CONTROL (revalidated on every poll).
+"""
+import calendar
+from datetime import datetime
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def form_version(form):
+    """updated_at of a formatted form as a compact string, or None"""
+    if not form.get('updated_at'):
+        return None
+    return datetime.fromisoformat(form['updated_at']).strftime('%Y%m%d%H%M%S%f')
+
+
+def form_validators(form):
+    """(ETag, Last-Modified timestamp) for a formatted form"""
+    version = form_version(form)
+    if version is None:
+        return None, None
+    updated_at = datetime.fromisoformat(form['updated_at'])
+    return quote_etag(f"form-{form['id']}-{version}"), calendar.timegm(updated_at.utctimetuple())
+
+
+def form_analytics_etag(form, seq, approx=False, signature=None):
+    """ETag of a form's analytics: changes with every response (seq) and every form edit.
+
+    `signature` identifies a segment query (segments.segment_signature).
+    """
+    suffix = '-approx' if approx else ''
+    if signature:
+        suffix += f'-{signature}'
+    return quote_etag(f"analytics-{form['id']}-{seq}-{form_version(form)}{suffix}")
+
+
+def global_analytics_etag(version):
+    return quote_etag(f'analytics-{version}')
+
+
+def not_modified(request, etag, last_modified=None):
+    """The 304 response when the request's validators still match, otherwise None"""
+    if etag is None:
+        return None
+    return get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+
+def set_validators(response, etag, last_modified=None, cache_control=None):
+    """Add ETag, Last-Modified and Cache-Control headers to a 200 or 304 response"""
+    if etag is not None:
+        response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    if cache_control:
+        response['Cache-Control'] = cache_control
+    return response
@@ -1,17 +1,272 @@
 # mongodb_service.py
 import pymongo
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument, IndexModel, UpdateOne, ASCENDING, DESCENDING, TEXT
+from pymongo.read_preferences import Primary, PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
 from bson import ObjectId
 from datetime import datetime
+import base64
 import os
 import json
+import threading
+from django.conf import settings
+from analytics_store import AnalyticsStore, RECENT_RESPONSES_LIMIT, encode_key, recent_response
+from analytics_broadcaster import analytics_broadcaster
+from form_cache import FormCache
+from response_buffer import ResponseBuffer
+from response_dedup import DuplicateResponseError, content_hash
+from time_series import bucket_starts, time_series_pipeline, fill_buckets
+from search import is_text_field, search_text, search_pipeline
+from segments import segment_signature, select_fields, segment_pipeline, build_segmented_analytics, facet_summary
+from renderers import PreEncodedJSON, render_json
+
+# Indexes backing every query in this module, by collection.
+# Ensured by ensure_indexes() / `python manage.py ensure_indexes`;
+# `python manage.py check_query_plans` verifies no query falls back to a COLLSCAN.
+INDEXES = {
+    'forms': [
+        # Idempotent bulk imports (`python manage.py sync_to_mongodb`)
+        IndexModel(
+            [('import_key', ASCENDING)],
+            unique=True,
+            partialFilterExpression={'import_key': {'$exists': True}}
+        ),
+    ],
+    'form_responses': [
+        # Per-form listing, counting, pagination and export
+        IndexModel([('form_id', ASCENDING), ('submitted_at', DESCENDING), ('_id', DESCENDING)]),
+        # Most recent responses across all forms
+        IndexModel([('submitted_at', DESCENDING)]),
+        # Duplicate single submissions (response_dedup.py)
+        IndexModel(
+            [('content_hash', ASCENDING)],
+            unique=True,
+            partialFilterExpression={'content_hash': {'$exists': True}}
+        ),
+        # Segment filters and group-bys on any answer (segments.py)
+        IndexModel([('responses.$**', ASCENDING)]),
+        # Per-form full-text search over free-text answers (search.py)
+        IndexModel([('form_id', ASCENDING), ('search_text', TEXT)], default_language='english'),
+        # Idempotent batch submissions
+        IndexModel(
+            [('form_id', ASCENDING), ('idempotency_key', ASCENDING)],
+            unique=True,
+            partialFilterExpression={'idempotency_key': {'$exists': True}}
+        ),
+    ],
+}
+
+# Listings leave out the derived search text
+RESPONSE_LIST_PROJECTION = {'search_text': 0}
+
+# Counters that count a collection's documents, by collection; they are seeded from the collection on first use
+COUNTED_COLLECTIONS = {'forms': 'forms', 'responses': 'form_responses'}
+
+# Counters whose write sequence numbers version the global analytics
+VERSION_COUNTERS = ('forms', 'responses', 'form_updates')
+
+
+def counter_increment(amount):
+    """Counter update adding `amount`; every counter write also moves its seq"""
+    return {'$inc': {'value': amount, 'seq': 1}}
+
+
+def counter_seed(value):
+    """Upsert creating a missing counter at `value`, a no-op on the value of an existing one"""
+    return {'$setOnInsert': {'value': value}, '$inc': {'seq': 1}}
+
+
+def counters_version(counters):
+    """Global analytics version from counter documents: their seqs, which every counter write increments.
+
+    Counter values can return to an earlier state (a response deleted after one
+    was added); the seqs only grow, so a version is never reused.
+    """
+    seqs = {counter['_id']: counter.get('seq', 0) for counter in counters}
+    return '-'.join(str(seqs.get(name, 0)) for name in VERSION_COUNTERS)
+
+# Response counts per form; sorting on form_id first lets the group run as a covered index scan
+RESPONSE_COUNTS_PIPELINE = [
+    {'$sort': {'form_id': 1}},
+    {'$group': {'_id': '$form_id', 'count': {'$sum': 1}}}
+]
+
+
+def response_counts_pipeline(form_ids=None):
+    """RESPONSE_COUNTS_PIPELINE, limited to some forms when form_ids is given"""
+    if form_ids is None:
+        return RESPONSE_COUNTS_PIPELINE
+    return [{'$match': {'form_id': {'$in': form_ids}}}] + RESPONSE_COUNTS_PIPELINE
+
+
+def is_duplicate_id(write_error):
+    """A duplicate _id: ids are assigned before the first insert, so an earlier attempt stored the document"""
+    if write_error.get('code') != 11000:
+        return False
+    key_pattern = write_error.get('keyPattern')
+    if key_pattern is not None:
+        return key_pattern == {'_id': 1}
+    return ' index: _id_ ' in write_error.get('errmsg', '')
+
+
+def client_options():
+    """MongoClient keyword arguments from the MONGODB_* settings (shared with the Motor client)"""
+    return {
+        'maxPoolSize': settings.MONGODB_MAX_POOL_SIZE,
+        'minPoolSize': settings.MONGODB_MIN_POOL_SIZE,
+        'maxIdleTimeMS': settings.MONGODB_MAX_IDLE_TIME_MS,
+        'connectTimeoutMS': settings.MONGODB_CONNECT_TIMEOUT_MS,
+        'serverSelectionTimeoutMS': settings.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        'socketTimeoutMS': settings.MONGODB_SOCKET_TIMEOUT_MS,
+        'waitQueueTimeoutMS': settings.MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+        'readPreference': settings.MONGODB_READ_PREFERENCE,
+    }
+
+def utcnow():
+    """Current UTC time truncated to milliseconds, the precision MongoDB stores.
+
+    Values built from it (cached forms, live deltas, ETags) then match what is read back.
+    """
+    now = datetime.utcnow()
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+READ_PREFERENCES = {
+    'primaryPreferred': PrimaryPreferred,
+    'secondary': Secondary,
+    'secondaryPreferred': SecondaryPreferred,
+    'nearest': Nearest,
+}
+
+def analytics_read_preference():
+    """Read preference for analytics, listing and export queries, from the MONGODB_ANALYTICS_* settings"""
+    mode = settings.MONGODB_ANALYTICS_READ_PREFERENCE
+    if mode == 'primary':
+        return Primary()
+    return READ_PREFERENCES[mode](max_staleness=settings.MONGODB_ANALYTICS_MAX_STALENESS_SECONDS)
 
 class MongoDBService:
     def __init__(self):
-        self.client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'))
-        self.db = self.client['form_builder_db']
-        self.forms_collection = self.db['forms']
-        self.responses_collection = self.db['form_responses']
+        # The client is created on first use, not at import: manage.py commands and
+        # pre-fork servers then never open connections they don't use
+        self._client = None
+        self._client_pid = None
+        self._client_lock = threading.Lock()
+        self._analytics_store = None
+        self.form_cache = FormCache(
+            max_size=settings.FORM_CACHE_SIZE,
+            ttl=settings.FORM_CACHE_TTL,
+            shared_cache_alias=settings.FORM_CACHE_ALIAS
+        )
+        # Segmented analytics by query signature; the TTL bounds how stale a segment can be
+        self.segment_cache = FormCache(
+            max_size=settings.SEGMENT_CACHE_SIZE,
+            ttl=settings.SEGMENT_CACHE_TTL
+        )
+        self.dedup_window = settings.RESPONSE_DEDUP_WINDOW
+        # Opt-in batched ingestion; see response_buffer.py for the trade-offs
+        self.response_buffer = None
+        if settings.RESPONSE_BUFFER_ENABLED:
+            self.response_buffer = ResponseBuffer(
+                self.insert_responses,
+                max_size=settings.RESPONSE_BUFFER_SIZE,
+                batch_size=settings.RESPONSE_BUFFER_BATCH_SIZE,
+                flush_interval=settings.RESPONSE_BUFFER_FLUSH_INTERVAL,
+                max_retries=settings.RESPONSE_BUFFER_MAX_RETRIES
+            )
+    
+    @property
+    def client(self):
+        """The MongoClient, created on first use and again in forked children"""
+        if self._client is None or self._client_pid != os.getpid():
+            with self._client_lock:
+                if self._client is None or self._client_pid != os.getpid():
+                    # connect=False: no background connection until the first operation,
+                    # which fails after MONGODB_SERVER_SELECTION_TIMEOUT_MS if the server is down.
+                    # A client inherited across fork() is dropped, not closed: its sockets belong to the parent
+                    self._client = MongoClient(settings.MONGODB_URI, connect=False, **client_options())
+                    self._client_pid = os.getpid()
+                    self._analytics_store = None
+        return self._client
+    
+    @property
+    def db(self):
+        return self.client[settings.MONGODB_DB_NAME]
+    
+    @property
+    def forms_collection(self):
+        return self.db['forms']
+    
+    @property
+    def responses_collection(self):
+        return self.db['form_responses']
+    
+    @property
+    def counters_collection(self):
+        # Global document counts, kept in step with inserts and deletes
+        return self.db['counters']
+    
+    @property
+    def analytics_responses_collection(self):
+        # Aggregates, listings and exports tolerate replication lag, so they keep
+        # load off the primary that takes the submission writes
+        return self.responses_collection.with_options(read_preference=analytics_read_preference())
+    
+    @property
+    def analytics_forms_collection(self):
+        return self.forms_collection.with_options(read_preference=analytics_read_preference())
+    
+    @property
+    def analytics_store(self):
+        client = self.client
+        if self._analytics_store is None:
+            self._analytics_store = AnalyticsStore(client[settings.MONGODB_DB_NAME]['form_analytics'])
+        return self._analytics_store
+    
+    def ensure_indexes(self):
+        """Create the indexes declared in INDEXES (a no-op for existing ones)"""
+        created = {}
+        for collection_name, indexes in INDEXES.items():
+            created[collection_name] = self.db[collection_name].create_indexes(indexes)
+        return created
+    
+    @staticmethod
+    def encode_cursor(position):
+        """Encode a keyset position as an opaque pagination cursor"""
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip('=')
+    
+    @staticmethod
+    def decode_cursor(cursor, keys=('id',)):
+        """Decode a pagination cursor, raising ValueError if it is malformed"""
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            position = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+            ObjectId(position['id'])
+            for key in keys:
+                position[key]
+            return position
+        except Exception:
+            raise ValueError('Invalid cursor')
+    
+    @staticmethod
+    def projection(fields, required=()):
+        """Build a MongoDB projection from the requested field names"""
+        if not fields:
+            return None
+        projection = {field: 1 for field in fields if field != 'id'}
+        for field in required:
+            projection[field] = 1
+        # _id is always returned and exposed as `id`
+        projection['_id'] = 1
+        return projection
+    
+    @staticmethod
+    def format_form(form):
+        """Convert a raw form document into its API representation"""
+        form['id'] = str(form['_id'])
+        del form['_id']
+        # Convert datetime objects to ISO format
+        form['created_at'] = form['created_at'].isoformat() if form.get('created_at') else None
+        form['updated_at'] = form['updated_at'].isoformat() if form.get('updated_at') else None
+        return form
     
     def create_form(self, title, description, fields):
         """Create a new form in MongoDB"""
@@ -19,43 +274,81 @@ class MongoDBService:
             'title': title,
             'description': description,
             'fields': fields,
-            'created_at': datetime.utcnow(),
-            'updated_at': datetime.utcnow()
+            'created_at': utcnow(),
+            'updated_at': utcnow()
         }
         result = self.forms_collection.insert_one(form_data)
-        return str(result.inserted_id)
+        form_id = str(result.inserted_id)
+        self.increment_counter('forms')
+        self.analytics_store.initialize(form_id)
+        # insert_one added _id to form_data, so it can be cached without a re-read
+        self.form_cache.set(form_id, self.format_form(form_data))
+        return form_id
     
-    def get_form(self, form_id):
-        """Get a form by ID"""
+    def get_form(self, form_id, verify=False):
+        """Get a form by ID, served from the form cache when possible.
+        
+        Other processes only see a delete once their cached copy expires, so the
+        submission paths pass verify=True: a cached form is then confirmed with
+        an _id lookup on the primary, and dropped from the cache if it is gone.
+        """
+        form = self.form_cache.get(form_id)
+        if form is not None:
+            if verify and not self.form_exists(form_id):
+                self.form_cache.invalidate(form_id)
+                return None
+            return form
         try:
             form = self.forms_collection.find_one({'_id': ObjectId(form_id)})
             if form:
-                form['id'] = str(form['_id'])
-                del form['_id']
-                # Convert datetime objects to ISO format
-                form['created_at'] = form['created_at'].isoformat() if form.get('created_at') else None
-                form['updated_at'] = form['updated_at'].isoformat() if form.get('updated_at') else None
+                self.format_form(form)
+                self.form_cache.set(form_id, form)
             return form
         except Exception as e:
             print(f"Error getting form: {e}")
             return None
     
+    def form_exists(self, form_id):
+        """Whether the form is stored, from its _id index on the primary"""
+        return self.forms_collection.find_one({'_id': ObjectId(form_id)}, {'_id': 1}) is not None
+    
+    def encode_form(self, form):
+        """A formatted form as JSON bytes, encoded once per cached version of the form"""
+        return PreEncodedJSON(self.form_cache.encoded(form['id'], form, render_json))
+    
     def get_all_forms(self):
         """Get all forms"""
         forms = []
         for form in self.forms_collection.find():
+            forms.append(self.format_form(form))
+        return forms
+    
+    def get_forms_page(self, limit, cursor=None, fields=None):
+        """Get one page of forms in creation order, optionally projected to some fields"""
+        query = {}
+        if cursor:
+            position = self.decode_cursor(cursor)
+            query['_id'] = {'$gt': ObjectId(position['id'])}
+        
+        forms = list(self.forms_collection.find(query, self.projection(fields)).sort('_id', 1).limit(limit + 1))
+        next_cursor = None
+        if len(forms) > limit:
+            forms = forms[:limit]
+            next_cursor = self.encode_cursor({'id': str(forms[-1]['_id'])})
+        
+        for form in forms:
             form['id'] = str(form['_id'])
             del form['_id']
-            # Convert datetime objects to ISO format
-            form['created_at'] = form['created_at'].isoformat() if form.get('created_at') else None
-            form['updated_at'] = form['updated_at'].isoformat() if form.get('updated_at') else None
-            forms.append(form)
-        return forms
+            if 'created_at' in form:
+                form['created_at'] = form['created_at'].isoformat() if form.get('created_at') else None
+            if 'updated_at' in form:
+                form['updated_at'] = form['updated_at'].isoformat() if form.get('updated_at') else None
+        return forms, next_cursor
     
     def update_form(self, form_id, title=None, description=None, fields=None):
         """Update a form"""
         try:
-            update_data = {'updated_at': datetime.utcnow()}
+            update_data = {'updated_at': utcnow()}
             if title is not None:
                 update_data['title'] = title
             if description is not None:
@@ -63,12 +356,21 @@ class MongoDBService:
             if fields is not None:
                 update_data['fields'] = fields
             
-            result = self.forms_collection.update_one(
+            form = self.forms_collection.find_one_and_update(
                 {'_id': ObjectId(form_id)},
-                {'$set': update_data}
+                {'$set': update_data},
+                return_document=ReturnDocument.AFTER
             )
-            return result.modified_count > 0
+            if form is None:
+                self.form_cache.invalidate(form_id)
+                return False
+            # Write through so the next get_form is served from the cache
+            self.form_cache.set(form_id, self.format_form(form))
+            # Titles are part of the global analytics, whose ETag is built from the counters
+            self.increment_counter('form_updates')
+            return True
         except Exception as e:
+            self.form_cache.invalidate(form_id)
             print(f"Error updating form: {e}")
             return False
     
@@ -76,33 +378,185 @@ class MongoDBService:
         """Delete a form and all its responses"""
         try:
             # Delete all responses for this form first
-            self.responses_collection.delete_many({'form_id': form_id})
+            deleted = self.responses_collection.delete_many({'form_id': form_id})
+            self.increment_counter('responses', -deleted.deleted_count)
+            self.analytics_store.delete(form_id)
+            self.form_cache.invalidate(form_id)
             # Delete the form
             result = self.forms_collection.delete_one({'_id': ObjectId(form_id)})
+            self.increment_counter('forms', -result.deleted_count)
             return result.deleted_count > 0
         except Exception as e:
             print(f"Error deleting form: {e}")
             return False
     
-    def create_response(self, form_id, responses, ip_address=None):
-        """Create a new form response"""
+    def build_response(self, form_id, responses, ip_address=None, fields=None):
+        """Build a response document; with the form's fields it also gets its search text"""
+        response_data = {
+            'form_id': form_id,
+            'responses': responses,
+            'submitted_at': utcnow(),
+            'ip_address': ip_address
+        }
+        text = search_text(fields, responses)
+        if text:
+            response_data['search_text'] = text
+        return response_data
+    
+    def resolve_fields(self, form_id, fields=None):
+        """The form's fields, looked up (through the form cache) when the caller has none"""
+        if fields is not None:
+            return fields
+        form = self.get_form(form_id)
+        return form.get('fields', []) if form else []
+    
+    def build_submission(self, form_id, responses, ip_address=None, client_key=None, fields=None):
+        """Build the document of a single submission, with the content_hash that deduplicates it (if any)"""
+        response_data = self.build_response(form_id, responses, ip_address, fields)
+        submission_hash = content_hash(form_id, responses, client_key, ip_address, self.dedup_window)
+        if submission_hash is not None:
+            response_data['content_hash'] = submission_hash
+        return response_data
+    
+    def find_duplicate(self, response_data):
+        """Id of the stored response with the same content_hash, or None"""
+        if 'content_hash' not in response_data:
+            return None
+        existing = self.responses_collection.find_one({'content_hash': response_data['content_hash']}, {'_id': 1})
+        return str(existing['_id']) if existing else None
+    
+    def create_response(self, form_id, responses, ip_address=None, fields=None, client_key=None):
+        """Create a new form response.
+        
+        Raises DuplicateResponseError when the same submission is already stored.
+        """
         try:
-            response_data = {
-                'form_id': form_id,
-                'responses': responses,
-                'submitted_at': datetime.utcnow(),
-                'ip_address': ip_address
-            }
+            fields = self.resolve_fields(form_id, fields)
+            response_data = self.build_submission(form_id, responses, ip_address, client_key, fields)
             result = self.responses_collection.insert_one(response_data)
-            return str(result.inserted_id)
+            response_id = str(result.inserted_id)
+        except pymongo.errors.DuplicateKeyError as e:
+            duplicate_id = self.find_duplicate(response_data)
+            if duplicate_id is None:
+                # Another unique index rejected the document; it isn't a repeated submission
+                print(f"Error creating response: {e}")
+                return None
+            raise DuplicateResponseError(duplicate_id)
         except Exception as e:
             print(f"Error creating response: {e}")
             return None
+
+        self.increment_counter('responses')
+        # Keep the pre-aggregated analytics in step with the new response
+        try:
+            delta = self.analytics_store.record_response(
+                form_id, fields, response_id, responses,
+                response_data['submitted_at'], ip_address
+            )
+            if delta is not None:
+                analytics_broadcaster.publish_delta(form_id, delta)
+        except Exception as e:
+            print(f"Error updating analytics: {e}")
+        return response_id
+    
+    def enqueue_response(self, form_id, responses, ip_address=None, fields=None, client_key=None):
+        """Queue a response for batched insertion and return its id straight away.
+        
+        Raises BufferFullError when the buffer is at capacity. Duplicates are
+        dropped by the content_hash index when the batch is written.
+        """
+        fields = self.resolve_fields(form_id, fields)
+        response_data = self.build_submission(form_id, responses, ip_address, client_key, fields)
+        # The id is assigned here so it can be returned before the write happens
+        response_data['_id'] = ObjectId()
+        self.response_buffer.submit((response_data, fields))
+        return str(response_data['_id'])
+    
+    def write_responses(self, batch):
+        """Bulk insert (response document, form fields) pairs and update analytics.
+        
+        Returns a dict of write errors keyed by position in the batch. Other
+        errors (a lost connection) are raised before counters and analytics are
+        touched, so the same batch can be written again: documents stored by
+        the failed attempt fail on their _id and are then counted as written.
+        """
+        if not batch:
+            return {}
+        documents = [response_data for response_data, fields in batch]
+        errors = {}
+        try:
+            self.responses_collection.insert_many(documents, ordered=False)
+        except pymongo.errors.BulkWriteError as e:
+            errors = {
+                error['index']: error for error in e.details.get('writeErrors', [])
+                if not is_duplicate_id(error)
+            }
+            if errors:
+                first = next(iter(errors.values()))['errmsg']
+                print(f"Error inserting {len(errors)} of {len(batch)} responses: {first}")
+        
+        stored = [item for index, item in enumerate(batch) if index not in errors]
+        self.increment_counter('responses', len(stored))
+        try:
+            for delta in self.analytics_store.record_responses(stored):
+                analytics_broadcaster.publish_delta(delta['formId'], delta)
+        except Exception as e:
+            print(f"Error updating analytics: {e}")
+        return errors
+    
+    def insert_responses(self, batch):
+        """Write a batch of (response document, form fields) pairs; returns how many were stored"""
+        return len(batch) - len(self.write_responses(batch))
+    
+    def create_responses(self, form_id, submissions, ip_address=None, fields=None):
+        """Store many responses to one form with a single bulk insert.
+        
+        `submissions` is a list of (responses, idempotency_key) pairs; the key may be
+        None. Returns one (status, response_id) pair per submission where status is
+        'created', 'duplicate' (key already stored) or 'error'.
+        """
+        fields = self.resolve_fields(form_id, fields)
+        
+        # Keys that were already replayed are skipped without a write
+        keys = [key for responses, key in submissions if key]
+        existing = {}
+        if keys:
+            for response in self.responses_collection.find(
+                {'form_id': form_id, 'idempotency_key': {'$in': keys}}, {'idempotency_key': 1}
+            ):
+                existing[response['idempotency_key']] = str(response['_id'])
+        
+        results = [None] * len(submissions)
+        batch = []
+        positions = []
+        for index, (responses, key) in enumerate(submissions):
+            if key and key in existing:
+                results[index] = ('duplicate', existing[key])
+                continue
+            response_data = self.build_response(form_id, responses, ip_address, fields)
+            response_data['_id'] = ObjectId()
+            if key:
+                response_data['idempotency_key'] = key
+                existing[key] = str(response_data['_id'])
+            batch.append((response_data, fields))
+            positions.append(index)
+        
+        errors = self.write_responses(batch)
+        for position, index in enumerate(positions):
+            error = errors.get(position)
+            if error is None:
+                results[index] = ('created', str(batch[position][0]['_id']))
+            elif error.get('code') == 11000:
+                # Another request stored the same key between our lookup and insert
+                results[index] = ('duplicate', None)
+            else:
+                results[index] = ('error', error.get('errmsg'))
+        return results
     
     def get_form_responses(self, form_id):
         """Get all responses for a form"""
         responses = []
-        for response in self.responses_collection.find({'form_id': form_id}).sort('submitted_at', -1):
+        for response in self.responses_collection.find({'form_id': form_id}, RESPONSE_LIST_PROJECTION).sort('submitted_at', -1):
             response['id'] = str(response['_id'])
             del response['_id']
             # Convert datetime to ISO format
@@ -110,81 +564,386 @@ class MongoDBService:
             responses.append(response)
         return responses
     
+    def iter_form_responses(self, form_id, batch_size=1000):
+        """Iterate over a form's raw response documents, oldest first, without loading them all"""
+        return self.analytics_responses_collection.find({'form_id': form_id}).sort('submitted_at', 1).batch_size(batch_size)
+    
+    def responses_page_query(self, form_id, cursor=None):
+        """Build the keyset query for a page of a form's responses"""
+        query = {'form_id': form_id}
+        if cursor:
+            position = self.decode_cursor(cursor, keys=('id', 'submitted_at'))
+            submitted_at = datetime.fromisoformat(position['submitted_at'])
+            last_id = ObjectId(position['id'])
+            query['$or'] = [
+                {'submitted_at': {'$lt': submitted_at}},
+                {'submitted_at': submitted_at, '_id': {'$lt': last_id}}
+            ]
+        return query
+    
+    def finish_responses_page(self, responses, limit, fields=None):
+        """Trim a limit + 1 fetch to one page, compute the next cursor and format the documents"""
+        next_cursor = None
+        if len(responses) > limit:
+            responses = responses[:limit]
+            last = responses[-1]
+            next_cursor = self.encode_cursor({
+                'submitted_at': last['submitted_at'].isoformat(),
+                'id': str(last['_id'])
+            })
+        
+        for response in responses:
+            response['id'] = str(response['_id'])
+            del response['_id']
+            if fields and 'submitted_at' not in fields:
+                del response['submitted_at']
+            else:
+                response['submitted_at'] = response['submitted_at'].isoformat() if response.get('submitted_at') else None
+        return responses, next_cursor
+    
+    def get_form_responses_page(self, form_id, limit, cursor=None, fields=None):
+        """Get one page of responses for a form, newest first"""
+        query = self.responses_page_query(form_id, cursor)
+        # submitted_at is the sort key, so it is always fetched for the cursor
+        projection = self.projection(fields, required=['submitted_at']) or RESPONSE_LIST_PROJECTION
+        responses = list(
+            self.analytics_responses_collection.find(query, projection)
+            .sort([('submitted_at', -1), ('_id', -1)])
+            .limit(limit + 1)
+        )
+        return self.finish_responses_page(responses, limit, fields)
+    
+    def search_responses(self, form_id, query, limit, cursor=None):
+        """Search a form's free-text answers: one page of responses, best matches first"""
+        position = self.decode_cursor(cursor, keys=('id', 'score')) if cursor else None
+        responses = list(self.analytics_responses_collection.aggregate(search_pipeline(form_id, query, limit, position)))
+        next_cursor = None
+        if len(responses) > limit:
+            responses = responses[:limit]
+            next_cursor = self.encode_cursor({'score': responses[-1]['score'], 'id': str(responses[-1]['_id'])})
+        
+        for response in responses:
+            response['id'] = str(response['_id'])
+            del response['_id']
+            response['submitted_at'] = response['submitted_at'].isoformat() if response.get('submitted_at') else None
+        return responses, next_cursor
+    
+    def index_search_text(self, form_id, fields, batch_size=1000):
+        """(Re)build the search text of every response to a form; returns how many were updated"""
+        updated = 0
+        batch = []
+        for response in self.responses_collection.find({'form_id': form_id}, {'responses': 1, 'search_text': 1}):
+            text = search_text(fields, response.get('responses'))
+            if text == response.get('search_text', ''):
+                continue
+            update = {'$set': {'search_text': text}} if text else {'$unset': {'search_text': ''}}
+            batch.append(UpdateOne({'_id': response['_id']}, update))
+            if len(batch) >= batch_size:
+                updated += self.responses_collection.bulk_write(batch, ordered=False).modified_count
+                batch = []
+        if batch:
+            updated += self.responses_collection.bulk_write(batch, ordered=False).modified_count
+        return updated
+    
+    def increment_counter(self, name, amount=1):
+        """Atomically adjust a global counter.
+        
+        A counter of documents that doesn't exist yet (a database written before
+        counters, or by other means) is seeded from its collection instead of
+        counting up from 0.
+        """
+        if not amount:
+            return
+        try:
+            if name not in COUNTED_COLLECTIONS:
+                self.counters_collection.update_one({'_id': name}, counter_increment(amount), upsert=True)
+            elif self.counters_collection.update_one({'_id': name}, counter_increment(amount)).matched_count == 0:
+                self.seed_counter(name)
+        except Exception as e:
+            print(f"Error updating {name} counter: {e}")
+    
+    def seed_counter(self, name):
+        """Create a missing document counter from a count of its collection.
+        
+        The count already includes the write that found the counter missing.
+        If another writer seeds it first this is a no-op, so a write racing
+        the very first seed can be missed; `reconcile_counters` corrects it.
+        """
+        value = self.db[COUNTED_COLLECTIONS[name]].count_documents({})
+        self.counters_collection.update_one({'_id': name}, counter_seed(value), upsert=True)
+    
+    def get_counter(self, name):
+        """Read a global counter, or None if it has never been set"""
+        counter = self.counters_collection.find_one({'_id': name})
+        return counter['value'] if counter else None
+    
+    def get_form_count(self):
+        """Get the number of forms without scanning the forms collection"""
+        count = self.get_counter('forms')
+        return count if count is not None else self.forms_collection.estimated_document_count()
+    
+    def get_total_response_count(self):
+        """Get the number of responses across all forms without scanning them"""
+        count = self.get_counter('responses')
+        return count if count is not None else self.responses_collection.estimated_document_count()
+    
     def get_response_count(self, form_id):
         """Get the count of responses for a form"""
+        summary = self.analytics_store.collection.find_one({'_id': form_id}, {'total_responses': 1, 'needs_rebuild': 1})
+        if summary is not None and not summary.get('needs_rebuild'):
+            return summary.get('total_responses', 0)
         return self.responses_collection.count_documents({'form_id': form_id})
     
-    def get_all_responses(self):
+    def reconcile_counters(self):
+        """Recompute every counter from the collections themselves, and backfill analytics summaries.
+        
+        Counters are only adjusted by this service, so run this after upgrading
+        an existing database or after writing to MongoDB by other means. Forms
+        whose summary is missing, flagged for a rebuild or out of step with the
+        number of responses get it rebuilt from their responses, so per-field
+        stats are corrected along with the total; summaries of deleted forms
+        are removed.
+        """
+        response_counts = self.count_responses_by_form(primary=True)
+        form_fields = {str(form['_id']): form.get('fields', []) for form in self.forms_collection.find({}, {'fields': 1})}
+        summaries = {
+            summary['_id']: summary
+            for summary in self.analytics_store.collection.find({}, {'total_responses': 1, 'needs_rebuild': 1})
+        }
+        orphans = [form_id for form_id in summaries if form_id not in form_fields]
+        if orphans:
+            self.analytics_store.collection.delete_many({'_id': {'$in': orphans}})
+        
+        rebuilt = [
+            form_id for form_id in form_fields
+            if summaries.get(form_id) is None or summaries[form_id].get('needs_rebuild')
+            or summaries[form_id].get('total_responses', 0) != response_counts.get(form_id, 0)
+        ]
+        failed = [form_id for form_id in rebuilt if not self.rebuild_form_analytics(form_id, form_fields[form_id])]
+        totals = {
+            'forms': len(form_fields),
+            'responses': sum(response_counts.values()),
+            'summaries_rebuilt': len(rebuilt) - len(failed),
+            'summaries_failed': failed
+        }
+        for name in ('forms', 'responses'):
+            value = totals[name]
+            self.counters_collection.update_one({'_id': name}, {'$set': {'value': value}, '$inc': {'seq': 1}}, upsert=True)
+        return totals
+    
+    def count_responses_by_form(self, form_ids=None, primary=False):
+        """Count the responses of every form (or of form_ids) from the form_id index, in a single aggregation"""
+        collection = self.responses_collection if primary else self.analytics_responses_collection
+        return {
+            row['_id']: row['count']
+            for row in collection.aggregate(response_counts_pipeline(form_ids))
+        }
+    
+    @staticmethod
+    def summary_counts(form_ids, summaries):
+        """({form id: total_responses} of the forms with a live summary, ids of the other forms)"""
+        wanted = set(form_ids)
+        counts = {
+            summary['_id']: summary.get('total_responses', 0)
+            for summary in summaries
+            if summary['_id'] in wanted and not summary.get('needs_rebuild')
+        }
+        return counts, [form_id for form_id in form_ids if form_id not in counts]
+    
+    def get_response_counts(self, form_ids):
+        """Get the response counts of forms from their analytics summaries, in O(forms).
+        
+        Forms whose summary is missing or flagged for a rebuild are counted from
+        their responses, in one more aggregation.
+        """
+        summaries = self.analytics_store.collection.find({}, {'total_responses': 1, 'needs_rebuild': 1})
+        counts, uncounted = self.summary_counts(form_ids, summaries)
+        if uncounted:
+            counts.update(self.count_responses_by_form(uncounted))
+        return counts
+    
+    def get_form_titles(self, form_ids):
+        """Get titles for a batch of forms in a single query"""
+        object_ids = []
+        for form_id in set(form_ids):
+            if ObjectId.is_valid(form_id):
+                object_ids.append(ObjectId(form_id))
+        titles = {}
+        for form in self.analytics_forms_collection.find({'_id': {'$in': object_ids}}, {'title': 1}):
+            titles[str(form['_id'])] = form.get('title')
+        return titles
+    
+    def get_all_responses(self, limit=20):
         """Get all form responses with form information"""
-        responses = []
-        for response in self.responses_collection.find().sort('submitted_at', -1).limit(20):
-            # Get form information
-            form = self.forms_collection.find_one({'_id': ObjectId(response['form_id'])})
+        responses = list(
+            self.analytics_responses_collection.find({}, RESPONSE_LIST_PROJECTION).sort('submitted_at', -1).limit(limit)
+        )
+        # Fetch all form titles in one round trip instead of one per response
+        titles = self.get_form_titles(response['form_id'] for response in responses)
+        for response in responses:
             response['id'] = str(response['_id'])
             del response['_id']
-            response['form_title'] = form['title'] if form else 'Unknown Form'
+            response['form_title'] = titles.get(response['form_id']) or 'Unknown Form'
             response['submitted_at'] = response['submitted_at'].isoformat() if response.get('submitted_at') else None
-            responses.append(response)
         return responses
     
-    def get_analytics_data(self, form_id=None):
-        """Get analytics data for forms"""
+    def get_analytics_version(self, form_id=None):
+        """Cheap version of the analytics payload for conditional GETs.
+        
+        A form summary's seq (None if the form has no summary yet), or for the
+        global analytics the seqs of the form, response and form edit counters.
+        """
+        if form_id:
+            summary = self.analytics_store.collection.find_one({'_id': form_id}, {'seq': 1})
+            return summary.get('seq', 0) if summary else None
+        counters = self.counters_collection.with_options(read_preference=analytics_read_preference())
+        return counters_version(counters.find({'_id': {'$in': list(VERSION_COUNTERS)}}, {'seq': 1}))
+    
+    def get_time_series(self, granularity, start, end, form_id=None):
+        """Count responses per time bucket in [start, end), for one form or all of them"""
+        starts = bucket_starts(start, end, granularity)
+        rows = []
+        if starts:
+            pipeline = time_series_pipeline(granularity, starts[0], end, form_id)
+            rows = self.analytics_responses_collection.aggregate(pipeline)
+        return fill_buckets(rows, starts, granularity, end)
+    
+    def rebuild_form_analytics(self, form_id, fields, attempts=3):
+        """Recompute a form's analytics summary from its raw responses.
+        
+        A response submitted during the rebuild moves the flagged summary's seq,
+        so the rebuild starts over. Returns whether the summary is live again.
+        """
+        for _ in range(attempts):
+            cursor = self.responses_collection.find({'form_id': form_id}, RESPONSE_LIST_PROJECTION).sort('submitted_at', 1)
+            summary = self.analytics_store.rebuild(form_id, fields, cursor)
+            if self.analytics_store.finish_rebuild(form_id, summary, self.responses_collection.count_documents({'form_id': form_id})):
+                return True
+        return False
+    
+    @staticmethod
+    def recent_responses_query(form_id):
+        """(filter, projection) of a form's latest responses in the summary's recent_responses format"""
+        return {'form_id': form_id}, {'responses': 1, 'submitted_at': 1, 'ip_address': 1}
+    
+    @staticmethod
+    def stand_in_summary(form, summary, result, recent):
+        """A summary counted from the responses ($facet result and latest documents), for
+        forms whose stored summary is missing or flagged for a rebuild; keeps its seq"""
+        counted = facet_summary(form.get('fields', []), result)
+        counted['recent_responses'] = [
+            recent_response(form.get('fields', []), str(response['_id']), response.get('responses', {}),
+                            response.get('submitted_at'), response.get('ip_address'))
+            for response in recent
+        ]
+        counted['seq'] = summary.get('seq', 0) if summary else 0
+        return counted
+    
+    def count_form_summary(self, form, summary=None):
+        """Count a form's stored responses in one aggregation, read from the primary like the summary's seq"""
+        result = next(self.responses_collection.aggregate(segment_pipeline(form, form.get('fields', []))), {})
+        query, projection = self.recent_responses_query(form['id'])
+        recent = self.responses_collection.find(query, projection).sort('submitted_at', -1).limit(RECENT_RESPONSES_LIMIT)
+        return self.stand_in_summary(form, summary, result, recent)
+    
+    def build_form_analytics(self, form, summary, approx=False):
+        """Shape a form and its analytics summary into the analytics API payload"""
+        total_responses = summary.get('total_responses', 0)
+        
+        field_stats = summary.get('fields', {})
+        sketches = summary.get('sketches', {})
+        terms = summary.get('terms', {})
+        field_analytics = [
+            self.analytics_store.summarize_field(
+                field,
+                field_stats.get(encode_key(field['id'])),
+                sketches.get(encode_key(field['id']), {}) if approx else None,
+                terms.get(encode_key(field['id']), []) if is_text_field(field) else None
+            )
+            for field in form.get('fields', [])
+        ]
+        
+        recent_responses = []
+        for response in summary.get('recent_responses', []):
+            response = dict(response, form_id=form['id'])
+            response['submitted_at'] = response['submitted_at'].isoformat() if response.get('submitted_at') else None
+            recent_responses.append(response)
+        
+        return {
+            'totalForms': 1,
+            'totalResponses': total_responses,
+            'responsesByForm': [{
+                'formTitle': form['title'],
+                'responseCount': total_responses
+            }],
+            'fieldAnalytics': field_analytics,
+            'recentResponses': recent_responses,
+            # Live deltas with a higher seq apply on top of this payload
+            'seq': summary.get('seq', 0)
+        }
+    
+    @staticmethod
+    def build_global_analytics(forms, response_counts, recent_responses):
+        """Shape raw form titles and per-form counts into the global analytics payload"""
+        responses_by_form = []
+        for form in forms:
+            responses_by_form.append({
+                'formTitle': form.get('title'),
+                'responseCount': response_counts.get(str(form['_id']), 0)
+            })
+        
+        return {
+            'totalForms': len(forms),
+            'totalResponses': sum(response_counts.values()),
+            'responsesByForm': responses_by_form,
+            'fieldAnalytics': [],
+            'recentResponses': recent_responses
+        }
+    
+    def segment_cache_key(self, form, filters=(), group_by=None, field_ids=None, start=None, end=None):
+        """Cache key of a segment query; form edits change it, new responses wait for the TTL"""
+        signature = segment_signature(filters, group_by, field_ids, start, end)
+        return f"{form['id']}:{form.get('updated_at')}:{signature}"
+    
+    def get_segmented_analytics(self, form, filters=(), group_by=None, field_ids=None, start=None, end=None):
+        """Field analytics over the responses matching filters, optionally per group_by value (see segments.py)"""
+        key = self.segment_cache_key(form, filters, group_by, field_ids, start, end)
+        data = self.segment_cache.get(key)
+        if data is not None:
+            return data
+        
+        fields = select_fields(form, field_ids)
+        pipeline = segment_pipeline(form, fields, filters, group_by, start, end)
+        # The seq comes from the summary on the primary, so the aggregation runs there too:
+        # read after the seq, it sees every response the seq counts (a lagging secondary
+        # could miss some, and the cached payload would claim a seq it doesn't include)
+        seq = self.get_analytics_version(form['id']) or 0
+        result = next(self.responses_collection.aggregate(pipeline), {})
+        data = build_segmented_analytics(form, fields, result, filters, group_by, self.analytics_store.summarize_field)
+        data['seq'] = seq
+        self.segment_cache.set(key, data)
+        return data
+    
+    def get_analytics_data(self, form_id=None, approx=False):
+        """Get analytics data for forms; approx adds the sketch-based estimates per field"""
         if form_id:
-            # Form-specific analytics
+            # Form-specific analytics, read from the pre-aggregated summary
             form = self.get_form(form_id)
             if not form:
                 return None
             
-            responses = self.get_form_responses(form_id)
-            total_responses = len(responses)
-            
-            # Field analytics
-            field_analytics = []
-            for field in form.get('fields', []):
-                field_responses = []
-                for response in responses:
-                    if field['id'] in response.get('responses', {}):
-                        field_responses.append(response['responses'][field['id']])
-                
-                field_analytics.append({
-                    'fieldLabel': field['label'],
-                    'fieldType': field['type'],
-                    'responses': field_responses
-                })
-            
-            return {
-                'totalForms': 1,
-                'totalResponses': total_responses,
-                'responsesByForm': [{
-                    'formTitle': form['title'],
-                    'responseCount': total_responses
-                }],
-                'fieldAnalytics': field_analytics,
-                'recentResponses': responses[:10]
-            }
+            summary = self.analytics_store.get(form_id, sketches=approx)
+            if summary is None or summary.get('needs_rebuild'):
+                # Until `manage.py reconcile_counters` rebuilds the summary, count the responses
+                summary = self.count_form_summary(form, summary)
+            return self.build_form_analytics(form, summary, approx=approx)
         else:
             # Global analytics
-            forms = self.get_all_forms()
-            total_forms = len(forms)
-            total_responses = self.responses_collection.count_documents({})
-            
-            responses_by_form = []
-            for form in forms:
-                response_count = self.get_response_count(form['id'])
-                responses_by_form.append({
-                    'formTitle': form['title'],
-                    'responseCount': response_count
-                })
-            
+            # Titles only: the fields arrays are not needed here
+            forms = list(self.analytics_forms_collection.find({}, {'title': 1}))
+            response_counts = self.get_response_counts([str(form['_id']) for form in forms])
             recent_responses = self.get_all_responses()
-            
-            return {
-                'totalForms': total_forms,
-                'totalResponses': total_responses,
-                'responsesByForm': responses_by_form,
-                'fieldAnalytics': [],
-                'recentResponses': recent_responses
-            }
+            return self.build_global_analytics(forms, response_counts, recent_responses)
 
 # Singleton instance
 mongodb_service = MongoDBService()
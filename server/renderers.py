@@ -0,0 +1,49 @@
+# renderers.py
+"""
+orjson-based JSON rendering for the API.
+
+ORJSONRenderer replaces DRF's JSONRenderer (settings.REST_FRAMEWORK) and
+ORJSONResponse replaces JsonResponse in the async views. orjson serializes
+datetimes natively and ObjectIds through `default`, so documents that slip
+through without formatting still render. Bytes wrapped in PreEncodedJSON,
+such as the cached encoding of a form (FormCache.encoded), are sent as they
+are. `python manage.py benchmark_serialization` compares the three paths.
+"""
+import orjson
+from bson import ObjectId
+from django.http import HttpResponse
+from rest_framework.renderers import BaseRenderer
+
+
+def default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def render_json(data):
+    return orjson.dumps(data, default=default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class PreEncodedJSON(bytes):
+    """JSON that has already been encoded; renderers pass it through"""
+
+
+class ORJSONRenderer(BaseRenderer):
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, PreEncodedJSON):
+            return data
+        return render_json(data)
+
+
+class ORJSONResponse(HttpResponse):
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        content = data if isinstance(data, PreEncodedJSON) else render_json(data)
+        super().__init__(content=content, **kwargs)
@@ -0,0 +1,141 @@
+# response_buffer.py
+"""
+Bounded in-process buffer for batched response ingestion.
+
+When RESPONSE_BUFFER_ENABLED is set, submissions are queued here instead of
+being written with one insert_one each. A background thread drains the
+queue and hands batches to a flush callback (MongoDBService writes them
+with insert_many(ordered=False)) whenever `batch_size` items are waiting or
+`flush_interval` seconds have passed since the first item of the batch.
+
+Acknowledgement semantics: a buffered submission is acknowledged (HTTP 202)
+once it is in the queue, not once it is in MongoDB. A batch whose write
+raises (e.g. AutoReconnect or a server selection timeout during a failover)
+is retried up to `max_retries` times with exponential backoff from
+`retry_backoff` seconds, about 15s in total by default; the queue meanwhile
+fills up and pushes back with 429s. Submissions are still lost when the
+process dies with them queued (a clean shutdown drains the queue via
+atexit) or when their batch fails every retry, which is logged and counted
+in `failed`. When the queue is full, submit() raises BufferFullError and
+the API answers 429 so clients back off and retry.
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+
+
+class BufferFullError(Exception):
+    pass
+
+
+class ResponseBuffer:
+    def __init__(self, flush_callback, max_size=10000, batch_size=500, flush_interval=0.05,
+                 max_retries=5, retry_backoff=0.5):
+        self.flush_callback = flush_callback
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.queue = queue.Queue(maxsize=max_size)
+        self._thread = None
+        self._pid = None
+        self._exit_hook = False
+        self._lock = threading.Lock()
+        self.accepted = 0
+        self.rejected = 0
+        self.flushed = 0
+        self.failed = 0
+        self.batches = 0
+        self.retries = 0
+
+    def start(self):
+        """Start the flush thread (again, if we are in a forked child)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='response-buffer', daemon=True)
+            self._thread.start()
+            if not self._exit_hook:
+                atexit.register(self.flush)
+                self._exit_hook = True
+
+    def submit(self, item):
+        """Queue an item, raising BufferFullError instead of blocking when full"""
+        self.start()
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.rejected += 1
+            raise BufferFullError('Response buffer is full')
+        self.accepted += 1
+
+    def flush(self):
+        """Write everything currently queued, on the calling thread"""
+        while True:
+            batch = self._take(block=False)
+            if not batch:
+                return
+            self._write(batch)
+
+    def stats(self):
+        return {
+            'depth': self.queue.qsize(),
+            'max_size': self.max_size,
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'flushed': self.flushed,
+            'failed': self.failed,
+            'batches': self.batches,
+            'retries': self.retries,
+        }
+
+    def _run(self):
+        while True:
+            batch = self._take(block=True)
+            if batch:
+                self._write(batch)
+
+    def _take(self, block):
+        """Collect up to batch_size items, waiting at most flush_interval after the first"""
+        batch = []
+        try:
+            batch.append(self.queue.get(block=block))
+        except queue.Empty:
+            return batch
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if block and remaining > 0:
+                    batch.append(self.queue.get(timeout=remaining))
+                else:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        """Write a batch, retrying with exponential backoff while the flush callback raises.
+
+        The callback must tolerate a batch that was partly written by a failed attempt.
+        """
+        written = 0
+        for attempt in range(self.max_retries + 1):
+            try:
+                written = self.flush_callback(batch)
+                break
+            except Exception as e:
+                if attempt == self.max_retries:
+                    print(f"Error flushing response buffer, dropping {len(batch)} responses: {e}")
+                    break
+                delay = self.retry_backoff * 2 ** attempt
+                print(f"Error flushing response buffer, retrying in {delay:.1f}s: {e}")
+                self.retries += 1
+                time.sleep(delay)
+        self.batches += 1
+        self.flushed += written
+        self.failed += len(batch) - written
@@ -0,0 +1,47 @@
+# response_dedup.py
+"""
+Content-hash deduplication of single response submissions.
+
+A response stored by create_response carries a `content_hash` of its
+canonical (form_id, responses, client key) and the responses collection has
+a unique partial index on it, so a double-click or a client retry is
+rejected by the database on insert instead of being counted twice. The
+index is created by `manage.py ensure_indexes`, never on the submit path;
+until it exists, repeats are stored like any other response.
+
+The client key is the request's Idempotency-Key header when one is sent;
+such submissions are deduplicated for good. Without one, submissions are
+only deduplicated when RESPONSE_DEDUP_WINDOW is set (default 0, off): the
+client IP and the current window of that many seconds are hashed, so
+identical answers from the same IP in the same window are rejected. This
+can drop genuine answers from people behind a shared IP, and a retry that
+straddles a window boundary is not caught.
+"""
+import hashlib
+import json
+import time
+
+
+class DuplicateResponseError(Exception):
+    """The submission matches a response that is already stored"""
+
+    def __init__(self, response_id):
+        super().__init__('Duplicate response')
+        self.response_id = response_id
+
+
+def content_hash(form_id, responses, client_key=None, ip_address=None, window=0, now=None):
+    """Canonical hash of a submission, the value the unique content_hash index enforces.
+
+    None when the submission has no client key and the IP window is off.
+    """
+    bucket = None
+    if not client_key:
+        if window <= 0:
+            return None
+        bucket = int((now if now is not None else time.time()) // window)
+    canonical = json.dumps(
+        [form_id, responses, client_key or ip_address, bucket],
+        sort_keys=True, separators=(',', ':'), default=str
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
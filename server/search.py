@@ -0,0 +1,56 @@
+# search.py
+"""
+Full-text search over the free-text answers of a form's responses.
+
+Every response stores `search_text`: the answers to its form's free-text
+fields (anything that is not a choice or numeric field) joined together,
+built when the response is written. A compound text index on
+(form_id, search_text) serves `$text` queries; its form_id prefix requires
+an equality on form_id, so each search is scoped to one form and reads only
+that form's index keys rather than the whole collection.
+
+Hits are ranked by textScore (English stemming and stop words) and paged
+with a keyset cursor on (score, _id). Responses stored before search_text
+existed, or after a form's fields change type, are (re)indexed with
+`python manage.py build_search_index`.
+"""
+from bson import ObjectId
+from analytics_store import CHOICE_FIELD_TYPES, NUMERIC_FIELD_TYPES
+
+MAX_QUERY_LENGTH = 200
+
+
+def is_text_field(field):
+    return field.get('type') not in CHOICE_FIELD_TYPES + NUMERIC_FIELD_TYPES
+
+
+def search_text(fields, responses):
+    """The searchable text of a response: its non-empty free-text answers, one per line"""
+    if not isinstance(responses, dict):
+        return ''
+    answers = []
+    for field in fields or []:
+        value = responses.get(field.get('id'))
+        if is_text_field(field) and isinstance(value, str) and value.strip():
+            answers.append(value)
+    return '\n'.join(answers)
+
+
+def search_pipeline(form_id, query, limit, position=None):
+    """Aggregation returning limit + 1 of a form's responses matching query, best first"""
+    pipeline = [
+        {'$match': {'form_id': form_id, '$text': {'$search': query}}},
+        {'$addFields': {'score': {'$meta': 'textScore'}}},
+    ]
+    if position:
+        # Keyset continuation: strictly after the last hit of the previous page
+        pipeline.append({'$match': {'$or': [
+            {'score': {'$lt': position['score']}},
+            {'score': position['score'], '_id': {'$lt': ObjectId(position['id'])}}
+        ]}})
+    pipeline += [
+        {'$sort': {'score': -1, '_id': -1}},
+        {'$limit': limit + 1},
+        {'$project': {'search_text': 0}},
+    ]
+    return pipeline
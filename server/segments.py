@@ -0,0 +1,206 @@
+# segments.py
+"""
+Segmented analytics: a form's field analytics over only the responses that
+match filter predicates, optionally split by the values of one field.
+
+`?filter=country:eq:US` (repeatable) keeps the matching responses and
+`?group_by=country` adds one segment per country, each with its own
+fieldAnalytics; `?group_by=country&fields=rating` is a country x rating
+cross-tab. Unlike the pre-aggregated summary this has to read responses, so
+it runs as a single aggregation: a $match on form_id, submitted_at and the
+predicates (served by the (form_id, submitted_at) index or the
+`responses.$**` wildcard index), then a $facet that counts each field's
+answers by value. The counts are turned into the stored summary format and
+shaped by AnalyticsStore.summarize_field, so entries look exactly like the
+unsegmented ones. MongoDBService caches results by query signature.
+
+A response whose group_by answer is a list (checkbox) counts in the segment
+of every option it picked.
+
+The unsegmented query also stands in, via facet_summary, for a form summary
+that is missing or awaiting a rebuild.
+"""
+import hashlib
+import json
+from analytics_store import CHOICE_FIELD_TYPES, NUMERIC_FIELD_TYPES, encode_key, bucket_key, to_number
+
+OPERATORS = ('eq', 'ne', 'in', 'nin', 'gt', 'gte', 'lt', 'lte', 'exists')
+MAX_FILTERS = 10
+MAX_SEGMENTS = 100
+EMPTY_VALUES = [None, '', [], {}]
+
+
+def parse_filter(text):
+    """'field:op:value', or 'field:value' for eq, -> (field, op, value)"""
+    parts = text.split(':', 2)
+    if len(parts) == 3 and parts[1] in OPERATORS:
+        return parts[0], parts[1], parts[2]
+    if len(parts) >= 2 and parts[0]:
+        field_id, value = text.split(':', 1)
+        return field_id, 'eq', value
+    raise ValueError(f'Invalid filter "{text}": expected field:op:value with op one of {", ".join(OPERATORS)}')
+
+
+def segment_signature(filters, group_by, field_ids, start, end):
+    """Stable short hash of a segment query, used in cache keys and ETags"""
+    canonical = json.dumps(
+        [sorted(filters), group_by, sorted(field_ids) if field_ids else None, start, end],
+        separators=(',', ':'), default=str
+    )
+    return hashlib.sha1(canonical.encode()).hexdigest()[:16]
+
+
+def response_path(field_id):
+    if not field_id or '.' in field_id or field_id.startswith('$'):
+        raise ValueError(f'Field "{field_id}" cannot be used in a segment query')
+    return f'responses.{field_id}'
+
+
+def query_values(value):
+    """A query-string value matches answers stored as that string or as the number it spells"""
+    number = to_number(value)
+    if number is None:
+        return [value]
+    return [value, int(number) if float(number).is_integer() else number]
+
+
+def predicate(op, value):
+    """MongoDB condition on one answer for a parsed filter"""
+    if op == 'exists':
+        return {'$in': EMPTY_VALUES} if value.lower() == 'false' else {'$nin': EMPTY_VALUES}
+    if op in ('in', 'nin'):
+        return {f'${op}': [v for item in value.split('|') for v in query_values(item)]}
+    if op == 'eq':
+        return {'$in': query_values(value)}
+    if op == 'ne':
+        return {'$nin': query_values(value)}
+    number = to_number(value)
+    return {f'${op}': value if number is None else number}
+
+
+def select_fields(form, field_ids=None):
+    """The form fields to report on: all of them, or those named in ?fields="""
+    fields = form.get('fields', [])
+    if not field_ids:
+        return fields
+    known = {field['id'] for field in fields}
+    unknown = [field_id for field_id in field_ids if field_id not in known]
+    if unknown:
+        raise ValueError(f'Unknown fields: {", ".join(unknown)}')
+    return [field for field in fields if field['id'] in field_ids]
+
+
+def segment_pipeline(form, fields, filters=(), group_by=None, start=None, end=None):
+    """Aggregation computing the answer counts behind a segment query, in one pass"""
+    known = {field['id'] for field in form.get('fields', [])}
+    for field_id in [field_id for field_id, op, value in filters] + ([group_by] if group_by else []):
+        if field_id not in known:
+            raise ValueError(f'Unknown field: {field_id}')
+
+    match = {'form_id': form['id']}
+    if start or end:
+        match['submitted_at'] = {}
+        if start:
+            match['submitted_at']['$gte'] = start
+        if end:
+            match['submitted_at']['$lt'] = end
+    conditions = [{response_path(field_id): predicate(op, value)} for field_id, op, value in filters]
+    if conditions:
+        match['$and'] = conditions
+
+    segment = None
+    unwind = []
+    if group_by:
+        segment = f'${response_path(group_by)}'
+        unwind = [{'$unwind': {'path': segment, 'preserveNullAndEmptyArrays': True}}]
+
+    facets = {
+        'total': [{'$count': 'n'}],
+        'segments': unwind + [{'$group': {'_id': segment, 'n': {'$sum': 1}}}],
+    }
+    for index, field in enumerate(fields):
+        try:
+            path = response_path(field['id'])
+        except ValueError:
+            continue
+        # Only choice and numeric answers are broken down by value; other answers are just counted
+        value = f'${path}' if field['type'] in CHOICE_FIELD_TYPES + NUMERIC_FIELD_TYPES else None
+        facets[f'f{index}'] = unwind + [
+            {'$match': {path: {'$nin': EMPTY_VALUES}}},
+            {'$group': {'_id': {'segment': segment, 'value': value}, 'n': {'$sum': 1}}}
+        ]
+    return [{'$match': match}, {'$facet': facets}]
+
+
+def field_stats(field, rows):
+    """(answer, count) rows -> field stats in the stored summary format"""
+    stats = {'count': 0}
+    for value, n in rows:
+        stats['count'] += n
+        if field['type'] in CHOICE_FIELD_TYPES:
+            options = stats.setdefault('options', {})
+            for option in value if isinstance(value, list) else [value]:
+                key = encode_key(option)
+                options[key] = options.get(key, 0) + n
+        elif field['type'] in NUMERIC_FIELD_TYPES:
+            number = to_number(value)
+            if number is None:
+                continue
+            numeric = stats.setdefault('numeric', {'count': 0, 'sum': 0, 'distribution': {}})
+            numeric['count'] += n
+            numeric['sum'] += number * n
+            numeric['min'] = min(numeric.get('min', number), number)
+            numeric['max'] = max(numeric.get('max', number), number)
+            key = encode_key(bucket_key(number))
+            numeric['distribution'][key] = numeric['distribution'].get(key, 0) + n
+    return stats
+
+
+def facet_rows(fields, result):
+    """{(segment, field id): [(answer, count)]} from the $facet result"""
+    rows = {}
+    for index, field in enumerate(fields):
+        for row in result.get(f'f{index}', []):
+            key = (row['_id'].get('segment'), field['id'])
+            rows.setdefault(key, []).append((row['_id'].get('value'), row['n']))
+    return rows
+
+
+def facet_total(result):
+    total = result.get('total') or [{'n': 0}]
+    return total[0]['n']
+
+
+def facet_summary(fields, result):
+    """An unsegmented $facet result in the stored summary format (answer counts only)"""
+    rows = facet_rows(fields, result)
+    return {
+        'total_responses': facet_total(result),
+        'fields': {encode_key(field['id']): field_stats(field, rows.get((None, field['id']), [])) for field in fields},
+    }
+
+
+def build_segmented_analytics(form, fields, result, filters, group_by, summarize_field):
+    """Shape the $facet result into the segmented analytics payload"""
+    rows = facet_rows(fields, result)
+
+    def field_analytics(segment):
+        return [summarize_field(field, field_stats(field, rows.get((segment, field['id']), []))) for field in fields]
+
+    data = {
+        'formId': form['id'],
+        'filters': [{'field': field_id, 'op': op, 'value': value} for field_id, op, value in filters],
+        'groupBy': group_by,
+        'totalResponses': facet_total(result),
+    }
+    if not group_by:
+        data['fieldAnalytics'] = field_analytics(None)
+        return data
+
+    counts = sorted(result.get('segments', []), key=lambda row: -row['n'])
+    data['segments'] = [
+        {'value': row['_id'], 'responseCount': row['n'], 'fieldAnalytics': field_analytics(row['_id'])}
+        for row in counts[:MAX_SEGMENTS]
+    ]
+    data['truncated'] = len(counts) > MAX_SEGMENTS
+    return data
@@ -2,6 +2,7 @@
 import os
 from pathlib import Path
 from dotenv import load_dotenv
+from corsheaders.defaults import default_headers
 
 load_dotenv()
 
@@ -46,6 +47,55 @@ WSGI_APPLICATION = 'wsgi.application'
 USE_MONGODB = True
 MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
 MONGODB_DB_NAME = os.getenv('MONGODB_DB_NAME', 'form_builder_db')
+# Connection pool and timeouts (milliseconds); the client is created on first use
+MONGODB_MAX_POOL_SIZE = int(os.getenv('MONGODB_MAX_POOL_SIZE', '100'))
+MONGODB_MIN_POOL_SIZE = int(os.getenv('MONGODB_MIN_POOL_SIZE', '0'))
+MONGODB_MAX_IDLE_TIME_MS = int(os.getenv('MONGODB_MAX_IDLE_TIME_MS', '0')) or None
+MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv('MONGODB_CONNECT_TIMEOUT_MS', '5000'))
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGODB_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+MONGODB_SOCKET_TIMEOUT_MS = int(os.getenv('MONGODB_SOCKET_TIMEOUT_MS', '0')) or None
+MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGODB_WAIT_QUEUE_TIMEOUT_MS', '0')) or None
+MONGODB_READ_PREFERENCE = os.getenv('MONGODB_READ_PREFERENCE', 'primary')
+# Read-heavy analytics, listing and export queries go to secondaries when available.
+# Max staleness is in seconds (at least 90); -1 means no limit
+MONGODB_ANALYTICS_READ_PREFERENCE = os.getenv('MONGODB_ANALYTICS_READ_PREFERENCE', 'secondaryPreferred')
+MONGODB_ANALYTICS_MAX_STALENESS_SECONDS = int(os.getenv('MONGODB_ANALYTICS_MAX_STALENESS_SECONDS', '-1'))
+
+# Cache-Control for GET /api/forms/<id>/ (public, so a CDN/reverse proxy can absorb form page
+# traffic) and for analytics (revalidated with the ETag on every poll)
+FORM_CACHE_CONTROL = os.getenv('FORM_CACHE_CONTROL', 'public, max-age=60, stale-while-revalidate=300')
+ANALYTICS_CACHE_CONTROL = os.getenv('ANALYTICS_CACHE_CONTROL', 'private, no-cache')
+
+# Serve the form/response/analytics endpoints with native async views (ASGI only)
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False').lower() == 'true'
+
+# In-process form cache (entries, seconds), optionally backed by a shared Django cache alias (form_cache.py)
+FORM_CACHE_SIZE = int(os.getenv('FORM_CACHE_SIZE', '1024'))
+FORM_CACHE_TTL = float(os.getenv('FORM_CACHE_TTL', '300'))
+FORM_CACHE_ALIAS = os.getenv('FORM_CACHE_ALIAS') or None
+
+# Cache of segmented analytics (?filter= / ?group_by=); the TTL bounds how stale a segment can be
+SEGMENT_CACHE_SIZE = int(os.getenv('SEGMENT_CACHE_SIZE', '256'))
+SEGMENT_CACHE_TTL = float(os.getenv('SEGMENT_CACHE_TTL', '30'))
+
+# Seconds in which identical submissions from one IP without an Idempotency-Key are rejected (0 = off)
+RESPONSE_DEDUP_WINDOW = int(os.getenv('RESPONSE_DEDUP_WINDOW', '0'))
+
+# Opt-in batched response ingestion (response_buffer.py)
+RESPONSE_BUFFER_ENABLED = os.getenv('RESPONSE_BUFFER_ENABLED', 'False').lower() == 'true'
+RESPONSE_BUFFER_SIZE = int(os.getenv('RESPONSE_BUFFER_SIZE', '10000'))
+RESPONSE_BUFFER_BATCH_SIZE = int(os.getenv('RESPONSE_BUFFER_BATCH_SIZE', '500'))
+RESPONSE_BUFFER_FLUSH_INTERVAL = float(os.getenv('RESPONSE_BUFFER_FLUSH_INTERVAL', '0.05'))
+RESPONSE_BUFFER_MAX_RETRIES = int(os.getenv('RESPONSE_BUFFER_MAX_RETRIES', '5'))
+
+# Real-time broadcasts: one frame per form per window (seconds), at most MAX_PENDING events waiting
+ANALYTICS_BROADCAST_WINDOW = float(os.getenv('ANALYTICS_BROADCAST_WINDOW', '0.25'))
+ANALYTICS_BROADCAST_MAX_PENDING = int(os.getenv('ANALYTICS_BROADCAST_MAX_PENDING', '10000'))
+
+# Live dashboards: deltas from different workers can arrive out of seq order, so each
+# connection holds them for up to this many seconds waiting for the missing ones, then
+# sends a fresh snapshot instead (websockets/consumers.py)
+ANALYTICS_DELTA_REORDER_WINDOW = float(os.getenv('ANALYTICS_DELTA_REORDER_WINDOW', '1.0'))
 
 # Dummy database configuration (required by Django but not used)
 DATABASES = {
@@ -69,7 +119,7 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [],
     'DEFAULT_AUTHENTICATION_CLASSES': [],
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'renderers.ORJSONRenderer',
     ],
 }
 
@@ -83,6 +133,9 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_ALL_ORIGINS = DEBUG
 
+# Submissions carry an Idempotency-Key so retries are deduplicated (response_dedup.py)
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
 USE_I18N = True
@@ -0,0 +1,76 @@
+# sketches.py
+"""
+Approximate per-field statistics that can be maintained with atomic MongoDB
+update operators, for `?approx=true` analytics on very large forms.
+
+- Distinct answers: a HyperLogLog with 2**HLL_PRECISION registers stored as
+  `hll.<register>` keys and updated with $max. Standard error is
+  1.04 / sqrt(registers), about 3% with the default precision.
+- Free-text answers: a uniform random sample of SAMPLE_SIZE answers, kept as
+  the SAMPLE_SIZE entries with the smallest random key via
+  $push + $sort + $slice (bottom-k sampling, the reservoir equivalent that
+  needs no read-modify-write). Sampled answers are cut to
+  SAMPLE_VALUE_LENGTH characters, so a field's sample stays under ~100KB.
+- Numeric percentiles come from the existing histogram; percentile_bounds()
+  turns its buckets into error bounds.
+"""
+import hashlib
+import json
+import math
+import random
+
+HLL_PRECISION = 10
+HLL_REGISTERS = 1 << HLL_PRECISION
+SAMPLE_SIZE = 100
+SAMPLE_VALUE_LENGTH = 200
+
+
+def hll_register(value):
+    """(register index, rank) that value sets in the HyperLogLog"""
+    encoded = json.dumps(value, sort_keys=True, default=str).encode()
+    hashed = int.from_bytes(hashlib.blake2b(encoded, digest_size=8).digest(), 'big')
+    index = hashed >> (64 - HLL_PRECISION)
+    rest = hashed & ((1 << (64 - HLL_PRECISION)) - 1)
+    return index, (64 - HLL_PRECISION) - rest.bit_length() + 1
+
+
+def hll_estimate(registers):
+    """Estimated distinct count and its standard error from stored {index: rank} registers"""
+    m = HLL_REGISTERS
+    ranks = [0] * m
+    for index, rank in (registers or {}).items():
+        ranks[int(index)] = rank
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / sum(2.0 ** -rank for rank in ranks)
+    zeros = ranks.count(0)
+    if estimate <= 2.5 * m and zeros:
+        # Small-range correction: linear counting
+        estimate = m * math.log(m / zeros)
+    return round(estimate), round(estimate * 1.04 / math.sqrt(m), 1)
+
+
+def sample_entry(value):
+    """An entry for the bottom-k sample of a field's answers"""
+    if isinstance(value, str):
+        value = value[:SAMPLE_VALUE_LENGTH]
+    return {'u': random.random(), 'value': value}
+
+
+def bucket_error(value):
+    """Largest distance between a histogram bucket value and the answers it holds"""
+    if value == 0:
+        return 0.0
+    # bucket_key keeps two significant digits
+    return 0.5 * 10 ** (math.floor(math.log10(abs(value))) - 1)
+
+
+def percentile_bounds(percentiles):
+    """{pXX: value} from the histogram -> {pXX: {value, low, high}}"""
+    bounds = {}
+    for name, value in percentiles.items():
+        if value is None:
+            bounds[name] = None
+            continue
+        error = bucket_error(value)
+        bounds[name] = {'value': value, 'low': value - error, 'high': value + error}
+    return bounds
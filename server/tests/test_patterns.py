@@ -0,0 +1,82 @@
+import time
+import unittest
+from unittest import mock
+
+from form_builder import patterns
+from form_builder.validation import FormValidator, validate_form_fields
+
+# Patterns that backtrack catastrophically in the stdlib engine, with an input that shows it
+CATASTROPHIC = [
+    ('(a+)+$', 'a' * 30 + '!'),
+    ('(a|a)*b', 'a' * 30),
+    ('(a|aa)+$', 'a' * 40 + '!'),
+    ('(.*a){12}$', 'a' * 200 + '!'),
+    ('(.*a){8}$', 'a' * 200 + '!'),
+    ('(a{1,5})+$', 'a' * 40 + '!'),
+    (r'(\d+\.){3}x', '1' * 200),
+    ('.*.*.*x', 'a' * 1000),
+    (r'^\S+@\S+\.\S+$', 'a@' * 500),
+]
+
+SAFE = [r'^[a-z]+$', r'^\d{3}-\d{4}$', '(ab)+', '(a|b)*c', r'^[A-Z]{2}\d+$', r'(\d|\w)+x']
+
+
+@unittest.skipIf(patterns.re2 is None, 'google-re2 is not installed')
+class RE2PatternTests(unittest.TestCase):
+    def test_catastrophic_patterns_match_in_linear_time(self):
+        for pattern, value in CATASTROPHIC:
+            compiled = patterns.compile_pattern(pattern)
+            self.assertIsNotNone(compiled, pattern)
+            start = time.perf_counter()
+            compiled.search(value)
+            self.assertLess(time.perf_counter() - start, 0.1, pattern)
+
+    def test_patterns_re2_cannot_run_are_rejected(self):
+        for pattern in [r'(a)\1', '(?=a)b', '[']:
+            self.assertIsNotNone(patterns.pattern_error(pattern), pattern)
+
+    def test_matching_follows_search_semantics(self):
+        compiled = patterns.compile_pattern(r'\d{3}')
+        self.assertTrue(compiled.search('call 555 now'))
+        self.assertFalse(compiled.search('call now'))
+
+
+class StdlibPatternTests(unittest.TestCase):
+    """Without google-re2, risky shapes are rejected before they can run"""
+
+    def setUp(self):
+        patcher = mock.patch.object(patterns, 're2', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_catastrophic_patterns_are_rejected(self):
+        for pattern, _ in CATASTROPHIC:
+            self.assertIsNotNone(patterns.pattern_error(pattern), pattern)
+            self.assertIsNone(patterns.compile_pattern(pattern), pattern)
+
+    def test_safe_patterns_are_accepted_and_fast(self):
+        for pattern in SAFE:
+            self.assertIsNone(patterns.pattern_error(pattern), pattern)
+            compiled = patterns.compile_pattern(pattern)
+            start = time.perf_counter()
+            compiled.search('a1' * 500)
+            self.assertLess(time.perf_counter() - start, 0.1, pattern)
+
+    def test_invalid_patterns_are_rejected(self):
+        self.assertIsNotNone(patterns.pattern_error('['))
+        self.assertIsNotNone(patterns.pattern_error(None))
+
+
+class FormPatternTests(unittest.TestCase):
+    def test_risky_patterns_are_rejected_on_save(self):
+        fields = [
+            {'id': 'a', 'type': 'text', 'validation': {'pattern': '(?=a)(a+)+$'}},
+            {'id': 'b', 'type': 'text', 'validation': {'pattern': r'^\d+$'}},
+        ]
+        self.assertEqual(list(validate_form_fields(fields)), ['a'])
+
+    def test_long_values_never_reach_the_pattern(self):
+        validator = FormValidator([{'id': 't', 'type': 'text', 'label': 'T', 'validation': {'pattern': '^a+$'}}])
+        self.assertEqual(validator.validate({'t': 'a' * 1001}), {'t': 'T must be no more than 1000 characters'})
+        self.assertEqual(validator.validate({'t': 'aaa'}), {})
+        self.assertEqual(validator.validate({'t': 'b'}), {'t': 'T format is invalid'})
@@ -0,0 +1,177 @@
+import os
+import random
+import unittest
+from collections import Counter
+
+from top_terms import exact_counters, space_saving, terms_pipeline, tokenize
+
+CAPACITY = 5
+
+
+def get_path(value, path):
+    """A field path, mapped over arrays the way MongoDB resolves '$$value.t'"""
+    for key in path:
+        if isinstance(value, list):
+            value = [item.get(key) for item in value if isinstance(item, dict)]
+        else:
+            value = value.get(key) if isinstance(value, dict) else None
+    return value
+
+
+def evaluate(expr, doc, variables=None):
+    """Evaluate the aggregation expressions space_saving_expression uses, with MongoDB's semantics"""
+    variables = variables or {}
+    if isinstance(expr, str) and expr.startswith('$$'):
+        name, *path = expr[2:].split('.')
+        return get_path(variables[name], path)
+    if isinstance(expr, str) and expr.startswith('$'):
+        return get_path(doc, expr[1:].split('.'))
+    if isinstance(expr, list):
+        return [evaluate(item, doc, variables) for item in expr]
+    if not isinstance(expr, dict):
+        return expr
+    if len(expr) != 1 or not next(iter(expr)).startswith('$'):
+        return {key: evaluate(value, doc, variables) for key, value in expr.items()}
+
+    op, args = next(iter(expr.items()))
+
+    def arg(item, **bound):
+        return evaluate(item, doc, {**variables, **bound})
+
+    if op == '$literal':
+        return args
+    if op == '$cond':
+        return arg(args[1]) if arg(args[0]) else arg(args[2])
+    if op == '$let':
+        return arg(args['in'], **{name: arg(value) for name, value in args['vars'].items()})
+    if op == '$reduce':
+        value = arg(args['initialValue'])
+        for item in arg(args['input']):
+            value = arg(args['in'], value=value, this=item)
+        return value
+    if op == '$map':
+        return [arg(args['in'], **{args['as']: item}) for item in arg(args['input'])]
+    if op == '$ifNull':
+        value = arg(args[0])
+        return arg(args[1]) if value is None else value
+    if op == '$min':
+        values = [value for value in arg(args) if value is not None]
+        return min(values) if values else None
+    values = [arg(item) for item in (args if isinstance(args, list) else [args])]
+    if op == '$indexOfArray':
+        return values[0].index(values[1]) if values[1] in values[0] else -1
+    if op == '$arrayElemAt':
+        return values[0][values[1]]
+    if op == '$range':
+        return list(range(values[0], values[1]))
+    if op == '$concatArrays':
+        return [item for array in values for item in array]
+    if op == '$size':
+        return len(values[0])
+    if op == '$add':
+        return sum(values)
+    if op == '$eq':
+        return values[0] == values[1]
+    if op == '$lt':
+        return values[0] < values[1]
+    if op == '$gte':
+        return values[0] >= values[1]
+    raise NotImplementedError(op)
+
+
+def apply_pipeline(doc, pipeline):
+    """Run a terms_pipeline update ($set of dotted paths) on a document"""
+    for stage in pipeline:
+        values = {path: evaluate(expr, doc) for path, expr in stage['$set'].items()}
+        for path, value in values.items():
+            *parents, last = path.split('.')
+            target = doc
+            for key in parents:
+                target = target.setdefault(key, {})
+            target[last] = value
+    return doc
+
+
+def answer_batches(seed, batches=300):
+    """Batches of per-answer term counts, Zipf-like so a few terms dominate"""
+    rng = random.Random(seed)
+    vocabulary = [f'term{k}' for k in range(40)]
+    weights = [1 / (k + 1) for k in range(len(vocabulary))]
+    for _ in range(batches):
+        counts = Counter()
+        for _ in range(rng.randint(1, 3)):
+            counts.update(set(rng.choices(vocabulary, weights, k=rng.randint(1, 4))))
+        yield dict(counts)
+
+
+class SpaceSavingTests(unittest.TestCase):
+    def test_counts_bound_the_true_counts(self):
+        counters = []
+        truth = Counter()
+        for counts in answer_batches(seed=1):
+            counters = space_saving(counters, counts, CAPACITY)
+            truth.update(counts)
+            self.assertLessEqual(len(counters), CAPACITY)
+
+        total = sum(truth.values())
+        tracked = {counter['t']: counter for counter in counters}
+        for counter in counters:
+            self.assertLessEqual(counter['c'] - counter['e'], truth[counter['t']])
+            self.assertLessEqual(truth[counter['t']], counter['c'])
+            self.assertLessEqual(counter['e'], total / CAPACITY)
+        for term, count in truth.items():
+            if count > total / CAPACITY:
+                self.assertIn(term, tracked)
+
+    def test_exact_counters_continue_as_space_saving(self):
+        counters = exact_counters({'a': 5, 'b': 3, 'c': 1}, capacity=2)
+        self.assertEqual(counters, [{'t': 'a', 'c': 5, 'e': 0}, {'t': 'b', 'c': 3, 'e': 0}])
+        counters = space_saving(counters, {'a': 1, 'd': 2}, capacity=2)
+        self.assertEqual(counters, [{'t': 'a', 'c': 6, 'e': 0}, {'t': 'd', 'c': 5, 'e': 3}])
+
+    def test_tokenize_counts_each_term_once(self):
+        self.assertEqual(tokenize("Fast, FAST and friendly support! It's 24/7 a-ok"), ['fast', 'friendly', 'support', 'ok'])
+
+
+class TermsPipelineTests(unittest.TestCase):
+    def test_no_terms_no_update(self):
+        self.assertIsNone(terms_pipeline({}))
+        self.assertIsNone(terms_pipeline({'terms.comment': {}}))
+
+    def test_pipeline_sets_each_field_path(self):
+        pipeline = terms_pipeline({'terms.a': {'x': 1}, 'terms.b': {}, 'terms.c': {'y': 2}}, CAPACITY)
+        self.assertEqual(len(pipeline), 1)
+        self.assertEqual(set(pipeline[0]['$set']), {'terms.a', 'terms.c'})
+        fold = pipeline[0]['$set']['terms.c']['$reduce']
+        self.assertEqual(fold['input'], {'$literal': [{'t': 'y', 'n': 2}]})
+        self.assertEqual(fold['initialValue'], {'$ifNull': ['$terms.c', []]})
+
+    def test_pipeline_matches_the_reference(self):
+        doc = {'_id': 'form', 'terms': {}}
+        expected = {}
+        for index, counts in enumerate(answer_batches(seed=2)):
+            path = f'terms.f{index % 2}'
+            apply_pipeline(doc, terms_pipeline({path: counts}, CAPACITY))
+            expected[path] = space_saving(expected.get(path), counts, CAPACITY)
+        self.assertEqual(doc['terms'], {path.split('.')[1]: counters for path, counters in expected.items()})
+
+
+@unittest.skipUnless(os.getenv('MONGODB_TEST_URI'), 'set MONGODB_TEST_URI to run against a real mongod')
+class MongoTermsPipelineTests(unittest.TestCase):
+    """The pipeline run by MongoDB itself (4.2+), which mongomock can't do"""
+
+    def setUp(self):
+        from pymongo import MongoClient
+        client = MongoClient(os.getenv('MONGODB_TEST_URI'))
+        self.addCleanup(client.close)
+        self.collection = client.get_database('form_builder_test')['top_terms_test']
+        self.addCleanup(self.collection.drop)
+        self.collection.delete_many({})
+        self.collection.insert_one({'_id': 'form'})
+
+    def test_pipeline_matches_the_reference(self):
+        expected = []
+        for counts in answer_batches(seed=3):
+            self.collection.update_one({'_id': 'form'}, terms_pipeline({'terms.f': counts}, CAPACITY))
+            expected = space_saving(expected, counts, CAPACITY)
+        self.assertEqual(self.collection.find_one({'_id': 'form'})['terms']['f'], expected)
@@ -0,0 +1,97 @@
+# time_series.py
+"""
+Responses per time bucket, for trend charts.
+
+The counting runs in MongoDB with a `$dateTrunc` aggregation (MongoDB 5.0+)
+over the (form_id, submitted_at) / (submitted_at) indexes, so only one row
+per non-empty bucket comes back; empty buckets are filled in here. The
+response size is proportional to the number of buckets, which is capped at
+MAX_BUCKETS. Buckets are in UTC, and weeks start on Sunday like $dateTrunc's.
+"""
+from datetime import datetime, timedelta, timezone
+
+GRANULARITIES = ('minute', 'hour', 'day', 'week', 'month')
+MAX_BUCKETS = 1000
+
+# Range covered when ?start= is not given
+DEFAULT_SPANS = {
+    'minute': timedelta(hours=2),
+    'hour': timedelta(days=2),
+    'day': timedelta(days=30),
+    'week': timedelta(weeks=26),
+    'month': timedelta(days=365),
+}
+
+STEPS = {
+    'minute': timedelta(minutes=1),
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+    'week': timedelta(weeks=1),
+}
+
+
+def parse_time(value):
+    """Parse an ISO 8601 date/time into a naive UTC datetime, as stored in MongoDB"""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def truncate(value, granularity):
+    """Start of the bucket containing value"""
+    if granularity == 'minute':
+        return value.replace(second=0, microsecond=0)
+    if granularity == 'hour':
+        return value.replace(minute=0, second=0, microsecond=0)
+    day = value.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == 'week':
+        return day - timedelta(days=(day.weekday() + 1) % 7)
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(value, granularity):
+    if granularity == 'month':
+        return value.replace(year=value.year + value.month // 12, month=value.month % 12 + 1)
+    return value + STEPS[granularity]
+
+
+def bucket_starts(start, end, granularity):
+    """Start of every bucket from truncate(start) up to end; ValueError beyond MAX_BUCKETS"""
+    starts = []
+    bucket = truncate(start, granularity)
+    while bucket < end:
+        if len(starts) >= MAX_BUCKETS:
+            raise ValueError(f'The range covers more than {MAX_BUCKETS} {granularity} buckets')
+        starts.append(bucket)
+        bucket = next_bucket(bucket, granularity)
+    return starts
+
+
+def time_series_pipeline(granularity, start, end, form_id=None):
+    """Aggregation counting responses per bucket in [start, end)"""
+    match = {'submitted_at': {'$gte': start, '$lt': end}}
+    if form_id:
+        match = {'form_id': form_id, **match}
+    return [
+        {'$match': match},
+        {'$group': {
+            '_id': {'$dateTrunc': {'date': '$submitted_at', 'unit': granularity}},
+            'count': {'$sum': 1}
+        }}
+    ]
+
+
+def fill_buckets(rows, starts, granularity, end):
+    """Shape aggregation rows into the API payload, with zero counts for empty buckets"""
+    counts = {row['_id']: row['count'] for row in rows}
+    buckets = [{'start': start.isoformat(), 'count': counts.get(start, 0)} for start in starts]
+    return {
+        'granularity': granularity,
+        'start': starts[0].isoformat() if starts else None,
+        'end': end.isoformat(),
+        'total': sum(bucket['count'] for bucket in buckets),
+        'buckets': buckets
+    }
@@ -0,0 +1,124 @@
+# top_terms.py
+"""
+Incremental top terms of free-text answers, for text-field analytics.
+
+Answers are tokenized (lowercased words; English stop words, one-letter
+words and numbers dropped; each term counted once per answer) and folded
+into a Space-Saving summary of TOP_TERMS_CAPACITY counters per field, kept
+in the form's analytics summary as `terms.<field id>: [{t, c, e}]`. A
+tracked term has its count raised; an untracked one takes a free counter
+or, once all are taken, replaces the smallest and inherits its count as the
+error bound `e`. A term's true count lies between `c - e` and `c`, and `e`
+is at most N/TOP_TERMS_CAPACITY, where N is the total count of all terms
+folded in, so every term counted more than N/TOP_TERMS_CAPACITY times is
+guaranteed to be tracked.
+
+The fold runs inside MongoDB as an update pipeline (MongoDB 4.2+), so
+workers update the counters atomically without reading them first.
+space_saving() is the same fold in Python, the reference the pipeline is
+tested against. A summary rebuild replaces the counters with exact counts.
+"""
+import re
+from collections import Counter
+
+TOP_TERMS_CAPACITY = 100
+TOP_TERMS_LIMIT = 20
+MAX_TERMS_PER_ANSWER = 50
+
+TOKEN_PATTERN = re.compile(r"[^\W\d_][\w']*")
+
+STOP_WORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have
+having he her here hers herself him himself his how i if in into is it its itself just me more most
+my myself no nor not now of off on once only or other our ours ourselves out over own same she
+should so some such than that the their theirs them themselves then there these they this those
+through to too under until up very was we were what when where which while who whom why will with
+would you your yours yourself yourselves it's i'm don't didn't doesn't isn't wasn't can't won't
+also really very much many get got one
+""".split())
+
+
+def tokenize(text):
+    """Distinct terms of an answer, in order of first use"""
+    terms = []
+    seen = set()
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        term = match.group().strip("'")
+        if len(term) < 2 or term in STOP_WORDS or term in seen:
+            continue
+        seen.add(term)
+        terms.append(term)
+        if len(terms) >= MAX_TERMS_PER_ANSWER:
+            break
+    return terms
+
+
+def space_saving_expression(path, counts, capacity=TOP_TERMS_CAPACITY):
+    """Aggregation expression folding {term: count} into the Space-Saving counters at `path`"""
+    entry = '$$value'
+    new_term = '$$this.t'
+    added = '$$this.n'
+    return {'$reduce': {
+        'input': {'$literal': [{'t': term, 'n': n} for term, n in counts.items()]},
+        'initialValue': {'$ifNull': [f'${path}', []]},
+        'in': {'$let': {
+            'vars': {
+                'index': {'$indexOfArray': [f'{entry}.t', new_term]},
+                'low': {'$min': f'{entry}.c'},
+            },
+            'in': {'$cond': [
+                {'$gte': ['$$index', 0]},
+                # Tracked: raise its count
+                {'$map': {'input': entry, 'as': 'counter', 'in': {'$cond': [
+                    {'$eq': ['$$counter.t', new_term]},
+                    {'t': '$$counter.t', 'c': {'$add': ['$$counter.c', added]}, 'e': '$$counter.e'},
+                    '$$counter'
+                ]}}},
+                {'$cond': [
+                    {'$lt': [{'$size': entry}, capacity]},
+                    # A free counter
+                    {'$concatArrays': [entry, [{'t': new_term, 'c': added, 'e': 0}]]},
+                    # Full: take over the (first) smallest counter
+                    {'$map': {'input': {'$range': [0, {'$size': entry}]}, 'as': 'k', 'in': {'$cond': [
+                        {'$eq': ['$$k', {'$indexOfArray': [f'{entry}.c', '$$low']}]},
+                        {'t': new_term, 'c': {'$add': ['$$low', added]}, 'e': '$$low'},
+                        {'$arrayElemAt': [entry, '$$k']}
+                    ]}}}
+                ]}
+            ]}
+        }}
+    }}
+
+
+def space_saving(counters, counts, capacity=TOP_TERMS_CAPACITY):
+    """The counters after folding {term: count} into them, as space_saving_expression does it"""
+    counters = [dict(counter) for counter in counters or []]
+    for term, n in counts.items():
+        tracked = next((counter for counter in counters if counter['t'] == term), None)
+        if tracked is not None:
+            tracked['c'] += n
+        elif len(counters) < capacity:
+            counters.append({'t': term, 'c': n, 'e': 0})
+        else:
+            low = min(counter['c'] for counter in counters)
+            index = next(k for k, counter in enumerate(counters) if counter['c'] == low)
+            counters[index] = {'t': term, 'c': low + n, 'e': low}
+    return counters
+
+
+def terms_pipeline(counts_by_path, capacity=TOP_TERMS_CAPACITY):
+    """Update pipeline folding {path: {term: count}} into the summary, or None when there are no terms"""
+    stage = {path: space_saving_expression(path, counts, capacity) for path, counts in counts_by_path.items() if counts}
+    return [{'$set': stage}] if stage else None
+
+
+def exact_counters(counts, capacity=TOP_TERMS_CAPACITY):
+    """Counters holding exact counts, for a summary rebuilt from every answer"""
+    return [{'t': term, 'c': n, 'e': 0} for term, n in Counter(counts).most_common(capacity)]
+
+
+def top_terms(counters, limit=TOP_TERMS_LIMIT):
+    """Stored counters -> the API's topTerms list, most used first"""
+    ranked = sorted(counters or [], key=lambda counter: (-counter['c'], counter['t']))
+    return [{'term': counter['t'], 'count': counter['c'], 'error': counter['e']} for counter in ranked[:limit]]
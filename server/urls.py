@@ -1,7 +1,25 @@
 # backend/urls.py
+from django.conf import settings
 from django.urls import path, include
 
-urlpatterns = [
+urlpatterns = []
+
+if settings.ASYNC_VIEWS:
+    # Native async handlers take precedence over the DRF views for the hot paths
+    from form_builder import async_views
+    from analytics import async_views as analytics_async_views
+
+    urlpatterns += [
+        path('api/forms/<str:pk>/', async_views.form_detail),
+        path('api/forms/<str:pk>/responses/', async_views.submit_response),
+        path('api/forms/<str:pk>/get_responses/', async_views.get_responses),
+        path('api/analytics/', analytics_async_views.analytics),
+        path('api/analytics/timeseries/', analytics_async_views.time_series),
+        path('api/analytics/<str:form_id>/', analytics_async_views.analytics),
+        path('api/analytics/<str:form_id>/timeseries/', analytics_async_views.time_series),
+    ]
+
+urlpatterns += [
     path('api/', include('form_builder.urls')),
     path('api/', include('analytics.urls')),
 ]
\ No newline at end of file
@@ -1,23 +1,113 @@
 # websockets/consumers.py
+import asyncio
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
+from analytics_broadcaster import GLOBAL_GROUP, form_group_name
+from async_mongodb_service import async_mongodb_service
 
 class AnalyticsConsumer(AsyncWebsocketConsumer):
     async def connect(self):
+        # Dashboards for a single form only receive that form's updates
+        self.form_id = self.scope['url_route']['kwargs'].get('form_id')
+        self.group_name = form_group_name(self.form_id) if self.form_id else GLOBAL_GROUP
+        # Seq of the last snapshot or delta sent, and deltas received ahead of it, by baseSeq
+        self.seq = None
+        self.held = {}
+        self.gap_timer = None
         await self.channel_layer.group_add(
-            'analytics',
+            self.group_name,
             self.channel_name
         )
         await self.accept()
+        if self.form_id:
+            # Joined the group first, so no delta after the snapshot's seq is missed
+            await self.send_snapshot()
 
     async def disconnect(self, close_code):
+        if self.gap_timer is not None:
+            self.gap_timer.cancel()
         await self.channel_layer.group_discard(
-            'analytics',
+            self.group_name,
             self.channel_name
         )
 
+    async def receive(self, text_data=None, bytes_data=None):
+        # Clients that detect a gap in delta seqs ask for a fresh snapshot
+        try:
+            message = json.loads(text_data or '{}')
+        except ValueError:
+            return
+        if message.get('type') == 'resync' and self.form_id:
+            await self.send_snapshot()
+
+    async def send_snapshot(self):
+        analytics = await async_mongodb_service.get_analytics_data(self.form_id)
+        if analytics is None:
+            await self.close(code=4404)
+            return
+        self.seq = analytics['seq']
+        await self.send(text_data=json.dumps({
+            'type': 'analytics_snapshot',
+            'data': analytics
+        }))
+        # Deltas held for a gap the snapshot covers may now follow on from it
+        await self.send_deltas([])
+
     async def new_response(self, event):
         await self.send(text_data=json.dumps({
             'type': 'new_response',
             'data': event['message']
-        }))
\ No newline at end of file
+        }))
+
+    async def new_responses(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'new_responses',
+            'data': event['message']
+        }))
+
+    async def analytics_deltas(self, event):
+        await self.send_deltas(event['message']['deltas'])
+
+    async def send_deltas(self, deltas):
+        """Forward deltas in seq order.
+
+        Each worker broadcasts its own deltas, so with several workers they can
+        arrive interleaved and out of order. A delta that doesn't follow on from
+        the last seq sent is held until the ones before it arrive; if the gap is
+        still open after ANALYTICS_DELTA_REORDER_WINDOW seconds (a delta was
+        dropped), the dashboard gets a fresh snapshot instead.
+        """
+        if self.seq is None:
+            return
+        for delta in deltas:
+            if delta['seq'] > self.seq:
+                self.held[delta['baseSeq']] = delta
+        ready = []
+        while self.seq in self.held:
+            delta = self.held.pop(self.seq)
+            ready.append(delta)
+            self.seq = delta['seq']
+        self.held = {base_seq: delta for base_seq, delta in self.held.items() if delta['seq'] > self.seq}
+        if ready:
+            await self.send(text_data=json.dumps({
+                'type': 'analytics_deltas',
+                'data': {'form_id': self.form_id, 'deltas': ready}
+            }))
+        if self.held and self.gap_timer is None:
+            self.gap_timer = asyncio.ensure_future(self.close_gap())
+        elif not self.held and self.gap_timer is not None:
+            self.gap_timer.cancel()
+            self.gap_timer = None
+
+    async def close_gap(self):
+        await asyncio.sleep(settings.ANALYTICS_DELTA_REORDER_WINDOW)
+        self.gap_timer = None
+        if self.held:
+            await self.send_snapshot()
+
+    async def responses_summary(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'responses_summary',
+            'data': event['message']
+        }))
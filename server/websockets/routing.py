@@ -3,5 +3,6 @@ from django.urls import re_path
 from . import consumers
 
 websocket_urlpatterns = [
+    re_path(r'ws/analytics/(?P<form_id>[0-9a-f]{24})/$', consumers.AnalyticsConsumer.as_asgi()),
     re_path(r'ws/analytics/',consumers.AnalyticsConsumer.as_asgi())
 ]
\ No newline at end of file